@@ -1,15 +1,48 @@
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse
+from contextlib import asynccontextmanager
 from app.routes.analyze import router as analyze_router
+from app.routes.batch import router as batch_router
 from app.routes.report import router as report_router   
+from app.routes.jobs import router as jobs_router, start_job_workers, stop_job_workers
+from app.routes.patients import router as patients_router
+from app.services.cpu_executor import cpu_executor
+from app.services.explanation_cache import explanation_cache
+from app.services.explanation_store import explanation_store
+from app.services.llm_explainer import explanation_flights
+from app.services.metrics import TimingMiddleware, render_prometheus
+from app.services.profile_store import profile_store
+from app.services.report_cache import report_cache, report_flights
+from app.services.request_profiler import ProfilingMiddleware, profiling_gate
+from app.services.upload_cache import upload_cache, upload_flights
+from app.services.warmup import warm_up, warmup_state
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-import logging
+import asyncio, logging
 
 logging.basicConfig(level=logging.INFO)
 
-app = FastAPI(title="PharmaGuard API")
+
+@asynccontextmanager
+async def lifespan(app):
+    # ✅ CPU worker processes (if enabled) + background job workers live as long as the API process
+    await run_in_threadpool(cpu_executor.start)
+    await start_job_workers()
+    # ✅ warm-up in the background: /healthz answers at once, /readyz once warm
+    warmup = asyncio.create_task(warm_up())
+    yield
+    warmup.cancel()
+    await stop_job_workers()
+    await run_in_threadpool(cpu_executor.shutdown)
+
+
+app = FastAPI(title="PharmaGuard API", lifespan=lifespan)
 
 app.include_router(analyze_router, prefix="/analyze")
+app.include_router(batch_router, prefix="/analyze")
 app.include_router(report_router, prefix="/report")   
+app.include_router(jobs_router, prefix="/jobs")
+app.include_router(patients_router, prefix="/patients")
 
 @app.get("/")
 def root():
@@ -19,6 +52,31 @@ def root():
 def health():
     return {"status": "ok", "service": "PharmaGuard"}
 
+@app.get("/readyz")
+def ready():
+    if not warmup_state["ready"]:
+        return JSONResponse({"status": "warming", "warmup": warmup_state["steps"]}, status_code=503)
+    return {"status": "ready", "warmup": warmup_state["steps"]}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    # ✅ Prometheus text format: stage / LLM / upload histograms + cache counters
+    caches = (
+        ("explanation", explanation_cache),
+        ("explanation_store", explanation_store),
+        ("explanation_flights", explanation_flights),
+        ("upload", upload_cache),
+        ("upload_flights", upload_flights),
+        ("report", report_cache),
+        ("report_flights", report_flights),
+        ("profile", profile_store),
+        ("request_profiler", profiling_gate),
+    )
+    return PlainTextResponse(
+        render_prometheus([(name, dict(cache.counters)) for name, cache in caches]),
+        media_type="text/plain; version=0.0.4",
+    )
+
 origins = ["https://pharma-code.vercel.app"]
 
 app.add_middleware(
@@ -27,4 +85,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
+
+app.add_middleware(TimingMiddleware)
+app.add_middleware(ProfilingMiddleware)
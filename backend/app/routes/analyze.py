@@ -1,7 +1,35 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from app.services.analyzer import run_analysis_from_path
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request, Query
+from app.services.analyzer import (
+    EXPLANATION_TIERS,
+    assess_drug,
+    build_patient_profile,
+    build_profile_from_upload,
+    build_profile_from_variants,
+    draft_result,
+    evaluate_drug_async,
+    explain_draft,
+    finalize_drug_result,
+)
+from app.services.vcf_parser import IncrementalVcfParser, VcfFormatError
+from app.services.cohort import analyze_cohort
+from app.services.cpu_executor import cpu_executor, run_cpu
+from app.services.fast_json import FastJSONResponse, dumps
+from app.services.metrics import drug_timings, observe, record_stage
+from app.services.profile_store import save_profile
+from app.services.report_cache import prerender_report
+from app.services.single_flight import LeaderAborted
+from app.services.upload_cache import (
+    UPLOAD_DEDUP,
+    cacheable,
+    results_for,
+    upload_cache,
+    upload_flights,
+    upload_key,
+)
 from fastapi.concurrency import run_in_threadpool
-import tempfile, os, uuid
+from fastapi.responses import StreamingResponse
+from typing import Optional
+import asyncio, hashlib, tempfile, os, time, uuid
 
 router = APIRouter()
 
@@ -16,6 +44,23 @@ SUPPORTED_DRUGS = [
 
 MAX_BYTES = 5 * 1024 * 1024  # 5 MB
 
+# Raw-body streaming endpoint never buffers the file, so it can take much larger VCFs
+MAX_STREAM_BYTES = int(os.getenv("PHARMAGUARD_MAX_STREAM_BYTES", 1024 * 1024 * 1024))
+
+# Joint-called cohort VCFs are spooled to disk and parsed in one pass
+MAX_COHORT_BYTES = int(os.getenv("PHARMAGUARD_MAX_COHORT_BYTES", 1024 * 1024 * 1024))
+
+CHUNK_BYTES = 64 * 1024  # 64 KB chunks
+
+# Streaming response modes → media type
+STREAM_FORMATS = {
+    "sse": "text/event-stream",
+    "ndjson": "application/x-ndjson"
+}
+
+# Server-side directory for large VCF.gz (+ .tbi/.csi) files; disabled if unset
+UPLOAD_SLOT_DIR = os.getenv("PHARMAGUARD_UPLOAD_SLOT_DIR")
+
 
 def normalize_drug_name(d):
     d = d.strip().upper()
@@ -36,38 +81,114 @@ def normalize_drug_name(d):
     return d
 
 
-@router.post("/")
-async def analyze_vcf(
-    file: UploadFile = File(...),
-    drug: str = Form(...)
-):
+def normalize_drug_list(drug_field):
+    return list(dict.fromkeys(
+        normalize_drug_name(d)
+        for d in drug_field.split(",")
+        if d.strip()
+    ))
+
+
+def resolve_upload_slot(slot):
     """
-    Upload VCF + drug(s)
-    Supports comma-separated drugs
+    Map an upload-slot name to a file inside UPLOAD_SLOT_DIR.
+    Large bgzipped VCFs (+ .tbi/.csi) are dropped there out-of-band.
     """
+    if not UPLOAD_SLOT_DIR:
+        raise HTTPException(
+            status_code=400,
+            detail="Upload slots are not enabled on this server."
+        )
 
-    # ✅ STREAMED FILE VALIDATION (NO MEMORY SPIKE)
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".vcf")
+    base = os.path.realpath(UPLOAD_SLOT_DIR)
+    path = os.path.realpath(os.path.join(base, slot))
+
+    if os.path.commonpath([base, path]) != base or not os.path.isfile(path):
+        raise HTTPException(
+            status_code=404,
+            detail=f"Upload slot not found: {slot}"
+        )
+
+    return path
 
+
+async def _upload_chunks(file: UploadFile):
+    while True:
+        chunk = await file.read(CHUNK_BYTES)
+        if not chunk:
+            break
+        yield chunk
+
+
+async def hashed_chunks(chunks, digest):
+    """Pass chunks through, updating `digest`: the dedup key costs no extra pass over the upload."""
+    async for chunk in chunks:
+        digest.update(chunk)
+        yield chunk
+
+
+async def spool_upload(chunks, fout, max_bytes):
+    """Copy upload chunks into an open binary file with the size cap; returns bytes written."""
     size = 0
 
+    async for chunk in chunks:
+        size += len(chunk)
+
+        if size > max_bytes:
+            raise HTTPException(
+                status_code=400,
+                detail=f"VCF exceeds {max_bytes // (1024 * 1024)} MB size limit."
+            )
+
+        # ✅ disk writes off the event loop
+        await run_in_threadpool(fout.write, chunk)
+
+    if size == 0:
+        raise HTTPException(
+            status_code=400,
+            detail="Empty file uploaded."
+        )
+
+    observe("pharmaguard_upload_bytes", size)
+
+    return size
+
+
+async def parse_stream(chunks, max_bytes):
+    """
+    Feed chunks into an IncrementalVcfParser while the next chunk is being received.
+    Parsing runs off the event loop; bad files are rejected on the first bad chunk.
+    """
+    parser = IncrementalVcfParser()
+    pending = None
+    size = 0
+    parse_seconds = [0.0]
+
+    def feed(chunk):
+        # parse time only: the wait for the next chunk is the client's upload, not ours
+        started = time.perf_counter()
+        parser.feed(chunk)
+        parse_seconds[0] += time.perf_counter() - started
+
     try:
-        while True:
-            chunk = await file.read(64 * 1024)  # 64 KB chunks
-            if not chunk:
-                break
+        async for chunk in chunks:
+            if pending is not None:
+                await pending
+                pending = None
 
             size += len(chunk)
 
-            if size > MAX_BYTES:
-                tmp.close()
-                os.remove(tmp.name)
+            if size > max_bytes:
                 raise HTTPException(
                     status_code=400,
-                    detail="VCF exceeds 5 MB size limit."
+                    detail=f"VCF exceeds {max_bytes // (1024 * 1024)} MB size limit."
                 )
 
-            tmp.write(chunk)
+            pending = asyncio.ensure_future(run_in_threadpool(feed, chunk))
+
+        if pending is not None:
+            await pending
+            pending = None
 
         if size == 0:
             raise HTTPException(
@@ -75,52 +196,390 @@ async def analyze_vcf(
                 detail="Empty file uploaded."
             )
 
-        tmp.flush()
+        started = time.perf_counter()
+        variants = await run_in_threadpool(parser.close)
+
+        record_stage("parse", parse_seconds[0] + time.perf_counter() - started)
+        observe("pharmaguard_upload_bytes", size)
+
+        return variants
+
+    except VcfFormatError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid VCF: {e}"
+        )
+
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+
+async def profile_from_chunks(chunks, max_bytes):
+    """
+    Upload chunks → patient profile.
+    Threadpool mode parses while receiving; process-pool mode spools to a temp
+    file and hands the path to a worker process (same validation either way).
+    """
+    if cpu_executor.kind != "process":
+        variants = await parse_stream(chunks, max_bytes)
+
+        return await run_in_threadpool(
+            build_profile_from_variants,
+            variants
+        )
+
+    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".vcf")
+
+    try:
+        await spool_upload(chunks, tmp, max_bytes)
         tmp.close()
 
-        tmp_path = tmp.name
+        return await run_cpu(build_profile_from_upload, tmp.name)
 
-        # ✅ Patient ID generated once per upload
-        patient_id = str(uuid.uuid4())
+    except VcfFormatError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid VCF: {e}"
+        )
+
+    finally:
+        # ✅ Guaranteed cleanup
+        try:
+            tmp.close()
+            os.remove(tmp.name)
+        except Exception:
+            pass
 
-        # ✅ Normalize multiple drugs
-        drugs = [
-            normalize_drug_name(d)
-            for d in drug.split(",")
-            if d.strip()
-        ]
 
-        if not drugs:
+async def evaluate_drugs(patient_profile, drugs, patient_id, explanation="llm", deadline=None):
+
+    async def evaluate(d):
+        try:
+            return await evaluate_drug_async(patient_profile, d, patient_id, explanation, deadline)
+
+        except Exception as e:
             raise HTTPException(
-                status_code=400,
-                detail="No valid drug provided."
+                status_code=500,
+                detail=f"Analysis failed for drug {d}: {str(e)}"
             )
 
-        results = []
+    # ✅ Per-drug evaluations run concurrently; LLM latency ≈ slowest single call
+    results = await asyncio.gather(*(evaluate(d) for d in drugs))
 
-        # ✅ Run blocking analysis safely
-        for d in drugs:
-            try:
-                out = await run_in_threadpool(
-                    run_analysis_from_path,
-                    tmp_path,
-                    d,
-                    patient_id
-                )
-                results.append(out)
+    # ✅ Return single object or list
+    return results[0] if len(results) == 1 else list(results)
 
-            except Exception as e:
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"Analysis failed for drug {d}: {str(e)}"
-                )
 
-        # ✅ Return single object or list
-        return results[0] if len(results) == 1 else results
+async def drug_events(patient_profile, drugs, patient_id, explanation, deadline, fmt):
+    """
+    Streaming mode: per drug an `assessment` event (risk, profile, recommendation)
+    as soon as it is computed, then a `result` event with the explanation; `done` last.
+    """
+    events = asyncio.Queue()
+
+    async def evaluate(d):
+        try:
+            with drug_timings():
+                draft = await run_in_threadpool(assess_drug, patient_profile, d)
+                await events.put(("assessment", draft_result(draft, patient_id)))
+
+                resolved = await explain_draft(draft, patient_id, explanation, deadline)
+                await events.put(("result", finalize_drug_result(draft, resolved[0], patient_id, *resolved[1:])))
+
+        except Exception as e:
+            await events.put(("error", {
+                "drug": d,
+                "status_code": getattr(e, "status_code", 500),
+                "detail": f"Analysis failed for drug {d}: {getattr(e, 'detail', None) or str(e)}"
+            }))
+
+    tasks = [asyncio.create_task(evaluate(d)) for d in drugs]
+    finished = asyncio.ensure_future(asyncio.gather(*tasks))
+
+    try:
+        while not (finished.done() and events.empty()):
+            getter = asyncio.ensure_future(events.get())
+            await asyncio.wait({getter, finished}, return_when=asyncio.FIRST_COMPLETED)
+
+            if not getter.done():
+                getter.cancel()
+                continue
+
+            event, data = getter.result()
+            yield format_event(fmt, event, data)
+
+        yield format_event(fmt, "done", {"patient_id": patient_id, "drugs": drugs})
+
+    finally:
+        # ✅ client disconnected: stop outstanding work
+        for task in tasks:
+            task.cancel()
+
+
+async def cached_events(results, fmt):
+    """Streaming mode for a deduplicated upload: the same event sequence, all at once."""
+    results = results if isinstance(results, list) else [results]
+
+    for r in results:
+        assessment = {k: v for k, v in r.items() if k not in ("llm_generated_explanation", "quality_metrics")}
+        yield format_event(fmt, "assessment", assessment)
+        yield format_event(fmt, "result", r)
+
+    yield format_event(fmt, "done", {
+        "patient_id": results[0]["patient_id"],
+        "drugs": [r["drug"] for r in results]
+    })
+
+
+def format_event(fmt, event, data):
+    if fmt == "sse":
+        return b"event: " + event.encode() + b"\ndata: " + dumps(data) + b"\n\n"
+    return dumps({"event": event, "data": data}) + b"\n"
+
+
+def require_stream_format(stream, accept=None):
+    """None → plain JSON response; sse / ndjson → streaming response."""
+    if not stream:
+        return "sse" if accept and "text/event-stream" in accept else None
+
+    fmt = stream.strip().lower()
+    if fmt not in STREAM_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported stream format: {stream}. Use one of: {', '.join(STREAM_FORMATS)}."
+        )
+
+    return fmt
+
+
+def stream_response(events, fmt):
+    return StreamingResponse(
+        events,
+        media_type=STREAM_FORMATS[fmt],
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def analyze_upload_once(patient_profile, drugs, tier, deadline, key):
+    """
+    Non-streaming upload analysis, evaluated once per dedup key: concurrent
+    identical uploads wait for the first one, and full-quality results are cached.
+    """
+    flight, leader = upload_flights.join(key)
+
+    if not leader:
+        try:
+            # ✅ same drug set, maybe another order: answer in this request's order
+            return results_for(await upload_flights.wait_async(flight), drugs)
+        except LeaderAborted:
+            pass  # first request was cancelled: compute this one on its own
+
+    try:
+        patient_id = str(uuid.uuid4())
+        await save_profile(patient_id, patient_profile)
+
+        results = await evaluate_drugs(patient_profile, drugs, patient_id, tier, deadline)
+
+    except BaseException as e:
+        if leader:
+            upload_flights.resolve(key, flight, error=e)
+        raise
+
+    listed = results if isinstance(results, list) else [results]
+    if cacheable(listed, tier):
+        await run_in_threadpool(upload_cache.put, key, {"results": listed})
+
+    if leader:
+        upload_flights.resolve(key, flight, result={"results": listed})
+
+    return results
+
+
+async def respond(patient_profile, drugs, patient_id, tier, deadline, fmt, save=True):
+    if save:
+        # ✅ later drugs for this patient: POST /patients/{patient_id}/analyze, no re-upload
+        await save_profile(patient_id, patient_profile)
+
+    if fmt is None:
+        results = await evaluate_drugs(patient_profile, drugs, patient_id, tier, deadline)
+
+        # ✅ optional: the PDF is ready before the download button is clicked
+        prerender_report(results if isinstance(results, list) else [results])
+
+        return FastJSONResponse(results)
+
+    return stream_response(
+        drug_events(patient_profile, drugs, patient_id, tier, deadline, fmt),
+        fmt
+    )
+
+
+def require_explanation(explanation, deadline_ms, started):
+    """Validated explanation tier + absolute deadline (time.monotonic) or None."""
+    tier = (explanation or "llm").strip().lower()
+
+    if tier not in EXPLANATION_TIERS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported explanation mode: {explanation}. Use one of: {', '.join(EXPLANATION_TIERS)}."
+        )
+
+    if deadline_ms is None:
+        return tier, None
+
+    if deadline_ms <= 0:
+        raise HTTPException(
+            status_code=400,
+            detail="deadline_ms must be a positive integer."
+        )
+
+    return tier, started + deadline_ms / 1000
+
+
+def require_drugs(drug_field):
+    # ✅ Normalize multiple drugs (duplicates collapsed, order kept)
+    drugs = normalize_drug_list(drug_field)
+
+    if not drugs:
+        raise HTTPException(
+            status_code=400,
+            detail="No valid drug provided."
+        )
+
+    return drugs
+
+
+@router.post("/")
+async def analyze_vcf(
+    request: Request,
+    file: Optional[UploadFile] = File(None),
+    drug: str = Form(...),
+    slot: Optional[str] = Form(None),
+    explanation: str = Form("llm"),
+    deadline_ms: Optional[int] = Form(None),
+    stream: Optional[str] = Form(None)
+):
+    """
+    Upload VCF + drug(s)
+    Supports comma-separated drugs
+    `slot` analyzes a server-side file (e.g. whole-genome VCF.gz + index) instead of an upload
+    `explanation` none / template / llm; past `deadline_ms` the LLM tier falls back to template
+    `stream` sse / ndjson (or Accept: text/event-stream) streams per-drug events
+    """
+
+    started = time.monotonic()
+    drugs = require_drugs(drug)
+    tier, deadline = require_explanation(explanation, deadline_ms, started)
+    fmt = require_stream_format(stream, request.headers.get("accept"))
+
+    if slot:
+        # ✅ Parse + profile ONCE per upload
+        patient_profile = await run_cpu(
+            build_patient_profile,
+            resolve_upload_slot(slot)
+        )
+
+    elif file is None:
+        raise HTTPException(
+            status_code=400,
+            detail="No VCF file or upload slot provided."
+        )
+
+    elif UPLOAD_DEDUP:
+        # ✅ Same file + drugs + rules seen before → cached results, no risk / LLM stages
+        # (hashed in the same pass that parses it: a miss reads the upload once)
+        digest = hashlib.sha256()
+        patient_profile = await profile_from_chunks(hashed_chunks(_upload_chunks(file), digest), MAX_BYTES)
+
+        key = upload_key(digest.hexdigest(), drugs, tier)
+        cached = await run_in_threadpool(upload_cache.get, key)
+
+        if cached is not None:
+            results = results_for(cached, drugs)
+            return FastJSONResponse(results) if fmt is None else stream_response(cached_events(results, fmt), fmt)
+
+        if fmt is None:
+            results = await analyze_upload_once(patient_profile, drugs, tier, deadline, key)
+            prerender_report(results if isinstance(results, list) else [results])
+            return FastJSONResponse(results)
+
+    else:
+        # ✅ INCREMENTAL PARSE WHILE READING (no temp file, no memory spike)
+        patient_profile = await profile_from_chunks(_upload_chunks(file), MAX_BYTES)
+
+    # ✅ Patient ID generated once per upload (cached / coalesced results keep theirs)
+    patient_id = str(uuid.uuid4())
+
+    return await respond(patient_profile, drugs, patient_id, tier, deadline, fmt)
+
+
+@router.post("/stream")
+async def analyze_vcf_stream(
+    request: Request,
+    drug: str = Query(...),
+    explanation: str = Query("llm"),
+    deadline_ms: Optional[int] = Query(None),
+    stream: Optional[str] = Query(None)
+):
+    """
+    Raw VCF (or VCF.gz) as the request body, drug(s) as query parameter.
+    Variants are extracted while the body is still being received.
+    """
+
+    started = time.monotonic()
+    drugs = require_drugs(drug)
+    tier, deadline = require_explanation(explanation, deadline_ms, started)
+    fmt = require_stream_format(stream, request.headers.get("accept"))
+
+    patient_id = str(uuid.uuid4())
+
+    patient_profile = await profile_from_chunks(request.stream(), MAX_STREAM_BYTES)
+
+    return await respond(patient_profile, drugs, patient_id, tier, deadline, fmt)
+
+
+@router.post("/cohort")
+async def analyze_cohort_vcf(
+    file: Optional[UploadFile] = File(None),
+    drug: str = Form(...),
+    slot: Optional[str] = Form(None)
+):
+    """
+    Multi-sample (cohort) VCF + drug(s)
+    Every sample column is decoded in one pass; rule-based results per sample
+    """
+
+    drugs = require_drugs(drug)
+
+    if slot:
+        return await run_cpu(analyze_cohort, resolve_upload_slot(slot), drugs)
+
+    if file is None:
+        raise HTTPException(
+            status_code=400,
+            detail="No VCF file or upload slot provided."
+        )
+
+    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".vcf")
+
+    try:
+        await spool_upload(_upload_chunks(file), tmp, MAX_COHORT_BYTES)
+
+        tmp.close()
+
+        try:
+            return await run_cpu(analyze_cohort, tmp.name, drugs)
+        except Exception as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Cohort analysis failed: {str(e)}"
+            )
 
     finally:
         # ✅ Guaranteed cleanup
         try:
+            tmp.close()
             os.remove(tmp.name)
         except Exception:
             pass
@@ -0,0 +1,294 @@
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from app.routes.analyze import (
+    MAX_BYTES,
+    _upload_chunks,
+    profile_from_chunks,
+    require_drugs,
+    require_explanation,
+)
+from app.services.analyzer import build_profile_from_upload, evaluate_drug_async
+from app.services.cpu_executor import run_cpu
+from app.services.fast_json import dumps
+from app.services.profile_store import save_profile
+from app.services.vcf_parser import VcfFormatError
+from typing import List, Optional
+import asyncio, os, shutil, tarfile, tempfile, uuid, zipfile
+
+router = APIRouter()
+
+# ⭐ BATCH MODE: many single-sample VCFs, one NDJSON line per patient × drug
+# At most BATCH_CONCURRENCY files are spooled / parsed / explained at a time,
+# so memory and temp disk stay bounded however large the batch is.
+
+BATCH_CONCURRENCY = int(os.getenv("PHARMAGUARD_BATCH_CONCURRENCY", 4))
+BATCH_MAX_FILES = int(os.getenv("PHARMAGUARD_BATCH_MAX_FILES", 1000))
+
+VCF_SUFFIXES = (".vcf", ".vcf.gz", ".vcf.bgz")
+
+
+def _is_vcf_member(name):
+    base = os.path.basename(name)
+    return (
+        "__MACOSX" not in name
+        and not base.startswith(".")
+        and base.lower().endswith(VCF_SUFFIXES)
+    )
+
+
+def _open_archive(fileobj):
+    """zip / tar(.gz|.bz2|.xz) → generator of (name, size, opener); rejects anything else."""
+    head = fileobj.read(4)
+    fileobj.seek(0)
+
+    try:
+        if head.startswith(b"PK"):
+            archive = zipfile.ZipFile(fileobj)
+            entries = [
+                (i.filename, i.file_size, lambda i=i: archive.open(i))
+                for i in archive.infolist()
+                if not i.is_dir() and _is_vcf_member(i.filename)
+            ]
+            return iter(entries)
+
+        archive = tarfile.open(fileobj=fileobj, mode="r:*")
+
+    except (zipfile.BadZipFile, tarfile.TarError):
+        raise HTTPException(
+            status_code=400,
+            detail="Unsupported archive: expected .zip or .tar(.gz)."
+        )
+
+    # tar is read member by member, never listed up front
+    return (
+        (m.name, m.size, lambda m=m: archive.extractfile(m))
+        for m in archive
+        if m.isfile() and _is_vcf_member(m.name)
+    )
+
+
+def _spool_member(opener, max_bytes):
+    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".vcf")
+
+    try:
+        with opener() as src, tmp:
+            # copy at most max_bytes + 1 so oversize (or zip-bomb) members are cut off
+            shutil.copyfileobj(_capped(src, max_bytes + 1), tmp)
+
+        if os.path.getsize(tmp.name) > max_bytes:
+            raise HTTPException(
+                status_code=400,
+                detail=f"VCF exceeds {max_bytes // (1024 * 1024)} MB size limit."
+            )
+
+        return tmp.name
+
+    except BaseException:
+        _remove_quietly(tmp.name)
+        raise
+
+
+class _capped:
+
+    def __init__(self, src, limit):
+        self.src = src
+        self.left = limit
+
+    def read(self, n=-1):
+        if self.left <= 0:
+            return b""
+        n = self.left if n is None or n < 0 else min(n, self.left)
+        data = self.src.read(n)
+        self.left -= len(data)
+        return data
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+async def _profile_from_spooled(path):
+    try:
+        return await run_cpu(build_profile_from_upload, path)
+    except VcfFormatError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid VCF: {e}"
+        )
+
+
+async def _sources(files, members):
+    """(name, make_profile, cleanup_path) per VCF; archive members are spooled only when pulled."""
+    for f in files:
+        yield f.filename, (lambda f=f: profile_from_chunks(_upload_chunks(f), MAX_BYTES)), None
+
+    if members is None:
+        return
+
+    while True:
+        entry = await run_in_threadpool(next, members, None)
+        if entry is None:
+            return
+
+        name, size, opener = entry
+
+        if size > MAX_BYTES:
+            async def too_large():
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"VCF exceeds {MAX_BYTES // (1024 * 1024)} MB size limit."
+                )
+            yield name, too_large, None
+            continue
+
+        try:
+            path = await run_in_threadpool(_spool_member, opener, MAX_BYTES)
+        except HTTPException as e:
+            async def failed(e=e):
+                raise e
+            yield name, failed, None
+            continue
+
+        yield name, (lambda p=path: _profile_from_spooled(p)), path
+
+
+def _error_line(name, e, drug=None):
+    line = {"file": name}
+    if drug:
+        line["drug"] = drug
+
+    if isinstance(e, HTTPException):
+        line["error"] = {"status_code": e.status_code, "detail": e.detail}
+    else:
+        line["error"] = {"status_code": 500, "detail": f"Analysis failed: {str(e)}"}
+
+    return line
+
+
+async def batch_lines(files, members, drugs, explanation):
+    """Async NDJSON generator; lines are emitted in completion order."""
+    done = object()
+    lines = asyncio.Queue(maxsize=BATCH_CONCURRENCY * len(drugs))
+    slots = asyncio.Semaphore(BATCH_CONCURRENCY)
+    tasks = set()
+    counts = {"files": 0, "results": 0, "errors": 0}
+
+    async def process(name, make_profile, cleanup):
+        try:
+            try:
+                patient_profile = await make_profile()
+            except Exception as e:
+                await lines.put(_error_line(name, e))
+                return
+
+            patient_id = str(uuid.uuid4())
+            await save_profile(patient_id, patient_profile)
+
+            async def evaluate(d):
+                try:
+                    result = await evaluate_drug_async(patient_profile, d, patient_id, explanation)
+                    await lines.put({"file": name, "patient_id": patient_id, "drug": d, "result": result})
+                except Exception as e:
+                    await lines.put(_error_line(name, e, d))
+
+            # ✅ each drug's line is sent as soon as that drug is done
+            await asyncio.gather(*(evaluate(d) for d in drugs))
+
+        finally:
+            if cleanup:
+                _remove_quietly(cleanup)
+            slots.release()
+
+    async def produce():
+        sources = _sources(files, members)
+        try:
+            while True:
+                # ✅ a file is only pulled (and spooled) once a slot is free
+                await slots.acquire()
+                source = await anext(sources, None)
+
+                if source is None:
+                    slots.release()
+                    break
+
+                if counts["files"] >= BATCH_MAX_FILES:
+                    slots.release()
+                    if source[2]:
+                        _remove_quietly(source[2])
+                    await lines.put(_error_line(source[0], HTTPException(
+                        status_code=400,
+                        detail=f"Batch exceeds {BATCH_MAX_FILES} files; remaining files skipped."
+                    )))
+                    break
+
+                counts["files"] += 1
+                task = asyncio.create_task(process(*source))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+            await asyncio.gather(*list(tasks))
+
+        except Exception as e:
+            await lines.put(_error_line(None, e))
+
+        finally:
+            await sources.aclose()
+
+        await lines.put(done)
+
+    producer = asyncio.create_task(produce())
+
+    try:
+        while True:
+            line = await lines.get()
+            if line is done:
+                break
+
+            counts["errors" if "error" in line else "results"] += 1
+            yield dumps(line) + b"\n"
+
+        yield dumps({"summary": counts}) + b"\n"
+
+    finally:
+        # ✅ client went away (or we finished): stop all remaining work
+        producer.cancel()
+        for task in list(tasks):
+            task.cancel()
+
+
+@router.post("/batch")
+async def analyze_batch(
+    files: Optional[List[UploadFile]] = File(None),
+    archive: Optional[UploadFile] = File(None),
+    drug: str = Form(...),
+    explanation: str = Form("llm")
+):
+    """
+    Many single-sample VCFs (repeated `files` fields and/or one zip / tar(.gz) `archive`)
+    against a shared drug list. Streams NDJSON: one line per patient × drug as it
+    completes, per-file errors as lines, and a final summary line.
+    """
+
+    drugs = require_drugs(drug)
+    tier, _ = require_explanation(explanation, None, 0)
+
+    files = [f for f in files or [] if f.filename]
+
+    members = None
+    if archive is not None and archive.filename:
+        members = await run_in_threadpool(_open_archive, archive.file)
+
+    elif not files:
+        raise HTTPException(
+            status_code=400,
+            detail="No VCF files or archive provided."
+        )
+
+    return StreamingResponse(
+        batch_lines(files, members, drugs, tier),
+        media_type="application/x-ndjson"
+    )
@@ -0,0 +1,195 @@
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from app.routes.analyze import (
+    MAX_BYTES,
+    _upload_chunks,
+    evaluate_drugs,
+    require_drugs,
+    require_explanation,
+    resolve_upload_slot,
+    spool_upload,
+)
+from app.services.analyzer import build_profile_from_upload
+from app.services.cpu_executor import run_cpu
+from app.services.fast_json import FastJSONResponse
+from app.services.metrics import end_timings, start_timings
+from app.services.profile_store import save_profile
+from app.services.vcf_parser import VcfFormatError
+from app.services.jobs import (
+    JOB_RETENTION_SECONDS,
+    LANES,
+    JobWorkerPool,
+    get_job_queue,
+    spool_path,
+    wait_for_job,
+)
+from datetime import datetime
+from typing import Optional
+import os, time, uuid
+
+router = APIRouter()
+
+MAX_WAIT_SECONDS = 60
+
+worker_pool = None
+
+
+async def run_analysis_job(payload):
+    """Worker-side: the same pipeline as POST /analyze/, from a file on disk."""
+    # ✅ parse / profile stages land in the job's own timings (no HTTP request around it)
+    timings, token = start_timings()
+    try:
+        try:
+            patient_profile = await run_cpu(build_profile_from_upload, payload["path"])
+        except VcfFormatError as e:
+            # ✅ same 400 detail as /analyze/, stored as the job's error
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid VCF: {e}"
+            )
+
+        await save_profile(payload["patient_id"], patient_profile)
+
+        result = await evaluate_drugs(
+            patient_profile,
+            payload["drugs"],
+            payload["patient_id"],
+            payload["explanation"]
+        )
+    finally:
+        end_timings(token)
+
+    # ✅ spooled upload no longer needed once the job has a result
+    if payload.get("spooled"):
+        _remove_quietly(payload["path"])
+
+    return result
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _iso(ts):
+    if ts is None:
+        return None
+    return datetime.utcfromtimestamp(ts).replace(microsecond=0).isoformat() + "Z"
+
+
+def _job_view(job):
+    return {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "lane": job["lane"],
+        "attempts": job["attempts"],
+        "created_at": _iso(job["created_at"]),
+        "started_at": _iso(job["started_at"]),
+        "finished_at": _iso(job["finished_at"]),
+        "result": job["result"],
+        "error": job["error"]
+    }
+
+
+def _purge_finished_jobs():
+    for payload in get_job_queue().purge(time.time() - JOB_RETENTION_SECONDS):
+        if payload.get("spooled"):
+            _remove_quietly(payload["path"])
+
+
+async def start_job_workers():
+    global worker_pool
+    worker_pool = JobWorkerPool(run_analysis_job)
+    worker_pool.start()
+
+
+async def stop_job_workers():
+    global worker_pool
+    if worker_pool is not None:
+        await worker_pool.stop()
+        worker_pool = None
+
+
+@router.post("/", status_code=202)
+async def submit_job(
+    file: Optional[UploadFile] = File(None),
+    drug: str = Form(...),
+    slot: Optional[str] = Form(None),
+    lane: str = Form("interactive"),
+    explanation: str = Form("llm")
+):
+    """
+    Queue a VCF + drug(s) analysis; returns a job id immediately.
+    `lane` interactive (default) or bulk; poll GET /jobs/{job_id}?wait=30 for the result
+    """
+
+    drugs = require_drugs(drug)
+    tier, _ = require_explanation(explanation, None, 0)
+
+    lane = (lane or "").strip().lower()
+    if lane not in LANES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported lane: {lane}. Use one of: {', '.join(LANES)}."
+        )
+
+    if slot:
+        path, spooled = resolve_upload_slot(slot), False
+
+    elif file is None:
+        raise HTTPException(
+            status_code=400,
+            detail="No VCF file or upload slot provided."
+        )
+
+    else:
+        # ✅ upload spooled to the shared job directory so any worker node can read it
+        path, spooled = spool_path(uuid.uuid4().hex), True
+
+        try:
+            with open(path, "wb") as fout:
+                await spool_upload(_upload_chunks(file), fout, MAX_BYTES)
+        except BaseException:
+            _remove_quietly(path)
+            raise
+
+    payload = {
+        "path": path,
+        "spooled": spooled,
+        "drugs": drugs,
+        "explanation": tier,
+        "patient_id": str(uuid.uuid4())
+    }
+
+    queue = get_job_queue()
+    job_id = await run_in_threadpool(queue.submit, payload, lane)
+
+    if worker_pool is not None:
+        worker_pool.notify()
+
+    await run_in_threadpool(_purge_finished_jobs)
+
+    return {"job_id": job_id, "status": "queued", "lane": lane}
+
+
+@router.get("/{job_id}")
+async def get_job(
+    job_id: str,
+    wait: float = Query(0, ge=0, le=MAX_WAIT_SECONDS)
+):
+    """
+    Job status + result once done.
+    `wait` long-polls up to that many seconds for the job to finish
+    """
+
+    job = await wait_for_job(job_id, wait)
+
+    if job is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Job not found."
+        )
+
+    return FastJSONResponse(_job_view(job))
@@ -0,0 +1,57 @@
+from fastapi import APIRouter, Form, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from app.routes.analyze import (
+    require_drugs,
+    require_explanation,
+    require_stream_format,
+    respond,
+)
+from app.services.profile_store import profile_store
+from typing import Optional
+import time
+
+router = APIRouter()
+
+
+async def require_profile(patient_id):
+    # ✅ SQLite read (+ JSON decode) on a memory-tier miss: off the event loop
+    patient_profile = await run_in_threadpool(profile_store.get, patient_id)
+
+    if patient_profile is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Patient profile not found (unknown or expired patient_id); upload the VCF again."
+        )
+
+    return patient_profile
+
+
+@router.post("/{patient_id}/analyze")
+async def analyze_stored_patient(
+    request: Request,
+    patient_id: str,
+    drug: str = Form(...),
+    explanation: str = Form("llm"),
+    deadline_ms: Optional[int] = Form(None),
+    stream: Optional[str] = Form(None)
+):
+    """
+    More drug(s) for a patient analyzed before: the stored genotype profile is
+    evaluated directly, no VCF upload or parsing. Same fields / response as POST /analyze/
+    """
+
+    started = time.monotonic()
+    drugs = require_drugs(drug)
+    tier, deadline = require_explanation(explanation, deadline_ms, started)
+    fmt = require_stream_format(stream, request.headers.get("accept"))
+
+    patient_profile = await require_profile(patient_id)
+
+    return await respond(patient_profile, drugs, patient_id, tier, deadline, fmt, save=False)
+
+
+@router.delete("/{patient_id}", status_code=204)
+async def delete_stored_patient(patient_id: str):
+    """Forget a patient's stored genotype profile."""
+
+    await run_in_threadpool(profile_store.delete, patient_id)
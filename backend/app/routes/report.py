@@ -1,19 +1,214 @@
-from fastapi import APIRouter, Body
-from fastapi.responses import FileResponse
-from app.services.pdf_report import build_pdf_report
-import tempfile
+from fastapi import APIRouter, Body, Header, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
+from app.services.report_cache import cached_report, report_cache, report_key
+from typing import Optional
+from datetime import datetime
+import asyncio, io, json, os, re, zipfile
 
 router = APIRouter()
 
+# ⭐ Reports are rendered in memory on the CPU executor (threadpool or process
+# pool), never on the event loop and never via temp files, and cached by content
+# (app.services.report_cache): the cache key is also the ETag.
+
+REPORT_CONCURRENCY = int(os.getenv("PHARMAGUARD_REPORT_CONCURRENCY", 4))
+REPORT_MAX_PATIENTS = int(os.getenv("PHARMAGUARD_REPORT_MAX_PATIENTS", 1000))
+
+
+def _require_results(results):
+    if not results or not all(isinstance(r, dict) for r in results):
+        raise HTTPException(
+            status_code=400,
+            detail="Expected a non-empty list of drug results."
+        )
+    return results
+
+
+async def render_report(results, report_id=None):
+    """(report_id, pdf bytes)"""
+    try:
+        return await cached_report(results, report_id)
+    except (KeyError, TypeError, AttributeError, IndexError) as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid results payload: {str(e)}"
+        )
+
+
+def _group_by_patient(reports):
+    """[[results...], ...] (one list per patient) or a flat list of results → {patient_id: results}"""
+    groups = {}
+
+    for item in reports:
+        results = _require_results(item if isinstance(item, list) else [item])
+        patient_id = str(results[0].get("patient_id") or "unknown")
+        groups.setdefault(patient_id, []).extend(results)
+
+    return groups
+
+
+def _report_name(patient_id, taken):
+    base = re.sub(r"[^A-Za-z0-9._-]", "_", patient_id)[:64] or "unknown"
+    name, n = f"report_{base}.pdf", 1
+    while name in taken:
+        n += 1
+        name = f"report_{base}_{n}.pdf"
+    taken.add(name)
+    return name
+
+
+class _ZipChunks(io.RawIOBase):
+    """Write-only, unseekable sink: zipfile writes into it, we hand the bytes on."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+async def zip_reports(groups):
+    """Async generator of zip bytes; each PDF is appended as soon as it's rendered."""
+    slots = asyncio.Semaphore(REPORT_CONCURRENCY)
+    names = set()
+
+    async def render(patient_id, results):
+        async with slots:
+            try:
+                _, pdf = await render_report(results)
+                return patient_id, pdf, None
+            except Exception as e:
+                return patient_id, None, getattr(e, "detail", None) or str(e)
+
+    tasks = [asyncio.create_task(render(pid, results)) for pid, results in groups.items()]
+
+    sink = _ZipChunks()
+    archive = zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED)
+    stamp = datetime.utcnow().timetuple()[:6]
+    errors = {}
+
+    try:
+        # ✅ completion order: a slow report never holds back the finished ones
+        for next_done in asyncio.as_completed(tasks):
+            patient_id, pdf, error = await next_done
+
+            if error is not None:
+                errors[patient_id] = error
+                continue
+
+            archive.writestr(zipfile.ZipInfo(_report_name(patient_id, names), stamp), pdf)
+            yield sink.drain()
+
+        if errors:
+            archive.writestr(zipfile.ZipInfo("errors.json", stamp), json.dumps(errors, indent=2))
+
+        archive.close()
+        yield sink.drain()
+
+    finally:
+        # ✅ client went away (or we finished): stop all remaining renders
+        for task in tasks:
+            task.cancel()
+
+
+def _etag(report_id):
+    return f'"{report_id}"'
+
+
+def _etag_matches(if_none_match, report_id):
+    if not if_none_match:
+        return False
+    tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+    return "*" in tags or _etag(report_id) in tags
+
+
+def pdf_response(report_id, pdf, if_none_match=None):
+    headers = {
+        "ETag": _etag(report_id),
+        "Content-Location": f"/report/{report_id}",
+        # ✅ patient data: browser may keep it, but must revalidate; shared caches must not
+        "Cache-Control": "private, no-cache",
+    }
+
+    if _etag_matches(if_none_match, report_id):
+        return Response(status_code=304, headers=headers)
+
+    headers["Content-Disposition"] = 'attachment; filename="clinical_report.pdf"'
+    return Response(content=pdf, media_type="application/pdf", headers=headers)
+
+
 @router.post("/")
-async def generate_report(results: list = Body(...)):  
+async def generate_report(results: list = Body(...)):
+    """
+    Results of one patient → PDF. Rendered once per distinct results (cached by content);
+    revalidate with GET /report/{report_id} + If-None-Match (304 is only defined for GET / HEAD)
+    """
+
+    report_id = report_key(_require_results(results))
+
+    _, pdf = await render_report(results, report_id)
+
+    return pdf_response(report_id, pdf)
+
+
+@router.get("/{report_id}")
+async def get_report(
+    report_id: str,
+    if_none_match: Optional[str] = Header(None)
+):
+    """A previously rendered report by its id (the ETag / Content-Location of POST /report/)."""
+
+    if len(report_id) != 64 or not all(c in "0123456789abcdef" for c in report_id):
+        raise HTTPException(status_code=404, detail="Report not found.")
+
+    # ✅ a matching ETag is the same content by construction: existence check, no read
+    if _etag_matches(if_none_match, report_id):
+        if not await run_in_threadpool(report_cache.contains, report_id):
+            raise HTTPException(status_code=404, detail="Report not found.")
+        return pdf_response(report_id, None, if_none_match)
+
+    pdf = await run_in_threadpool(report_cache.get, report_id)
+
+    if pdf is None:
+        raise HTTPException(status_code=404, detail="Report not found.")
+
+    return pdf_response(report_id, pdf)
+
+
+@router.post("/bulk")
+async def generate_reports_bulk(reports: list = Body(...)):
+    """
+    One PDF per patient, streamed back as a single zip.
+    Body: a list of per-patient result lists, or a flat list of drug results
+    (grouped by patient_id). Patients whose report fails are listed in errors.json
+    """
+
+    groups = _group_by_patient(reports)
 
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
+    if not groups:
+        raise HTTPException(
+            status_code=400,
+            detail="No patient results provided."
+        )
 
-    build_pdf_report(results, tmp.name)
+    if len(groups) > REPORT_MAX_PATIENTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Bulk report exceeds {REPORT_MAX_PATIENTS} patients."
+        )
 
-    return FileResponse(
-        tmp.name,
-        media_type="application/pdf",
-        filename="clinical_report.pdf"
+    return StreamingResponse(
+        zip_reports(groups),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="clinical_reports.zip"'}
     )
@@ -1,18 +1,22 @@
-from app.services.vcf_parser import parse_vcf
-from app.services.diplotype import build_pharmacogenomic_profile
+from app.services.vcf_parser import parse_vcf, parse_vcf_upload
+from app.services.diplotype import build_pharmacogenomic_profile, generate_clinical_interpretation
 from app.services.risk_engine import assess_drug_risk
 from app.services.recommendation import get_clinical_recommendation
-from app.services.llm_explainer import generate_explanation
+from app.services.llm_explainer import generate_explanation, generate_explanation_async
+from app.services.knowledge_base import KB
+from app.services.metrics import current_timings, drug_timings, observe, stage
 
 from datetime import datetime
 from pydantic import ValidationError
 from app.schemas import FinalOutput
-from fastapi.encoders import jsonable_encoder
 from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
 
+import asyncio
 import logging
-from pathlib import Path
-import json
+import time
+
+_rsid_star = KB["rsid_star"]
 
 
 # ✅ DRUG-LEVEL CLINICAL INTERPRETATION ENGINE ⭐⭐⭐⭐⭐
@@ -37,23 +41,72 @@ def generate_drug_interpretation(drug, risk_label, gene, phenotype):
     return base + "Pharmacogenomic impact uncertain."
 
 
-def run_analysis_from_path(vcf_path: str, drug: str, patient_id: str):
+# ✅ STAGE 1: PATIENT PROFILE (parse once per upload)
+def build_profile_from_variants(variants):
+    """
+    Build the per-gene PGx profile from parsed variants.
+    The result is drug-independent and can be evaluated against any number of drugs.
+    """
 
     try:
-        # ✅ 1) Parse VCF
-        variants = parse_vcf(vcf_path)
-
         if not isinstance(variants, list):
             raise ValueError("VCF parser returned invalid structure")
 
+        observe("pharmaguard_variant_count", len(variants))
+
         # ✅ 2) Build PGx profile
-        pgx_profile = build_pharmacogenomic_profile(variants)
+        with stage("profile"):
+            pgx_profile = build_pharmacogenomic_profile(variants)
 
         if not isinstance(pgx_profile, dict):
             raise ValueError("PGx profile construction failed")
 
+        return {
+            "variants": variants,
+            "pgx_profile": pgx_profile
+        }
+
+    except Exception as e:
+        logging.exception("Profile construction failure")
+        raise HTTPException(status_code=500, detail=f"Analysis engine failure: {str(e)}")
+
+
+def build_patient_profile(vcf_path: str):
+
+    try:
+        # ✅ 1) Parse VCF
+        with stage("parse"):
+            variants = parse_vcf(vcf_path)
+
+    except Exception as e:
+        logging.exception("VCF parsing failure")
+        raise HTTPException(status_code=500, detail=f"Analysis engine failure: {str(e)}")
+
+    return build_profile_from_variants(variants)
+
+
+def build_profile_from_upload(vcf_path: str):
+    """Spooled upload → profile; format errors surface as VcfFormatError (HTTP 400)."""
+    with stage("parse"):
+        variants = parse_vcf_upload(vcf_path)
+
+    return build_profile_from_variants(variants)
+
+
+# ✅ STAGE 2: DRUG EVALUATION (cheap, per drug)
+def assess_drug(patient_profile: dict, drug: str):
+    """
+    Everything for one drug except the LLM explanation: risk, profile slice,
+    consistency check and recommendation. Returns a draft for finalize_drug_result.
+    """
+
+    try:
+        variants = patient_profile["variants"]
+        pgx_profile = patient_profile["pgx_profile"]
+
         # ✅ 3) Risk assessment
-        risk_block = assess_drug_risk(drug, pgx_profile)
+        with stage("risk"):
+            risk_block = assess_drug_risk(drug, pgx_profile)
 
         primary_gene = risk_block.get("primary_gene")
 
@@ -61,6 +114,7 @@ def run_analysis_from_path(vcf_path: str, drug: str, patient_id: str):
         diplotype = None
         activity_score = None
         decision_trace = None
+        clinical_interpretation = None
         detected_variants = []
         diplotype_consistent = True  # ⭐ NEW
 
@@ -73,31 +127,19 @@ def run_analysis_from_path(vcf_path: str, drug: str, patient_id: str):
 
             activity_score = gene_block.get("activity_score")
             decision_trace = gene_block.get("decision_trace")
+            clinical_interpretation = gene_block.get("clinical_interpretation")
 
             # ---------- COLLECT DETECTED VARIANTS ----------
+            # copies: star auto-fill below must not leak into the shared profile
             detected_variants = [
-                v for v in variants
+                dict(v) for v in variants
                 if v.get("gene") == primary_gene
             ]
 
             # ---------- STAR AUTO-FILL BEFORE CONSISTENCY CHECK ----------
-            # Robustly support rsid_star_map entries that are either dicts or simple strings.
-            BASE = Path(__file__).resolve().parents[1]
-            try:
-                rsid_star_map = json.loads((BASE / "rules" / "rsid_star_map.json").read_text())
-
-            except Exception:
-                rsid_star_map = {}
-
             for v in detected_variants:
-                if not v.get("star") and v.get("rsid") in rsid_star_map:
-                    mapping = rsid_star_map[v["rsid"]]
-
-                    # support both formats: {"allele":"*3", "gene":"CYP2C9"}  OR  "*3"
-                    if isinstance(mapping, dict):
-                        allele = mapping.get("allele") or mapping.get("allele_name") or mapping.get("value")
-                    else:
-                        allele = mapping  # string case
+                if not v.get("star") and v.get("rsid") in _rsid_star:
+                    allele = _rsid_star[v["rsid"]][1]
 
                     if allele:
                         v["star"] = allele
@@ -129,70 +171,247 @@ def run_analysis_from_path(vcf_path: str, drug: str, patient_id: str):
                         break
 
         # ✅ 4) Recommendation
-        rec = get_clinical_recommendation(drug, primary_gene, phenotype)
-
-        # ✅ 5) LLM Explanation
-        if not detected_variants or not phenotype:
-            llm = {
-                "summary": rec.get("text"),
-                "mechanism": "No variant-level evidence available.",
-                "evidence": "None",
-                "citations": [],
-                "generated_at": datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
-            }
-        else:
-            llm = generate_explanation(
-                patient_id,
-                drug,
-                primary_gene,
-                phenotype,
-                detected_variants,
-                rec.get("text")
-            )
-
-        timestamp = datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
-
-        drug_interpretation = generate_drug_interpretation(
-            drug.upper(),
-            risk_block["risk_assessment"]["risk_label"],
-            primary_gene,
-            phenotype
+        with stage("recommendation"):
+            rec = get_clinical_recommendation(drug, primary_gene, phenotype)
+
+        return {
+            "drug": drug,
+            "risk_block": risk_block,
+            "primary_gene": primary_gene,
+            "phenotype": phenotype,
+            "diplotype": diplotype,
+            "activity_score": activity_score,
+            "decision_trace": decision_trace,
+            "clinical_interpretation": clinical_interpretation,
+            "detected_variants": detected_variants,
+            "diplotype_consistent": diplotype_consistent,
+            "rec": rec,
+            "variant_count": len(variants)
+        }
+
+    except Exception as e:
+        logging.exception("Analysis pipeline failure")
+        raise HTTPException(status_code=500, detail=f"Analysis engine failure: {str(e)}")
+
+
+# ✅ 5) LLM Explanation inputs (None → no variant-level evidence, no LLM call)
+def explanation_request(draft):
+    if not draft["detected_variants"] or not draft["phenotype"]:
+        return None
+
+    return (
+        draft["drug"],
+        draft["primary_gene"],
+        draft["phenotype"],
+        draft["detected_variants"],
+        draft["rec"].get("text")
+    )
+
+
+def no_evidence_explanation(draft):
+    return {
+        "summary": draft["rec"].get("text"),
+        "mechanism": "No variant-level evidence available.",
+        "evidence": "None",
+        "citations": [],
+        "generated_at": datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
+    }
+
+
+# ⭐ EXPLANATION TIERS: none (recommendation only) / template (deterministic) / llm
+EXPLANATION_TIERS = ("none", "template", "llm")
+
+
+def minimal_explanation(draft):
+    return {
+        "summary": draft["rec"].get("text"),
+        "mechanism": None,
+        "evidence": None,
+        "citations": [],
+        "generated_at": datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
+    }
+
+
+def template_explanation(draft):
+    """Deterministic explanation from the rule-based interpretation engines (no network)."""
+    drug_interpretation = generate_drug_interpretation(
+        draft["drug"].upper(),
+        draft["risk_block"]["risk_assessment"]["risk_label"],
+        draft["primary_gene"],
+        draft["phenotype"]
+    )
+
+    mechanism = draft["clinical_interpretation"]
+    if not mechanism and draft["primary_gene"]:
+        mechanism = generate_clinical_interpretation(
+            draft["primary_gene"],
+            draft["phenotype"],
+            draft["activity_score"]
         )
 
-        final = {
-            "patient_id": patient_id,
-            "drug": drug.upper(),
-            "timestamp": timestamp,
-            "risk_assessment": risk_block["risk_assessment"],
-            "pharmacogenomic_profile": {
-                "primary_gene": primary_gene,
-                "diplotype": diplotype,
-                "phenotype": phenotype,
-                "activity_score": activity_score,
-                "decision_trace": decision_trace,
-                "detected_variants": detected_variants
-            },
-            "drug_level_interpretation": drug_interpretation,
-            "clinical_recommendation": rec,
-            "llm_generated_explanation": llm,
-            "quality_metrics": {
-                "vcf_parsing_success": True,
-                "variant_count": len(variants),
-                "gene_match_success": True if primary_gene else False,
-                "llm_success": True,
-                "diplotype_consistency_check": diplotype_consistent  # ⭐ NEW
-            }
+    rsids = [v.get("rsid") for v in draft["detected_variants"] if v.get("rsid")]
+
+    return {
+        "summary": f"{drug_interpretation} {draft['rec'].get('text')}".strip(),
+        "mechanism": mechanism,
+        "evidence": "CPIC" + (f" ({', '.join(rsids)})" if rsids else ""),
+        "citations": ["CPIC guideline"],
+        "generated_at": datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
+    }
+
+
+def draft_result(draft: dict, patient_id: str):
+    """Everything of the final result that does not depend on the explanation."""
+    drug = draft["drug"]
+    primary_gene = draft["primary_gene"]
+    phenotype = draft["phenotype"]
+    risk_block = draft["risk_block"]
+
+    timestamp = datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
+
+    drug_interpretation = generate_drug_interpretation(
+        drug.upper(),
+        risk_block["risk_assessment"]["risk_label"],
+        primary_gene,
+        phenotype
+    )
+
+    return {
+        "patient_id": patient_id,
+        "drug": drug.upper(),
+        "timestamp": timestamp,
+        "risk_assessment": risk_block["risk_assessment"],
+        "pharmacogenomic_profile": {
+            "primary_gene": primary_gene,
+            "diplotype": draft["diplotype"],
+            "phenotype": phenotype,
+            "activity_score": draft["activity_score"],
+            "decision_trace": draft["decision_trace"],
+            "detected_variants": draft["detected_variants"]
+        },
+        "drug_level_interpretation": drug_interpretation,
+        "clinical_recommendation": draft["rec"]
+    }
+
+
+def finalize_drug_result(draft: dict, llm: dict, patient_id: str, tier="llm", llm_success=True):
+
+    try:
+        final = draft_result(draft, patient_id)
+
+        final["llm_generated_explanation"] = llm
+        final["quality_metrics"] = {
+            "vcf_parsing_success": True,
+            "variant_count": draft["variant_count"],
+            "gene_match_success": True if draft["primary_gene"] else False,
+            "llm_success": llm_success,
+            "diplotype_consistency_check": draft["diplotype_consistent"],  # ⭐ NEW
+            "explanation_tier": tier
         }
 
-        # ✅ Schema validation
+        # ✅ Schema validation: one pydantic v2 pass. `final` is already JSON-native,
+        # so it is returned as-is and serialized once, by the response (fast_json)
         try:
-            FinalOutput.parse_obj(final)
+            with stage("validation"):
+                FinalOutput.model_validate(final)
         except ValidationError as e:
             logging.error(f"Schema validation failed: {e}")
             raise HTTPException(status_code=500, detail="Internal schema validation failure")
 
-        return jsonable_encoder(final)
+        # ✅ Where this drug's time went (request-level parse / profile + its own stages)
+        timings = current_timings()
+        if timings is not None:
+            final["quality_metrics"]["stage_timings_ms"] = timings.as_ms()
+
+        return final
+
+    except HTTPException:
+        raise
 
     except Exception as e:
         logging.exception("Analysis pipeline failure")
         raise HTTPException(status_code=500, detail=f"Analysis engine failure: {str(e)}")
+
+
+def _deterministic_tier(draft, explanation):
+    """(payload, tier, llm_success) when no LLM call is needed, else None."""
+    if explanation == "none":
+        return minimal_explanation(draft), "none", False
+
+    if explanation == "template":
+        return template_explanation(draft), "template", False
+
+    if explanation_request(draft) is None:
+        return no_evidence_explanation(draft), "none", True
+
+    return None
+
+
+def evaluate_drug(patient_profile: dict, drug: str, patient_id: str, explanation="llm"):
+
+    with drug_timings():
+        draft = assess_drug(patient_profile, drug)
+        resolved = _deterministic_tier(draft, explanation)
+
+        if resolved is None:
+            with stage("llm"):
+                llm = generate_explanation(patient_id, *explanation_request(draft))
+            resolved = (llm, "llm", True)
+
+        return finalize_drug_result(draft, resolved[0], patient_id, *resolved[1:])
+
+
+async def explain_draft(draft: dict, patient_id: str, explanation="llm", deadline=None):
+    """
+    (explanation payload, tier, llm_success) for an assessed drug, LLM call non-blocking.
+    `deadline` (time.monotonic() value): past it the template tier is used instead;
+    the LLM call keeps running in the background and still fills the cache.
+    """
+    resolved = _deterministic_tier(draft, explanation)
+    if resolved is not None:
+        return resolved
+
+    if deadline is not None and deadline - time.monotonic() <= 0:
+        # ✅ budget already spent (parse / profile / earlier drugs): don't start an LLM call
+        return template_explanation(draft), "template", False
+
+    call = asyncio.ensure_future(
+        generate_explanation_async(patient_id, *explanation_request(draft))
+    )
+
+    try:
+        with stage("llm"):
+            if deadline is None:
+                llm = await call
+            else:
+                llm = await asyncio.wait_for(
+                    asyncio.shield(call),
+                    max(0.0, deadline - time.monotonic())
+                )
+        return llm, "llm", True
+
+    except asyncio.TimeoutError:
+        logging.info(f"LLM explanation for {draft['drug']} missed the deadline; using template")
+        return template_explanation(draft), "template", False
+
+
+async def evaluate_drug_async(
+    patient_profile: dict,
+    drug: str,
+    patient_id: str,
+    explanation="llm",
+    deadline=None
+):
+    """
+    evaluate_drug with a non-blocking LLM call, so several drugs can be
+    explained concurrently (bounded by the explainer's fan-out limit).
+    """
+    with drug_timings():
+        draft = await run_in_threadpool(assess_drug, patient_profile, drug)
+        resolved = await explain_draft(draft, patient_id, explanation, deadline)
+
+        return finalize_drug_result(draft, resolved[0], patient_id, *resolved[1:])
+
+
+def run_analysis_from_path(vcf_path: str, drug: str, patient_id: str):
+    return evaluate_drug(build_patient_profile(vcf_path), drug, patient_id)
@@ -0,0 +1,282 @@
+import gzip
+import os
+import struct
+import zlib
+
+# ⭐ Pure-python BGZF + tabix/CSI region reader (no htslib / external binaries)
+# Specs: SAMv1 §4.1 (BGZF), tabix.pdf (TBI), CSIv1.pdf (CSI)
+
+_BGZF_HEADER = struct.Struct("<BBBBIBBH")  # ID1 ID2 CM FLG MTIME XFL OS XLEN
+
+
+def find_index(vcf_path):
+    """Return the path of a .tbi / .csi index sitting next to the VCF, if any."""
+    for ext in (".tbi", ".csi"):
+        if os.path.exists(vcf_path + ext):
+            return vcf_path + ext
+    return None
+
+
+def is_gzip(path):
+    with open(path, "rb") as f:
+        return f.read(2) == b"\x1f\x8b"
+
+
+class BgzfReader:
+    """Random access to a BGZF file through 64-bit virtual offsets."""
+
+    def __init__(self, path):
+        self._f = open(path, "rb")
+        self._cached = (None, b"", None)
+
+    def close(self):
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _block(self, coffset):
+        """Decompress the block at ``coffset`` → (data, next block offset or None at EOF)."""
+        if self._cached[0] == coffset:
+            return self._cached[1], self._cached[2]
+
+        self._f.seek(coffset)
+        head = self._f.read(_BGZF_HEADER.size)
+        if len(head) < _BGZF_HEADER.size:
+            return b"", None
+
+        id1, id2, _, flg, _, _, _, xlen = _BGZF_HEADER.unpack(head)
+        if id1 != 31 or id2 != 139 or not flg & 4:
+            raise ValueError(f"Not a BGZF block at offset {coffset}")
+
+        extra = self._f.read(xlen)
+        bsize = None
+        i = 0
+        while i + 4 <= xlen:
+            si1, si2, slen = extra[i], extra[i + 1], struct.unpack_from("<H", extra, i + 2)[0]
+            if si1 == 66 and si2 == 67:
+                bsize = struct.unpack_from("<H", extra, i + 4)[0]
+            i += 4 + slen
+
+        if bsize is None:
+            raise ValueError(f"BGZF block without BSIZE at offset {coffset}")
+
+        cdata = self._f.read(bsize - xlen - 19)
+        data = zlib.decompressobj(-15).decompress(cdata)
+        next_coffset = coffset + bsize + 1
+
+        self._cached = (coffset, data, next_coffset)
+        return data, next_coffset
+
+    def read_lines(self, start, end=None):
+        """
+        Yield raw lines (bytes, no newline) that begin at virtual offsets in [start, end).
+        ``end=None`` reads to EOF.
+        """
+        coffset, pos = start >> 16, start & 0xFFFF
+        pending = b""
+        pending_vo = None
+
+        while coffset is not None:
+            data, next_coffset = self._block(coffset)
+
+            while pos < len(data):
+                line_vo = pending_vo if pending_vo is not None else (coffset << 16) | pos
+                if end is not None and line_vo >= end:
+                    return
+
+                nl = data.find(b"\n", pos)
+                if nl < 0:
+                    if pending_vo is None:
+                        pending_vo = line_vo
+                    pending += data[pos:]
+                    break
+
+                yield pending + data[pos:nl]
+                pending = b""
+                pending_vo = None
+                pos = nl + 1
+
+            coffset, pos = next_coffset, 0
+
+        if pending:
+            yield pending
+
+
+# ---------- INDEX PARSING ----------
+def _reg2bins(beg, end, min_shift, depth):
+    """Bins overlapping the 0-based half-open interval [beg, end) (CSIv1 §3)."""
+    bins = []
+    end -= 1
+    s = min_shift + depth * 3
+    t = 0
+    for level in range(depth + 1):
+        bins.extend(range(t + (beg >> s), t + (end >> s) + 1))
+        s -= 3
+        t += 1 << (level * 3)
+    return bins
+
+
+def _parse_tbx_conf(buf, off):
+    """format, col_seq, col_beg, col_end, meta, skip, l_nm + names block."""
+    fmt, col_seq, col_beg, col_end, meta, skip, l_nm = struct.unpack_from("<7i", buf, off)
+    off += 28
+    names = [n.decode() for n in buf[off:off + l_nm].split(b"\0") if n]
+    return names, off + l_nm
+
+
+class RegionIndex:
+    """Tabix (.tbi) or CSI (.csi) index → merged chunk lists for a region query."""
+
+    def __init__(self, index_path, header_contigs=None):
+        buf = gzip.decompress(open(index_path, "rb").read())
+        magic = buf[:4]
+        self.refs = {}
+
+        if magic == b"TBI\1":
+            self.min_shift, self.depth = 14, 5
+            n_ref = struct.unpack_from("<i", buf, 4)[0]
+            names, off = _parse_tbx_conf(buf, 8)
+            off = self._parse_refs(buf, off, n_ref, names, csi=False)
+
+        elif magic == b"CSI\1":
+            self.min_shift, self.depth, l_aux = struct.unpack_from("<3i", buf, 4)
+            off = 16
+            names = _parse_tbx_conf(buf, off)[0] if l_aux >= 28 else []
+            off += l_aux
+            n_ref = struct.unpack_from("<i", buf, off)[0]
+            # bcftools may omit names in aux; fall back to ##contig order
+            if len(names) < n_ref:
+                names = list(header_contigs or [])
+            off = self._parse_refs(buf, off + 4, n_ref, names, csi=True)
+
+        else:
+            raise ValueError(f"Unrecognized index format: {index_path}")
+
+    def _parse_refs(self, buf, off, n_ref, names, csi):
+        pseudo_bin = ((1 << (3 * (self.depth + 1))) - 1) // 7 + 1
+
+        for r in range(n_ref):
+            n_bin = struct.unpack_from("<i", buf, off)[0]
+            off += 4
+            bins = {}
+            loffsets = {}
+
+            for _ in range(n_bin):
+                if csi:
+                    bin_id, loffset, n_chunk = struct.unpack_from("<IQi", buf, off)
+                    off += 16
+                else:
+                    bin_id, n_chunk = struct.unpack_from("<Ii", buf, off)
+                    loffset = 0
+                    off += 8
+
+                chunks = list(struct.iter_unpack("<QQ", buf[off:off + 16 * n_chunk]))
+                off += 16 * n_chunk
+
+                if bin_id != pseudo_bin:
+                    bins[bin_id] = chunks
+                    loffsets[bin_id] = loffset
+
+            linear = []
+            if not csi:
+                n_intv = struct.unpack_from("<i", buf, off)[0]
+                off += 4
+                linear = list(struct.unpack_from(f"<{n_intv}Q", buf, off))
+                off += 8 * n_intv
+
+            if r < len(names):
+                self.refs[names[r]] = (bins, loffsets, linear)
+
+        return off
+
+    def resolve_contig(self, chrom):
+        """Match '22' / 'chr22' naming against the index."""
+        if chrom in self.refs:
+            return chrom
+        alt = chrom[3:] if chrom.startswith("chr") else "chr" + chrom
+        return alt if alt in self.refs else None
+
+    def chunks(self, chrom, start, end):
+        """Chunks (virtual offset pairs) that may hold records in 1-based [start, end]."""
+        contig = self.resolve_contig(chrom)
+        if contig is None:
+            return []
+
+        bins, loffsets, linear = self.refs[contig]
+        beg = max(start - 1, 0)
+        candidates = _reg2bins(beg, end, self.min_shift, self.depth)
+
+        # lower bound on the first record overlapping beg
+        min_off = 0
+        if linear:
+            min_off = linear[min(beg >> self.min_shift, len(linear) - 1)]
+        else:
+            # CSI: loffset of the finest existing bin containing beg
+            b = ((1 << (3 * self.depth)) - 1) // 7 + (beg >> self.min_shift)
+            while b > 0 and b not in loffsets:
+                b = (b - 1) >> 3
+            min_off = loffsets.get(b, 0)
+
+        return [
+            (cbeg, cend)
+            for b in candidates
+            for cbeg, cend in bins.get(b, ())
+            if cend > min_off
+        ]
+
+
+def merge_chunks(chunks):
+    merged = []
+    for beg, end in sorted(chunks):
+        if merged and beg <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([beg, end])
+    return merged
+
+
+def read_indexed_regions(vcf_path, index_path, regions):
+    """
+    Yield the VCF header lines followed by every record overlapping ``regions``
+    (iterable of (chrom, start, end), 1-based inclusive), in file order.
+    Only the BGZF blocks referenced by the index are decompressed.
+    """
+    with BgzfReader(vcf_path) as reader:
+        header = []
+        for raw in reader.read_lines(0):
+            line = raw.decode(errors="ignore")
+            if not line.startswith("#"):
+                break
+            header.append(line)
+            yield line + "\n"
+
+        contigs = [
+            h.split("ID=", 1)[1].split(",", 1)[0].rstrip(">")
+            for h in header if h.startswith("##contig=<")
+        ]
+        index = RegionIndex(index_path, header_contigs=contigs)
+
+        wanted = {}
+        chunks = []
+        for chrom, start, end in regions:
+            contig = index.resolve_contig(chrom)
+            if contig is None:
+                continue
+            wanted.setdefault(contig, []).append((start, end))
+            chunks.extend(index.chunks(contig, start, end))
+
+        for beg, end in merge_chunks(chunks):
+            for raw in reader.read_lines(beg, end):
+                line = raw.decode(errors="ignore")
+                cols = line.split("\t", 4)
+                if len(cols) < 4 or not cols[1].isdigit():
+                    continue
+
+                pos = int(cols[1])
+                last = pos + max(len(cols[3]), 1) - 1
+                if any(s <= last and pos <= e for s, e in wanted.get(cols[0], ())):
+                    yield line + "\n"
@@ -0,0 +1,142 @@
+from app.services.vcf_parser import parse_vcf_cohort, sample_variants
+from app.services.diplotype import (
+    TARGET_GENES,
+    infer_star_from_rsids,
+    profile_confidence,
+    select_diplotype_alleles,
+)
+from app.services.risk_engine import assess_drug_risk
+from app.services.recommendation import get_clinical_recommendation
+
+import logging
+import uuid
+
+
+def _batch_profiles(genotype_variants):
+    """
+    Compact per-gene profiles (diplotype, phenotype, activity_score, confidence)
+    for many genotypes at once: allele pairs are picked per genotype, then
+    activity scores and phenotypes are called per gene in one vectorized pass
+    (diplotype_batch: same rules as build_pharmacogenomic_profile).
+    """
+    # numpy only for cohorts (see parse_vcf_cohort_lines)
+    from app.services.diplotype_batch import batch_call_phenotypes, codec_for, decode_phenotypes
+
+    profiles = [{} for _ in genotype_variants]
+    called = {gene: [] for gene in TARGET_GENES}  # gene → [(genotype index, left, right, star annotated)]
+
+    for i, variants in enumerate(genotype_variants):
+        gene_alleles = infer_star_from_rsids(variants)
+        starred = {v.get("gene") for v in variants if v.get("star")}
+
+        for gene in TARGET_GENES:
+            alleles = gene_alleles.get(gene, [])
+
+            if not alleles:
+                # no variants → wildtype default, as in call_diplotype_and_phenotype
+                profiles[i][gene] = {
+                    "diplotype": "*1/*1",
+                    "phenotype": "NM",
+                    "activity_score": 2.0,
+                    "confidence": profile_confidence(alleles, gene in starred, "Wildtype Default")
+                }
+                continue
+
+            left, right = select_diplotype_alleles(alleles)
+            called[gene].append((i, left, right, gene in starred))
+
+    for gene, rows in called.items():
+        if not rows:
+            continue
+
+        codec = codec_for(gene)
+        scores, phenotypes, used_lookup = batch_call_phenotypes(
+            gene,
+            codec.encode([r[1] for r in rows]),
+            codec.encode([r[2] for r in rows])
+        )
+
+        for (i, left, right, star_annotated), score, phenotype, lookup in zip(
+            rows, scores.tolist(), decode_phenotypes(phenotypes).tolist(), used_lookup.tolist()
+        ):
+            method = "Diplotype Lookup Table" if lookup else "Activity Score Model"
+            profiles[i][gene] = {
+                "diplotype": f"{left}/{right}",
+                "phenotype": phenotype,
+                "activity_score": score,
+                "confidence": profile_confidence([left, right], star_annotated, method)
+            }
+
+    # gene order as in build_pharmacogenomic_profile
+    return [{gene: p[gene] for gene in TARGET_GENES} for p in profiles]
+
+
+def _evaluate_drugs(pgx_profile, drugs):
+    drug_results = []
+    for drug in drugs:
+        risk_block = assess_drug_risk(drug, pgx_profile)
+        primary_gene = risk_block.get("primary_gene")
+        phenotype = pgx_profile.get(primary_gene, {}).get("phenotype") if primary_gene else None
+
+        drug_results.append({
+            "drug": drug,
+            "primary_gene": primary_gene,
+            "risk_assessment": risk_block["risk_assessment"],
+            "clinical_recommendation": get_clinical_recommendation(drug, primary_gene, phenotype)
+        })
+
+    return drug_results
+
+
+def analyze_cohort_matrix(cohort, drugs):
+    """
+    Per-sample profiles + drug risk for a parsed cohort (see parse_vcf_cohort).
+    Samples with identical PGx genotypes share one profile computation.
+    No LLM step: cohort output is rule-based only.
+    """
+    drugs = list(dict.fromkeys(d.strip().upper() for d in drugs if d.strip()))
+    alleles = cohort["alleles"]
+
+    # one representative sample per distinct genotype
+    first_sample = {}
+    sample_keys = []
+    for i in range(len(cohort["samples"])):
+        key = alleles[i].tobytes()
+        first_sample.setdefault(key, i)
+        sample_keys.append(key)
+
+    profiles = _batch_profiles([sample_variants(cohort, i) for i in first_sample.values()])
+    by_genotype = {
+        key: (profile, _evaluate_drugs(profile, drugs))
+        for key, profile in zip(first_sample, profiles)
+    }
+
+    results = []
+    for sample_id, key in zip(cohort["samples"], sample_keys):
+        profile, drug_results = by_genotype[key]
+
+        results.append({
+            "sample_id": sample_id,
+            "pharmacogenomic_profile": profile,
+            "drug_results": drug_results
+        })
+
+    logging.info(
+        f"Cohort analyzed: {len(results)} samples, "
+        f"{len(cohort['sites'])} PGx sites, {len(by_genotype)} distinct genotypes"
+    )
+
+    return {
+        "cohort_id": str(uuid.uuid4()),
+        "sample_count": len(results),
+        "site_count": len(cohort["sites"]),
+        "distinct_genotypes": len(by_genotype),
+        "drugs": drugs,
+        "results": results
+    }
+
+
+# ✅ PYTHON API
+def analyze_cohort(vcf_path, drugs):
+    """Parse a multi-sample VCF once and evaluate every sample against ``drugs``."""
+    return analyze_cohort_matrix(parse_vcf_cohort(vcf_path), drugs)
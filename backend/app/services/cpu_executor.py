@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from app.services.metrics import capture, replay
+
+logger = logging.getLogger(__name__)
+
+# ⭐ CPU-STAGE EXECUTOR
+# VCF tokenizing + profile building are pure Python and hold the GIL. "thread"
+# (default) keeps them in the threadpool; "process" runs them in a pool of
+# worker processes that preload the rule tables once. Work is handed over by
+# file path, and only the compact PGx profile is pickled back.
+
+CPU_EXECUTOR = os.getenv("PHARMAGUARD_CPU_EXECUTOR", "thread")
+CPU_WORKERS = int(os.getenv("PHARMAGUARD_CPU_WORKERS", os.cpu_count() or 1))
+
+
+class RemoteHTTPError(Exception):
+    """Picklable stand-in for an HTTPException raised inside a worker process."""
+
+    def __init__(self, status_code, detail):
+        super().__init__(status_code, detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def _init_worker():
+    # import once per worker: compiles/loads the knowledge base, allele codecs, parser tables
+    import app.services.analyzer  # noqa: F401
+    import app.services.cohort  # noqa: F401
+
+
+def _ready():
+    return os.getpid()
+
+
+def _invoke(fn, args):
+    # stage timings / metrics observed in the worker travel back with the result
+    with capture() as observations:
+        try:
+            return fn(*args), observations
+        except HTTPException as e:
+            raise RemoteHTTPError(e.status_code, e.detail) from None
+
+
+class CpuExecutor:
+
+    def __init__(self, kind=CPU_EXECUTOR, workers=CPU_WORKERS):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown CPU executor: {kind}")
+        self.kind = kind
+        self.workers = max(1, workers)
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _process_pool(self):
+        with self._lock:
+            if self._pool is None:
+                # spawn: no inherited event loop / sqlite handles / threads from the API process
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                )
+            return self._pool
+
+    def start(self):
+        """Spin up and warm every worker so the first requests don't pay for imports."""
+        if self.kind != "process":
+            return
+        pool = self._process_pool()
+        pids = {f.result() for f in [pool.submit(_ready) for _ in range(self.workers * 2)]}
+        logger.info(f"CPU process pool ready ({len(pids)} workers)")
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True, cancel_futures=True)
+                self._pool = None
+
+    async def run(self, fn, *args):
+        """fn must be a module-level function; args should be small (paths, names)."""
+        if self.kind != "process":
+            return await run_in_threadpool(fn, *args)
+
+        loop = asyncio.get_running_loop()
+
+        try:
+            result, observations = await loop.run_in_executor(self._process_pool(), _invoke, fn, args)
+            replay(observations)
+            return result
+
+        except RemoteHTTPError as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+        except BrokenProcessPool:
+            # a worker died (OOM / crash): replace the pool for the next request
+            logger.exception("CPU process pool broken; restarting it")
+            self.shutdown()
+            raise HTTPException(status_code=503, detail="Analysis worker crashed; please retry.")
+
+
+cpu_executor = CpuExecutor()
+
+
+async def run_cpu(fn, *args):
+    return await cpu_executor.run(fn, *args)
@@ -1,13 +1,10 @@
-import json
-from pathlib import Path
 from collections import Counter
 
-BASE = Path(__file__).resolve().parents[1]
-RULES_DIR = BASE / "rules"
+from app.services.knowledge_base import KB
 
-_diplotype_map = json.loads((RULES_DIR / "diplotype_map.json").read_text())
-_allele_function = json.loads((RULES_DIR / "allele_function.json").read_text())
-_rsid_star_map = json.loads((RULES_DIR / "rsid_star_map.json").read_text())
+_diplotype_map = KB["diplotype_map"]
+_allele_function = KB["allele_function"]
+_rsid_star = KB["rsid_star"]
 
 TARGET_GENES = list(_diplotype_map.keys())
 
@@ -95,10 +92,9 @@ def infer_star_from_rsids(variants):
 
         # Try mapping by rsid -> star
         rsid = v.get("rsid")
-        if rsid in _rsid_star_map:
-            mapping = _rsid_star_map[rsid]
-            if mapping.get("gene") == gene:
-                allele_name = mapping["allele"]
+        if rsid in _rsid_star:
+            mapped_gene, allele_name = _rsid_star[rsid]
+            if mapped_gene == gene:
                 # determine multiplicity from allele_indices / alt_count (added by parser)
                 alt_count = v.get("alt_count", None)
                 if alt_count is None:
@@ -121,6 +117,17 @@ def infer_star_from_rsids(variants):
     return {g: gene_alleles[g] for g in gene_alleles}
 
 
+def _lookup_function(fn_map, allele):
+
+    function = fn_map.get(allele)
+
+    if not function:
+        # try without star prefix, then fallback to 'normal'
+        function = fn_map.get(allele.strip("*"), None) or fn_map.get(allele.replace("*", ""), None) or "normal"
+
+    return function
+
+
 # ✅ ACTIVITY SCORE + TRACE DETAILS
 def calculate_activity_score_with_trace(gene, alleles):
 
@@ -131,11 +138,7 @@ def calculate_activity_score_with_trace(gene, alleles):
 
     for allele in alleles:
 
-        function = fn_map.get(allele)
-
-        if not function:
-            # try without star prefix, then fallback to 'normal'
-            function = fn_map.get(allele.strip("*"), None) or fn_map.get(allele.replace("*", ""), None) or "normal"
+        function = _lookup_function(fn_map, allele)
 
         score = FUNCTION_SCORES.get(function, 1.0)
 
@@ -210,33 +213,9 @@ def _canonical_pair(a, b):
         return b, a
 
 
-# ✅ DIPLOTYPE + TRACE ENGINE
-def call_diplotype_and_phenotype(gene, detected_alleles):
-
-    gene_map = _diplotype_map.get(gene, {})
-
-    # No variants -> wildtype
-    if not detected_alleles:
-
-        diplotype = "*1/*1"
-        phenotype = "NM"
-        activity_score = 2.0
-
-        decision_trace = {
-            "reason": "No variants detected",
-            "assumed_diplotype": diplotype,
-            "assumed_activity_score": activity_score,
-            "phenotype_rule": f"{diplotype} → Normal Metabolizer (wildtype assumption)",
-            "method": "Wildtype Default"
-        }
-
-        clinical_interpretation = generate_clinical_interpretation(
-            gene,
-            phenotype,
-            activity_score
-        )
-
-        return diplotype, phenotype, activity_score, decision_trace, clinical_interpretation
+# ✅ DIPLOID ALLELE PAIR (shared by the scalar engine and the cohort batch path)
+def select_diplotype_alleles(detected_alleles):
+    """Canonical (left, right) star-allele pair from the alleles detected for one gene."""
 
     # If the inference provided multiplicity correctly, detected_alleles list will include duplicate entries for homozygous alt.
     # Use allele counts to reliably decide diplotype for diploid genome.
@@ -266,7 +245,38 @@ def call_diplotype_and_phenotype(gene, detected_alleles):
             alleles = [first, second]
 
     # enforce canonical ordering for diplotype string (e.g., *1/*3 not *3/*1)
-    left, right = _canonical_pair(alleles[0], alleles[1])
+    return _canonical_pair(alleles[0], alleles[1])
+
+
+# ✅ DIPLOTYPE + TRACE ENGINE
+def call_diplotype_and_phenotype(gene, detected_alleles):
+
+    gene_map = _diplotype_map.get(gene, {})
+
+    # No variants -> wildtype
+    if not detected_alleles:
+
+        diplotype = "*1/*1"
+        phenotype = "NM"
+        activity_score = 2.0
+
+        decision_trace = {
+            "reason": "No variants detected",
+            "assumed_diplotype": diplotype,
+            "assumed_activity_score": activity_score,
+            "phenotype_rule": f"{diplotype} → Normal Metabolizer (wildtype assumption)",
+            "method": "Wildtype Default"
+        }
+
+        clinical_interpretation = generate_clinical_interpretation(
+            gene,
+            phenotype,
+            activity_score
+        )
+
+        return diplotype, phenotype, activity_score, decision_trace, clinical_interpretation
+
+    left, right = select_diplotype_alleles(detected_alleles)
     diplotype = f"{left}/{right}"
 
     phenotype_lookup = gene_map.get(diplotype)
@@ -307,6 +317,21 @@ def call_diplotype_and_phenotype(gene, detected_alleles):
     return diplotype, phenotype, activity_score, decision_trace, clinical_interpretation
 
 
+def profile_confidence(alleles, star_annotated, method):
+    confidence = 0.65
+
+    if alleles:
+        confidence = 0.85
+
+    if star_annotated:
+        confidence = 0.95
+
+    if method == "Activity Score Model":
+        confidence -= 0.1
+
+    return round(confidence, 2)
+
+
 # ✅ PROFILE BUILDER WITH TRACE + INTERPRETATION ⭐⭐⭐⭐⭐
 def build_pharmacogenomic_profile(variants):
 
@@ -320,18 +345,11 @@ def build_pharmacogenomic_profile(variants):
         diplotype, phenotype, activity_score, decision_trace, clinical_interpretation = \
             call_diplotype_and_phenotype(gene, alleles)
 
-        confidence = 0.65
-
-        if alleles:
-            confidence = 0.85
-
-        if any(v.get("star") for v in variants if v.get("gene") == gene):
-            confidence = 0.95
-
-        if decision_trace["method"] == "Activity Score Model":
-            confidence -= 0.1
-
-        confidence = round(confidence, 2)
+        confidence = profile_confidence(
+            alleles,
+            any(v.get("star") for v in variants if v.get("gene") == gene),
+            decision_trace["method"]
+        )
 
         profile[gene] = {
             "diplotype": diplotype,
@@ -0,0 +1,150 @@
+import numpy as np
+
+from app.services.diplotype import (
+    FUNCTION_SCORES,
+    TARGET_GENES,
+    _allele_function,
+    _diplotype_map,
+    _canonical_pair,
+    _lookup_function,
+)
+from app.services.knowledge_base import STANDARD_PHENOTYPES
+
+# ⭐ BATCHED ACTIVITY-SCORE + PHENOTYPE ENGINE (cohort / reanalysis workloads)
+# Same rules as calculate_activity_score_with_trace / phenotype_from_activity_score /
+# the diplotype lookup in call_diplotype_and_phenotype, evaluated for many samples at once.
+
+# codes 0-4 are the activity-score phenotypes; any other diplotype_map label
+# (e.g. "Indeterminate") gets a code after them, so a lookup row never falls
+# through to the activity score where calculate_diplotype would use the label
+PHENOTYPES = np.array(STANDARD_PHENOTYPES + sorted({
+    phenotype
+    for gene_map in _diplotype_map.values()
+    for phenotype in gene_map.values()
+    if phenotype and phenotype not in STANDARD_PHENOTYPES
+}))
+_PHENOTYPE_CODE = {p: i for i, p in enumerate(PHENOTYPES)}
+NO_LOOKUP = -1
+
+
+class GeneAlleleCodec:
+    """
+    Star allele ↔ integer code for one gene.
+    Codes index ``scores`` (FUNCTION_SCORES per allele_function.json) and the
+    pairwise diplotype-lookup table; unseen alleles are appended on first use.
+    """
+
+    def __init__(self, gene):
+        self.gene = gene
+        self.fn_map = _allele_function.get(gene, {})
+        self.names = []
+        self.codes = {}
+        self._scores = []
+        self._lookup = None
+
+        alleles = list(self.fn_map) + [
+            a for dip in _diplotype_map.get(gene, {}) for a in dip.split("/")
+        ]
+        self.encode(["*1"] + alleles)
+
+    def encode(self, alleles):
+        out = np.empty(len(alleles), dtype=np.int32)
+
+        for i, allele in enumerate(alleles):
+            code = self.codes.get(allele)
+            if code is None:
+                code = self.codes[allele] = len(self.names)
+                self.names.append(allele)
+                self._scores.append(
+                    FUNCTION_SCORES.get(_lookup_function(self.fn_map, allele), 1.0)
+                )
+                self._lookup = None
+            out[i] = code
+
+        return out
+
+    @property
+    def scores(self):
+        return np.asarray(self._scores, dtype=np.float64)
+
+    @property
+    def lookup(self):
+        """(n_codes, n_codes) phenotype code from diplotype_map, NO_LOOKUP if absent."""
+        if self._lookup is None:
+            gene_map = _diplotype_map.get(self.gene, {})
+            n = len(self.names)
+            table = np.full((n, n), NO_LOOKUP, dtype=np.int8)
+
+            for i, a in enumerate(self.names):
+                for j, b in enumerate(self.names):
+                    left, right = _canonical_pair(a, b)
+                    phenotype = gene_map.get(f"{left}/{right}")
+                    if phenotype:  # same truthiness test as call_diplotype_and_phenotype
+                        table[i, j] = _PHENOTYPE_CODE[phenotype]
+
+            self._lookup = table
+
+        return self._lookup
+
+
+CODECS = {gene: GeneAlleleCodec(gene) for gene in TARGET_GENES}
+
+
+def codec_for(gene):
+    if gene not in CODECS:
+        CODECS[gene] = GeneAlleleCodec(gene)
+    return CODECS[gene]
+
+
+def batch_activity_scores(gene, left, right):
+    """Activity score per sample for int allele-code arrays ``left``/``right``."""
+    scores = codec_for(gene).scores
+    return np.round(scores[left] + scores[right], 2)
+
+
+def batch_phenotypes_from_scores(gene, activity_scores):
+    """Vectorized phenotype_from_activity_score → int8 codes into PHENOTYPES."""
+    s = np.asarray(activity_scores, dtype=np.float64)
+
+    if gene == "CYP2D6":
+        conditions = [s == 0, s <= 1.0, s <= 2.25]
+        choices = [0, 1, 2]
+        default = 4
+    elif gene == "CYP2C19":
+        conditions = [s == 0, s <= 1.0, s <= 2.0]
+        choices = [0, 1, 2]
+        default = 4
+    elif gene in ("CYP2C9", "TPMT", "DPYD"):
+        conditions = [s == 0, s < 2]
+        choices = [0, 1]
+        default = 2
+    else:
+        return np.full(s.shape, 2, dtype=np.int8)
+
+    return np.select(conditions, choices, default).astype(np.int8)
+
+
+def batch_call_phenotypes(gene, left, right):
+    """
+    Diplotype lookup table first, activity-score model otherwise — for all samples.
+    Returns (activity_scores float64[n], phenotype codes int8[n], used_lookup bool[n]).
+    """
+    codec = codec_for(gene)
+    left = np.asarray(left)
+    right = np.asarray(right)
+
+    activity_scores = batch_activity_scores(gene, left, right)
+    from_lookup = codec.lookup[left, right]
+    used_lookup = from_lookup != NO_LOOKUP
+
+    phenotypes = np.where(
+        used_lookup,
+        from_lookup,
+        batch_phenotypes_from_scores(gene, activity_scores)
+    ).astype(np.int8)
+
+    return activity_scores, phenotypes, used_lookup
+
+
+def decode_phenotypes(codes):
+    return PHENOTYPES[codes]
@@ -0,0 +1,195 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# ⭐ TWO-TIER LLM EXPLANATION CACHE
+# in-process LRU  →  SQLite on disk (survives restarts)  →  LLM
+
+BASE = Path(__file__).resolve().parents[2]
+
+CACHE_PATH = os.getenv("PHARMAGUARD_LLM_CACHE_PATH", str(BASE / ".cache" / "explanations.sqlite3"))
+CACHE_TTL = float(os.getenv("PHARMAGUARD_LLM_CACHE_TTL", 30 * 24 * 3600))  # seconds, 0 = no expiry
+CACHE_MEMORY_ENTRIES = int(os.getenv("PHARMAGUARD_LLM_CACHE_MEMORY_ENTRIES", 1024))
+CACHE_DISK_ENTRIES = int(os.getenv("PHARMAGUARD_LLM_CACHE_DISK_ENTRIES", 100_000))
+RECOUNT_EVERY_PUTS = 1000
+
+
+def explanation_signature(drug, gene, phenotype, rsids, recommendation_text, model):
+    """Normalized hash of everything the explanation prompt depends on."""
+    canonical = json.dumps(
+        {
+            "drug": (drug or "").strip().upper(),
+            "gene": (gene or "").strip().upper(),
+            "phenotype": (phenotype or "").strip(),
+            "rsids": sorted({(r or "unknown").strip() for r in rsids}),
+            "recommendation": " ".join((recommendation_text or "").split()),
+            "model": model,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class ExplanationCache:
+    """LRU memory tier in front of an optional SQLite tier, with TTL + size eviction."""
+
+    def __init__(self, path=CACHE_PATH, ttl=CACHE_TTL,
+                 memory_entries=CACHE_MEMORY_ENTRIES, disk_entries=CACHE_DISK_ENTRIES,
+                 table="explanations"):
+        self.ttl = ttl
+        self.table = table
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        # running row count: size eviction without a COUNT(*) per write. Per process,
+        # so it drifts when several workers share the file: re-counted before evicting
+        # and every RECOUNT_EVERY_PUTS writes (other workers' rows)
+        self._disk_count = 0
+        self._puts = 0
+        self.counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "writes": 0,
+            "evictions": 0,
+        }
+
+        if path:
+            try:
+                Path(path).parent.mkdir(parents=True, exist_ok=True)
+                self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute(
+                    f"CREATE TABLE IF NOT EXISTS {table} ("
+                    " key TEXT PRIMARY KEY,"
+                    " payload TEXT NOT NULL,"
+                    " created_at REAL NOT NULL,"
+                    " accessed_at REAL NOT NULL)"
+                )
+                self._db.execute(
+                    f"CREATE INDEX IF NOT EXISTS {table}_accessed ON {table} (accessed_at)"
+                )
+                self._recount()
+            except sqlite3.Error as e:
+                logger.warning(f"Explanation cache disk tier disabled: {e}")
+                self._db = None
+
+    def _expired(self, created_at, now):
+        return self.ttl > 0 and now - created_at > self.ttl
+
+    def get(self, key):
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                payload, created_at = entry
+                if not self._expired(created_at, now):
+                    self._memory.move_to_end(key)
+                    self.counters["memory_hits"] += 1
+                    return dict(payload)
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    f"SELECT payload, created_at FROM {self.table} WHERE key = ?", (key,)
+                ).fetchone()
+
+                if row is not None and not self._expired(row[1], now):
+                    self._db.execute(
+                        f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key)
+                    )
+                    payload = json.loads(row[0])
+                    self._remember(key, payload, row[1])
+                    self.counters["disk_hits"] += 1
+                    return dict(payload)
+
+                if row is not None:
+                    self._db.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                    self._disk_count -= 1
+
+            self.counters["misses"] += 1
+            return None
+
+    def put(self, key, payload):
+        now = time.time()
+
+        with self._lock:
+            self._remember(key, dict(payload), now)
+            self.counters["writes"] += 1
+
+            if self._db is not None:
+                exists = self._db.execute(
+                    f"SELECT 1 FROM {self.table} WHERE key = ?", (key,)
+                ).fetchone()
+                self._db.execute(
+                    f"INSERT OR REPLACE INTO {self.table} (key, payload, created_at, accessed_at)"
+                    " VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(payload), now, now),
+                )
+                if exists is None:
+                    self._disk_count += 1
+
+                self._puts += 1
+                if self._puts % RECOUNT_EVERY_PUTS == 0:
+                    self._recount()
+                self._evict_disk()
+
+    def _remember(self, key, payload, created_at):
+        self._memory[key] = (payload, created_at)
+        self._memory.move_to_end(key)
+
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def _recount(self):
+        self._disk_count = self._db.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def _evict_disk(self):
+        if self._disk_count <= self.disk_entries:
+            return
+
+        self._recount()
+
+        # ✅ down to 95% of the cap: a full cache doesn't re-count on every write
+        excess = self._disk_count - self.disk_entries * 95 // 100
+
+        if self._disk_count > self.disk_entries and excess > 0:
+            deleted = self._db.execute(
+                f"DELETE FROM {self.table} WHERE key IN ("
+                f" SELECT key FROM {self.table} ORDER BY accessed_at LIMIT ?)",
+                (excess,),
+            ).rowcount
+            self._disk_count -= deleted
+            self.counters["evictions"] += deleted
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute(f"DELETE FROM {self.table}")
+                self._disk_count = 0
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats["memory_entries"] = len(self._memory)
+            if self._db is not None:
+                stats["disk_entries"] = self._disk_count  # this process's view (see _evict_disk)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((lookups - stats["misses"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+explanation_cache = ExplanationCache()
@@ -0,0 +1,117 @@
+import json
+import logging
+import os
+from pathlib import Path
+from types import MappingProxyType
+
+from app.services.knowledge_base import KB, STANDARD_PHENOTYPES
+from app.services.recommendation import get_clinical_recommendation
+
+logger = logging.getLogger(__name__)
+
+# ⭐ PRE-GENERATED EXPLANATION STORE
+# Every (drug, gene, phenotype, recommendation) the rule tables can produce is
+# explained offline (python scripts/pregenerate_explanations.py) and served from
+# this file at request time; the LLM is only called for combinations it misses.
+
+BASE = Path(__file__).resolve().parents[1]
+
+STORE_VERSION = 1
+STORE_PATH = os.getenv("PHARMAGUARD_EXPLANATION_STORE", str(BASE / "rules" / "explanation_store.json"))
+
+
+def combination_key(drug, gene, phenotype):
+    return f"{(drug or '').strip().upper()}|{(gene or '').strip().upper()}|{(phenotype or '').strip()}"
+
+
+def reachable_combinations():
+    """
+    (drug, gene, phenotype, recommendation_text) for every drug/gene pair in the
+    risk rules whose gene the profile builder calls, over every phenotype the
+    diplotype caller can emit for it.
+    """
+    combos = []
+
+    for drug in KB["drugs"]:
+        for gene in KB["risk_genes"].get(drug, ()):
+            if gene not in KB["diplotype_map"]:
+                continue  # gene never appears in pgx_profile → unreachable
+
+            phenotypes = list(STANDARD_PHENOTYPES)
+            phenotypes.extend(
+                p for p in KB["diplotype_map"][gene].values() if p not in phenotypes
+            )
+
+            for phenotype in phenotypes:
+                rec = get_clinical_recommendation(drug, gene, phenotype)["text"]
+                combos.append((drug, gene, phenotype, rec))
+
+    return combos
+
+
+def write_store(entries, model, path=STORE_PATH):
+    """entries: {combination_key: payload incl. recommendation}"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    document = {
+        "version": STORE_VERSION,
+        "kb_digest": KB["source_digest"],
+        "model": model,
+        "entries": dict(sorted(entries.items())),
+    }
+
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(document, indent=1, ensure_ascii=False))
+    os.replace(tmp, path)
+    return path
+
+
+def load_store(path=STORE_PATH):
+    if not path:
+        return MappingProxyType({})
+
+    try:
+        document = json.loads(Path(path).read_text())
+    except FileNotFoundError:
+        return MappingProxyType({})
+    except Exception as e:
+        logger.warning(f"Explanation store unreadable ({e}); ignoring it")
+        return MappingProxyType({})
+
+    if document.get("version") != STORE_VERSION:
+        logger.warning("Explanation store has an unsupported version; ignoring it")
+        return MappingProxyType({})
+
+    if document.get("kb_digest") != KB["source_digest"]:
+        # entries are still checked against the current recommendation text on lookup
+        logger.info("Explanation store was built from different rule files; regenerate it")
+
+    return MappingProxyType(document.get("entries", {}))
+
+
+class ExplanationStore:
+
+    def __init__(self, path=STORE_PATH):
+        self.path = path
+        self.entries = load_store(path)
+        self.counters = {"hits": 0, "misses": 0}
+
+    def get(self, drug, gene, phenotype, recommendation_text):
+        entry = self.entries.get(combination_key(drug, gene, phenotype))
+
+        if entry is None or entry.get("recommendation") != recommendation_text:
+            self.counters["misses"] += 1
+            return None
+
+        self.counters["hits"] += 1
+        return {k: v for k, v in entry.items() if k != "recommendation"}
+
+    def reload(self):
+        self.entries = load_store(self.path)
+
+    def stats(self):
+        return dict(self.counters, entries=len(self.entries))
+
+
+explanation_store = ExplanationStore()
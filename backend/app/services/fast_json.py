@@ -0,0 +1,19 @@
+from fastapi.responses import JSONResponse
+from pydantic_core import to_json
+
+# ⭐ ONE-PASS JSON
+# Results are plain JSON-native dicts validated once against FinalOutput, so
+# they go straight to bytes with pydantic-core's Rust serializer: no
+# jsonable_encoder copy and no json.dumps. Returned as a Response, FastAPI
+# skips its own encoding pass too.
+
+
+def dumps(content) -> bytes:
+    # NaN / inf → null: always valid JSON (json.dumps would emit NaN or raise)
+    return to_json(content, inf_nan_mode="null")
+
+
+class FastJSONResponse(JSONResponse):
+
+    def render(self, content) -> bytes:
+        return dumps(content)
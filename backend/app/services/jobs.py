@@ -0,0 +1,337 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# ⭐ BACKGROUND JOB QUEUE
+# submit → job id immediately; a worker pool (interactive + bulk lanes) runs the
+# analysis; clients poll / long-poll for the result. Default backend: SQLite for
+# the queue + results, filesystem for spooled uploads — any API node on the same
+# host or shared volume can submit to and drain the same queue.
+
+BASE = Path(__file__).resolve().parents[2]
+
+JOB_BACKEND = os.getenv("PHARMAGUARD_JOB_BACKEND", "sqlite")
+JOB_DB_PATH = os.getenv("PHARMAGUARD_JOB_DB", str(BASE / ".cache" / "jobs.sqlite3"))
+JOB_DIR = os.getenv("PHARMAGUARD_JOB_DIR", str(BASE / ".cache" / "jobs"))
+JOB_WORKERS_INTERACTIVE = int(os.getenv("PHARMAGUARD_JOB_WORKERS_INTERACTIVE", 2))
+JOB_WORKERS_BULK = int(os.getenv("PHARMAGUARD_JOB_WORKERS_BULK", 1))
+JOB_LEASE_SECONDS = float(os.getenv("PHARMAGUARD_JOB_LEASE_SECONDS", 600))
+JOB_MAX_ATTEMPTS = int(os.getenv("PHARMAGUARD_JOB_MAX_ATTEMPTS", 3))
+JOB_RETENTION_SECONDS = float(os.getenv("PHARMAGUARD_JOB_RETENTION_SECONDS", 24 * 3600))
+JOB_POLL_SECONDS = 0.25
+
+LANES = ("interactive", "bulk")
+FINISHED = ("done", "failed")
+
+
+class JobQueue:
+    """
+    Queue + result backend interface. Implementations must make claim() atomic
+    across processes sharing the backend, and only let the worker holding a
+    job's lease renew, complete or fail it.
+    """
+
+    lease_seconds = JOB_LEASE_SECONDS
+
+    def submit(self, payload, lane="interactive"):
+        raise NotImplementedError
+
+    def claim(self, lanes, worker_id):
+        """Oldest queued job in the first lane that has one → job dict, or None."""
+        raise NotImplementedError
+
+    def renew(self, job_id, worker_id):
+        """Extend a running job's lease; False once the worker no longer holds it."""
+        raise NotImplementedError
+
+    def complete(self, job_id, worker_id, result):
+        raise NotImplementedError
+
+    def fail(self, job_id, worker_id, error):
+        raise NotImplementedError
+
+    def get(self, job_id):
+        raise NotImplementedError
+
+    def purge(self, older_than):
+        """Drop finished jobs finished before `older_than`; returns their payloads."""
+        raise NotImplementedError
+
+
+class SQLiteJobQueue(JobQueue):
+
+    def __init__(self, path=JOB_DB_PATH, lease_seconds=JOB_LEASE_SECONDS, max_attempts=JOB_MAX_ATTEMPTS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        db = self._db()
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " lane TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " result TEXT,"
+            " error TEXT,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " worker TEXT,"
+            " created_at REAL NOT NULL,"
+            " started_at REAL,"
+            " lease_until REAL,"
+            " finished_at REAL)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, lane, created_at)")
+
+    def _db(self):
+        # one connection per thread; autocommit unless a transaction is opened explicitly
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.path, isolation_level=None, timeout=30)
+            db.row_factory = sqlite3.Row
+        return db
+
+    def submit(self, payload, lane="interactive"):
+        job_id = uuid.uuid4().hex
+        self._db().execute(
+            "INSERT INTO jobs (id, lane, status, payload, created_at) VALUES (?, ?, 'queued', ?, ?)",
+            (job_id, lane, json.dumps(payload), time.time()),
+        )
+        return job_id
+
+    def claim(self, lanes, worker_id):
+        db = self._db()
+        now = time.time()
+
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            # expired leases (worker died / node restarted) go back to the queue
+            db.execute(
+                "UPDATE jobs SET status = 'queued', worker = NULL"
+                " WHERE status = 'running' AND lease_until < ? AND attempts < ?",
+                (now, self.max_attempts),
+            )
+            db.execute(
+                "UPDATE jobs SET status = 'failed', error = 'Job lease expired too many times', finished_at = ?"
+                " WHERE status = 'running' AND lease_until < ?",
+                (now, now),
+            )
+
+            row = None
+            for lane in lanes:
+                row = db.execute(
+                    "SELECT * FROM jobs WHERE status = 'queued' AND lane = ?"
+                    " ORDER BY created_at LIMIT 1",
+                    (lane,),
+                ).fetchone()
+                if row is not None:
+                    break
+
+            if row is None:
+                db.execute("COMMIT")
+                return None
+
+            db.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1,"
+                " started_at = ?, lease_until = ? WHERE id = ?",
+                (worker_id, now, now + self.lease_seconds, row["id"]),
+            )
+            db.execute("COMMIT")
+
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+        return self._job(row, status="running", started_at=now)
+
+    # ✅ guarded by status + worker: a worker whose lease expired (job requeued,
+    # maybe already picked up elsewhere) cannot extend or overwrite it
+
+    def renew(self, job_id, worker_id):
+        cursor = self._db().execute(
+            "UPDATE jobs SET lease_until = ? WHERE id = ? AND status = 'running' AND worker = ?",
+            (time.time() + self.lease_seconds, job_id, worker_id),
+        )
+        return cursor.rowcount > 0
+
+    def complete(self, job_id, worker_id, result):
+        cursor = self._db().execute(
+            "UPDATE jobs SET status = 'done', result = ?, finished_at = ?"
+            " WHERE id = ? AND status = 'running' AND worker = ?",
+            (json.dumps(result), time.time(), job_id, worker_id),
+        )
+        return cursor.rowcount > 0
+
+    def fail(self, job_id, worker_id, error):
+        cursor = self._db().execute(
+            "UPDATE jobs SET status = 'failed', error = ?, finished_at = ?"
+            " WHERE id = ? AND status = 'running' AND worker = ?",
+            (str(error), time.time(), job_id, worker_id),
+        )
+        return cursor.rowcount > 0
+
+    def get(self, job_id):
+        row = self._db().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._job(row) if row is not None else None
+
+    def purge(self, older_than):
+        db = self._db()
+        rows = db.execute(
+            "SELECT payload FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+            (older_than,),
+        ).fetchall()
+        db.execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+            (older_than,),
+        )
+        return [json.loads(r["payload"]) for r in rows]
+
+    def _job(self, row, **overrides):
+        job = {
+            "job_id": row["id"],
+            "lane": row["lane"],
+            "status": row["status"],
+            "payload": json.loads(row["payload"]),
+            "attempts": row["attempts"],
+            "created_at": row["created_at"],
+            "started_at": row["started_at"],
+            "finished_at": row["finished_at"],
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+        }
+        job.update(overrides)
+        return job
+
+
+# ---------- BACKEND REGISTRY ----------
+JOB_BACKENDS = {
+    "sqlite": lambda: SQLiteJobQueue(JOB_DB_PATH),
+}
+
+
+def register_job_backend(name, factory):
+    JOB_BACKENDS[name] = factory
+
+
+_job_queue = None
+
+
+def get_job_queue():
+    global _job_queue
+    if _job_queue is None:
+        if JOB_BACKEND not in JOB_BACKENDS:
+            raise ValueError(f"Unknown job backend: {JOB_BACKEND}")
+        _job_queue = JOB_BACKENDS[JOB_BACKEND]()
+    return _job_queue
+
+
+def spool_path(job_key, suffix=".vcf"):
+    Path(JOB_DIR).mkdir(parents=True, exist_ok=True)
+    return os.path.join(JOB_DIR, f"{job_key}{suffix}")
+
+
+# ---------- WORKER POOL ----------
+class JobWorkerPool:
+    """
+    asyncio workers inside the API process. Interactive workers only take the
+    interactive lane; bulk workers take interactive first, then bulk, so a bulk
+    backlog never delays interactive jobs.
+    """
+
+    def __init__(self, handler, queue=None,
+                 interactive=JOB_WORKERS_INTERACTIVE, bulk=JOB_WORKERS_BULK):
+        self.handler = handler
+        self.queue = queue or get_job_queue()
+        self.interactive = interactive
+        self.bulk = bulk
+        self.node = f"{socket.gethostname()}:{os.getpid()}"
+        self._tasks = []
+        self._wake = None
+
+    def start(self):
+        self._wake = asyncio.Event()
+
+        for i in range(self.interactive):
+            self._tasks.append(asyncio.create_task(self._run(f"{self.node}/i{i}", ("interactive",))))
+        for i in range(self.bulk):
+            self._tasks.append(asyncio.create_task(self._run(f"{self.node}/b{i}", ("interactive", "bulk"))))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        # local submits wake idle workers; other nodes' submits are picked up by polling
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _run(self, worker_id, lanes):
+        while True:
+            try:
+                job = await asyncio.to_thread(self.queue.claim, lanes, worker_id)
+            except Exception:
+                logger.exception("Job claim failed")
+                job = None
+
+            if job is None:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), JOB_POLL_SECONDS * 4)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heartbeat = asyncio.create_task(self._heartbeat(job["job_id"], worker_id))
+            try:
+                result = await self.handler(job["payload"])
+                finished = await asyncio.to_thread(self.queue.complete, job["job_id"], worker_id, result)
+            except asyncio.CancelledError:
+                raise  # shutdown: the lease expires and another worker retries it
+            except Exception as e:
+                detail = getattr(e, "detail", None) or str(e)
+                if getattr(e, "status_code", 500) < 500:
+                    logger.warning(f"Job {job['job_id']} rejected: {detail}")  # bad input, e.g. invalid VCF
+                else:
+                    logger.exception(f"Job {job['job_id']} failed")
+                finished = await asyncio.to_thread(self.queue.fail, job["job_id"], worker_id, detail)
+            finally:
+                heartbeat.cancel()
+
+            if not finished:
+                logger.warning(f"Job {job['job_id']}: lease lost before it finished, result dropped")
+
+    async def _heartbeat(self, job_id, worker_id):
+        # ✅ long jobs keep their lease; only a dead worker's lease runs out
+        while True:
+            await asyncio.sleep(self.queue.lease_seconds / 3)
+            try:
+                if not await asyncio.to_thread(self.queue.renew, job_id, worker_id):
+                    return
+            except Exception:
+                logger.exception(f"Job {job_id}: lease renewal failed")
+
+
+async def wait_for_job(job_id, timeout, queue=None):
+    """Long-poll: the job once finished, or its current state after `timeout` seconds."""
+    queue = queue or get_job_queue()
+    give_up = time.monotonic() + timeout
+
+    while True:
+        job = await asyncio.to_thread(queue.get, job_id)
+        if job is None or job["status"] in FINISHED or time.monotonic() >= give_up:
+            return job
+        await asyncio.sleep(JOB_POLL_SECONDS)
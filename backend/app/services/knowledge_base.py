@@ -0,0 +1,220 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+from pathlib import Path
+from types import MappingProxyType
+
+logger = logging.getLogger(__name__)
+
+# ⭐ COMPILED KNOWLEDGE BASE
+# All rule JSONs → one preindexed snapshot, loaded once at import and shared by
+# every service module. No disk I/O or JSON decoding on the request path.
+
+BASE = Path(__file__).resolve().parents[1]
+RULES_DIR = BASE / "rules"
+
+KB_VERSION = 1
+
+RULE_FILES = {
+    "risk_rules": RULES_DIR / "risk_rules.json",
+    "cpic_rules": RULES_DIR / "cpic_rules.json",
+    "diplotype_map": RULES_DIR / "diplotype_map.json",
+    "allele_function": RULES_DIR / "allele_function.json",
+    "rsid_star_map": RULES_DIR / "rsid_star_map.json",
+    "gene_regions": RULES_DIR / "gene_regions.json",
+    # optional; same location the VCF parser has always read it from
+    "rsid_gene_map": BASE / "rsid_gene_map.json",
+}
+
+OPTIONAL_RULE_FILES = {"rsid_gene_map", "gene_regions"}
+
+KB_PATH = Path(os.getenv("PHARMAGUARD_KB_PATH", RULES_DIR / "knowledge_base.pickle"))
+
+STANDARD_PHENOTYPES = ["PM", "IM", "NM", "RM", "UM"]
+
+UNKNOWN_RULE = {"risk_label": "Unknown", "severity": "unknown", "confidence": 0.0}
+
+NO_EVIDENCE_TEXT = "No pharmacogenomic evidence detected to determine recommendation."
+NO_RULE_TEXT = "No specific CPIC recommendation for this genotype/phenotype combination."
+
+
+def table_key(drug_id, gene_id, phenotype_id):
+    """Integer key for the (drug, gene, phenotype) tables."""
+    return (drug_id << 16) | (gene_id << 8) | phenotype_id
+
+
+# ---------- RULE RESOLUTION (shared by compiler and slow path) ----------
+def resolve_risk_rule(mapping, phenotype):
+    # Try direct phenotype mapping
+    rule = mapping.get(phenotype)
+
+    # Fallback normalization (SLCO1B1 etc.)
+    if not rule:
+        if phenotype == "NM" and mapping.get("NormalFunction"):
+            rule = mapping.get("NormalFunction")
+        elif phenotype in ("PM", "IM") and mapping.get("LowFunction"):
+            rule = mapping.get("LowFunction")
+        else:
+            rule = UNKNOWN_RULE
+
+    return rule
+
+
+def resolve_recommendation(gene_block, primary_gene, phenotype):
+    # gene block keys may be combined names, find best match
+    if primary_gene in gene_block:
+        rec = gene_block[primary_gene].get(phenotype)
+        if rec:
+            return rec
+    # fallback: if only one gene in block, try that
+    for k, v in gene_block.items():
+        rec = v.get(phenotype)
+        if rec:
+            return rec
+
+    return NO_RULE_TEXT
+
+
+# ---------- COMPILER ----------
+def _read_sources():
+    sources = {}
+    for name, path in RULE_FILES.items():
+        try:
+            sources[name] = path.read_bytes()
+        except FileNotFoundError:
+            if name not in OPTIONAL_RULE_FILES:
+                raise
+            logger.warning(f"{path.name} not found; compiling without it")
+            sources[name] = b"{}"
+    return sources
+
+
+def _digest(sources):
+    h = hashlib.sha256(str(KB_VERSION).encode())
+    for name in sorted(sources):
+        h.update(name.encode())
+        h.update(sources[name])
+    return h.hexdigest()
+
+
+def compile_knowledge_base(sources=None):
+    """Rule file bytes → plain (picklable) snapshot dict."""
+    sources = sources or _read_sources()
+    rules = {name: json.loads(raw) for name, raw in sources.items()}
+
+    risk_rules = rules["risk_rules"]
+    cpic = rules["cpic_rules"]
+
+    drugs = sorted(set(risk_rules) | set(cpic))
+    genes = sorted(
+        {g for block in risk_rules.values() for g in block}
+        | {g for block in cpic.values() for g in block}
+        | set(rules["diplotype_map"])
+        | set(rules["allele_function"])
+    )
+    phenotypes = list(STANDARD_PHENOTYPES)
+    for source in (risk_rules, cpic):
+        for block in source.values():
+            for mapping in block.values():
+                phenotypes.extend(p for p in mapping if p not in phenotypes)
+
+    drug_ids = {d: i for i, d in enumerate(drugs)}
+    gene_ids = {g: i + 1 for i, g in enumerate(genes)}  # 0 = no gene
+    phenotype_ids = {p: i for i, p in enumerate(phenotypes)}
+
+    # (drug, gene, phenotype) → risk rule, NormalFunction/LowFunction fallbacks pre-resolved
+    risk_table = {}
+    risk_genes = {}
+    for drug, block in risk_rules.items():
+        risk_genes[drug] = tuple(block)
+        for gene, mapping in block.items():
+            for phenotype in phenotypes:
+                key = table_key(drug_ids[drug], gene_ids[gene], phenotype_ids[phenotype])
+                risk_table[key] = dict(resolve_risk_rule(mapping, phenotype))
+
+    # (drug, primary gene | none, phenotype) → recommendation text
+    rec_table = {}
+    for drug, block in cpic.items():
+        for gene in [None] + genes:
+            for phenotype in phenotypes:
+                key = table_key(drug_ids[drug], gene_ids.get(gene, 0), phenotype_ids[phenotype])
+                rec_table[key] = resolve_recommendation(block, gene, phenotype)
+
+    # rsID → (gene, star); accepts {"gene","allele"} dicts or bare star strings
+    rsid_star = {}
+    for rsid, mapping in rules["rsid_star_map"].items():
+        if isinstance(mapping, dict):
+            allele = mapping.get("allele") or mapping.get("allele_name") or mapping.get("value")
+            rsid_star[rsid] = (mapping.get("gene"), allele)
+        else:
+            rsid_star[rsid] = (None, mapping)
+
+    return {
+        "version": KB_VERSION,
+        "source_digest": _digest(sources),
+        "drugs": drugs,
+        "genes": genes,
+        "phenotypes": phenotypes,
+        "drug_ids": drug_ids,
+        "gene_ids": gene_ids,
+        "phenotype_ids": phenotype_ids,
+        "risk_genes": risk_genes,
+        "risk_table": risk_table,
+        "rec_table": rec_table,
+        "cpic_rules": cpic,
+        "rsid_star": rsid_star,
+        "rsid_gene": rules["rsid_gene_map"],
+        "diplotype_map": rules["diplotype_map"],
+        "allele_function": rules["allele_function"],
+        "gene_regions": rules["gene_regions"],
+    }
+
+
+def write_knowledge_base(snapshot, path=KB_PATH):
+    path = Path(path)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_bytes(pickle.dumps(snapshot, protocol=pickle.HIGHEST_PROTOCOL))
+    os.replace(tmp, path)
+    return path
+
+
+def _freeze(obj):
+    if isinstance(obj, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in obj.items()})
+    if isinstance(obj, list):
+        return tuple(_freeze(v) for v in obj)
+    return obj
+
+
+def load_knowledge_base(path=KB_PATH):
+    """
+    Load the serialized snapshot; recompile (and try to persist) when it is
+    missing or was built from different rule files.
+    """
+    sources = _read_sources()
+    digest = _digest(sources)
+    snapshot = None
+
+    try:
+        snapshot = pickle.loads(Path(path).read_bytes())
+        if snapshot.get("source_digest") != digest:
+            logger.info("Knowledge base snapshot is stale; recompiling")
+            snapshot = None
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning(f"Knowledge base snapshot unreadable ({e}); recompiling")
+
+    if snapshot is None:
+        snapshot = compile_knowledge_base(sources)
+        try:
+            write_knowledge_base(snapshot, path)
+        except OSError as e:
+            logger.warning(f"Knowledge base snapshot not persisted: {e}")
+
+    return _freeze(snapshot)
+
+
+KB = load_knowledge_base()
@@ -1,32 +1,83 @@
 import os
 import json
+import asyncio
+import threading
+import time
+import weakref
 
-from groq import Groq
 from dotenv import load_dotenv
+from fastapi.concurrency import run_in_threadpool
 from datetime import datetime
 
+from app.schemas import LLMExplanation
+from app.services.explanation_cache import explanation_cache, explanation_signature
+from app.services.explanation_store import explanation_store
+from app.services.metrics import observe
+from app.services.single_flight import SingleFlight
+
 load_dotenv()
 
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+# ⭐ Groq clients are built on first use (or by warm-up): importing groq and
+# creating its HTTP clients is ~0.2 s of cold start. The async twin serves the
+# concurrent per-drug fan-out (both honour GROQ_BASE_URL)
+_clients = {}
+_clients_lock = threading.Lock()
 
 
-def generate_explanation(
-    patient_id,
-    drug,
-    primary_gene,
-    phenotype,
-    detected_variants,
-    recommendation_text
-):
-    """
-    LLM-based clinical explanation generator
-    """
+def _groq_client(kind):
+    client = _clients.get(kind)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(kind)
+            if client is None:
+                from groq import AsyncGroq, Groq
+                client_class = AsyncGroq if kind == "async" else Groq
+                client = _clients[kind] = client_class(api_key=os.getenv("GROQ_API_KEY"))
+    return client
+
+
+def get_client():
+    return _groq_client("sync")
+
+
+def get_async_client():
+    return _groq_client("async")
+
+
+async def async_client():
+    # ✅ cold process: groq import + the client lock (warm-up may hold it) off the event loop
+    client = _clients.get("async")
+    if client is None:
+        client = await run_in_threadpool(get_async_client)
+    return client
+
+MODEL = os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile")
+
+# max concurrent LLM calls per process (provider rate limits)
+LLM_FANOUT = max(1, int(os.getenv("PHARMAGUARD_LLM_FANOUT", 6)))
+
+_fanout_limits = weakref.WeakKeyDictionary()
+
+# identical explanation signatures in flight → one LLM call
+explanation_flights = SingleFlight()
+
+
+def fanout_limit():
+    # one semaphore per event loop (asyncio primitives are loop-bound)
+    loop = asyncio.get_running_loop()
+    limit = _fanout_limits.get(loop)
+    if limit is None:
+        limit = _fanout_limits[loop] = asyncio.Semaphore(LLM_FANOUT)
+    return limit
+
+
+def build_prompt(drug, primary_gene, phenotype, detected_variants, recommendation_text):
 
     variant_text = ", ".join(
         [v.get("rsid", "unknown") for v in detected_variants]
     )
 
-    prompt = f"""
+    return f"""
 Return ONLY JSON with keys:
 summary, mechanism, evidence, citations
 
@@ -39,41 +90,246 @@ Recommendation: {recommendation_text}
 Citations must reference CPIC or PharmGKB.
 """
 
+
+def parse_completion(text, recommendation_text):
+
+    text = text.strip()
+
+    # ✅ Robust JSON cleaning (VERY IMPORTANT)
+    if text.startswith("```"):
+        text = text.split("```")[1].strip()
+
+    payload = json.loads(text)
+
+    # ✅ Safety validation (LLMs sometimes omit fields)
+    payload.setdefault("summary", recommendation_text)
+    payload.setdefault("mechanism", "Variant impacts gene function.")
+    payload.setdefault("evidence", "CPIC")
+    payload.setdefault("citations", ["CPIC guideline"])
+
+    # ✅ Schema check before anything is cached: a malformed completion (e.g. citations
+    # as a string) would otherwise fail FinalOutput validation until the entry expires.
+    # Raises → the caller serves fallback_payload and caches nothing
+    LLMExplanation.model_validate(dict(payload, generated_at=""))
+
+    return payload
+
+
+def fallback_payload(recommendation_text):
+    # ✅ Failure-proof fallback
+    return {
+        "summary": recommendation_text,
+        "mechanism": "Variant impacts gene function.",
+        "evidence": "CPIC",
+        "citations": ["CPIC guideline"]
+    }
+
+
+def is_fallback_payload(payload, recommendation_text):
+    """True for the degraded payload served when the LLM call failed."""
+    body = {k: v for k, v in payload.items() if k != "generated_at"}
+    return body == fallback_payload(recommendation_text)
+
+
+def utc_timestamp():
+    return datetime.utcnow() \
+        .replace(microsecond=0) \
+        .isoformat() + "Z"
+
+
+def explanation_key(drug, primary_gene, phenotype, detected_variants, recommendation_text):
+    return explanation_signature(
+        drug,
+        primary_gene,
+        phenotype,
+        [v.get("rsid", "unknown") for v in detected_variants],
+        recommendation_text,
+        MODEL
+    )
+
+
+def _request_explanation(key, prompt, recommendation_text):
+
+    started = time.perf_counter()
+
     try:
-        completion = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
+        completion = get_client().chat.completions.create(
+            model=MODEL,
             messages=[
                 {"role": "user", "content": prompt}
             ],
             temperature=0.2,
         )
 
-        text = completion.choices[0].message.content.strip()
+        payload = parse_completion(
+            completion.choices[0].message.content,
+            recommendation_text
+        )
+
+    except Exception:
+
+        observe("pharmaguard_llm_seconds", time.perf_counter() - started)
+        observe("pharmaguard_llm_requests_total", 1, "fallback")
+
+        payload = fallback_payload(recommendation_text)
+        payload["generated_at"] = utc_timestamp()
+
+        # fallbacks are never cached; the next request retries the LLM
+        return payload
 
-        # ✅ Robust JSON cleaning (VERY IMPORTANT)
-        if text.startswith("```"):
-            text = text.split("```")[1].strip()
+    observe("pharmaguard_llm_seconds", time.perf_counter() - started)
+    observe("pharmaguard_llm_requests_total", 1, "ok")
 
-        payload = json.loads(text)
+    payload["generated_at"] = utc_timestamp()
 
-        # ✅ Safety validation (LLMs sometimes omit fields)
-        payload.setdefault("summary", recommendation_text)
-        payload.setdefault("mechanism", "Variant impacts gene function.")
-        payload.setdefault("evidence", "CPIC")
-        payload.setdefault("citations", ["CPIC guideline"])
+    explanation_cache.put(key, payload)
+
+    return payload
+
+
+async def complete_explanation_async(prompt, recommendation_text):
+    """One LLM round trip → parsed payload (no cache, no fallback; raises on failure)."""
+
+    client = await async_client()
+
+    async with fanout_limit():
+        # latency of the round trip itself, not the wait for a fan-out slot
+        started = time.perf_counter()
+        try:
+            completion = await client.chat.completions.create(
+                model=MODEL,
+                messages=[
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.2,
+            )
+        finally:
+            observe("pharmaguard_llm_seconds", time.perf_counter() - started)
+
+    payload = parse_completion(
+        completion.choices[0].message.content,
+        recommendation_text
+    )
+    payload["generated_at"] = utc_timestamp()
+
+    return payload
+
+
+async def _request_explanation_async(key, prompt, recommendation_text):
+
+    try:
+        payload = await complete_explanation_async(prompt, recommendation_text)
 
     except Exception:
 
-        # ✅ Failure-proof fallback
-        payload = {
-            "summary": recommendation_text,
-            "mechanism": "Variant impacts gene function.",
-            "evidence": "CPIC",
-            "citations": ["CPIC guideline"]
-        }
+        observe("pharmaguard_llm_requests_total", 1, "fallback")
+
+        payload = fallback_payload(recommendation_text)
+        payload["generated_at"] = utc_timestamp()
+
+        return payload
+
+    observe("pharmaguard_llm_requests_total", 1, "ok")
+
+    # ✅ SQLite write + cache lock off the event loop
+    await run_in_threadpool(explanation_cache.put, key, payload)
+
+    return payload
+
+
+def generate_explanation(
+    patient_id,
+    drug,
+    primary_gene,
+    phenotype,
+    detected_variants,
+    recommendation_text
+):
+    """
+    LLM-based clinical explanation generator
+    Served from the explanation cache when the same clinical signature was seen before,
+    then from the pre-generated explanation store;
+    identical signatures already in flight share one LLM call
+    """
+
+    key = explanation_key(drug, primary_gene, phenotype, detected_variants, recommendation_text)
+
+    cached = explanation_cache.get(key)
+    if cached is not None:
+        return cached
+
+    stored = explanation_store.get(drug, primary_gene, phenotype, recommendation_text)
+    if stored is not None:
+        return stored
+
+    flight, leader = explanation_flights.join(key)
+
+    if not leader:
+        try:
+            return dict(explanation_flights.wait(flight))
+        except Exception:
+            return _shared_fallback(recommendation_text)
+
+    prompt = build_prompt(drug, primary_gene, phenotype, detected_variants, recommendation_text)
+
+    try:
+        payload = _request_explanation(key, prompt, recommendation_text)
+    except BaseException as e:
+        explanation_flights.resolve(key, flight, error=e)
+        raise
+
+    explanation_flights.resolve(key, flight, dict(payload))
+
+    return payload
+
+
+async def generate_explanation_async(
+    patient_id,
+    drug,
+    primary_gene,
+    phenotype,
+    detected_variants,
+    recommendation_text
+):
+    """
+    Non-blocking generate_explanation: same cache, prompt, fallback and
+    single-flight coalescing, at most LLM_FANOUT calls in flight
+    """
+
+    key = explanation_key(drug, primary_gene, phenotype, detected_variants, recommendation_text)
+
+    # ✅ a memory miss reads SQLite: off the event loop, like upload_cache in analyze.py
+    cached = await run_in_threadpool(explanation_cache.get, key)
+    if cached is not None:
+        return cached
+
+    stored = explanation_store.get(drug, primary_gene, phenotype, recommendation_text)
+    if stored is not None:
+        return stored
+
+    flight, leader = explanation_flights.join(key)
+
+    if not leader:
+        try:
+            return dict(await explanation_flights.wait_async(flight))
+        except Exception:
+            return _shared_fallback(recommendation_text)
+
+    prompt = build_prompt(drug, primary_gene, phenotype, detected_variants, recommendation_text)
+
+    try:
+        payload = await _request_explanation_async(key, prompt, recommendation_text)
+    except BaseException as e:
+        explanation_flights.resolve(key, flight, error=e)
+        raise
+
+    explanation_flights.resolve(key, flight, dict(payload))
+
+    return payload
 
-    payload["generated_at"] = datetime.utcnow() \
-        .replace(microsecond=0) \
-        .isoformat() + "Z"
 
+def _shared_fallback(recommendation_text):
+    # the leader crashed or was cancelled; waiters degrade like a failed LLM call
+    payload = fallback_payload(recommendation_text)
+    payload["generated_at"] = utc_timestamp()
     return payload
@@ -0,0 +1,278 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# ⭐ METRICS + PER-REQUEST STAGE TIMINGS
+# stage("parse") / observe(...) are cheap (perf_counter + one locked bisect).
+# Process-wide histograms are rendered in Prometheus text format at /metrics;
+# the current request's stage breakdown feeds quality_metrics.stage_timings_ms
+# and the Server-Timing header. Inside CPU worker processes observations are
+# captured and replayed in the API process (see cpu_executor).
+
+STAGES = ("parse", "profile", "risk", "recommendation", "llm", "validation")
+
+SECONDS_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+BYTES_BUCKETS = tuple(1024 * 4 ** i for i in range(11))  # 1 KB … 1 GB
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000, 20000)
+
+
+class Histogram:
+
+    def __init__(self, name, help_text, buckets, label=None):
+        self.name = name
+        self.help = help_text
+        self.buckets = buckets
+        self.label = label
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, label_value=None):
+        i = bisect_left(self.buckets, value)
+
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+
+        with self._lock:
+            series = {k: (list(v[0]), v[1], v[2]) for k, v in self._series.items()}
+
+        for label_value, (counts, total, count) in sorted(series.items(), key=lambda kv: str(kv[0])):
+            prefix = f'{self.label}="{label_value}",' if self.label else ""
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{self.name}_bucket{{{prefix}le="{le}"}} {cumulative}')
+            labels = f"{{{prefix[:-1]}}}" if prefix else ""
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {count}")
+
+        return lines
+
+
+class Counter:
+
+    def __init__(self, name, help_text, label=None):
+        self.name = name
+        self.help = help_text
+        self.label = label
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_value=None, amount=1):
+        with self._lock:
+            self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for label_value, value in sorted(values.items(), key=lambda kv: str(kv[0])):
+            labels = f'{{{self.label}="{label_value}"}}' if self.label else ""
+            lines.append(f"{self.name}{labels} {value}")
+        return lines
+
+
+METRICS = {
+    m.name: m for m in (
+        Histogram("pharmaguard_stage_seconds", "Pipeline stage latency", SECONDS_BUCKETS, "stage"),
+        Histogram("pharmaguard_upload_bytes", "VCF upload size", BYTES_BUCKETS),
+        Histogram("pharmaguard_variant_count", "PGx variants per analyzed VCF", COUNT_BUCKETS),
+        Histogram("pharmaguard_llm_seconds", "LLM round-trip latency (cache misses only)", SECONDS_BUCKETS),
+        Counter("pharmaguard_llm_requests_total", "LLM calls by outcome (ok / fallback)", "outcome"),
+    )
+}
+
+
+# ---------- PER-REQUEST TIMINGS ----------
+class Timings:
+    """
+    Stage → seconds; a per-drug child also reports into its request's timings.
+    Drugs run concurrently, so a stage counts the wall-clock time it covered:
+    overlapping intervals once, never their sum (which could exceed the request).
+    """
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self._intervals = {}
+
+    def add(self, stage_name, seconds):
+        ended = time.perf_counter()
+        node = self
+        while node is not None:
+            node._intervals.setdefault(stage_name, []).append((ended - seconds, ended))
+            node = node.parent
+
+    @property
+    def stages(self):
+        return {name: _covered(intervals) for name, intervals in self._intervals.items()}
+
+    def as_ms(self):
+        # parent stages (parse / profile) first, then this drug's own
+        merged = dict(self.parent.as_ms()) if self.parent is not None else {}
+        merged.update({k: round(v * 1000, 3) for k, v in self.stages.items()})
+        return merged
+
+
+def _covered(intervals):
+    """Total length of the union of (start, end) intervals."""
+    total = 0.0
+    reach = float("-inf")
+
+    for start, end in sorted(intervals):
+        if end > reach:
+            total += end - max(start, reach)
+            reach = end
+
+    return total
+
+
+_timings = ContextVar("pharmaguard_timings", default=None)
+_capture = ContextVar("pharmaguard_capture", default=None)
+
+
+def start_timings(parent=None):
+    """New Timings bound to the current context; returns (timings, reset token)."""
+    timings = Timings(parent)
+    return timings, _timings.set(timings)
+
+
+def end_timings(token):
+    _timings.reset(token)
+
+
+def current_timings():
+    return _timings.get()
+
+
+@contextmanager
+def drug_timings():
+    """Per-drug breakdown nested in the current request's timings."""
+    timings, token = start_timings(current_timings())
+    try:
+        yield timings
+    finally:
+        end_timings(token)
+
+
+def record_stage(stage_name, seconds):
+    buffer = _capture.get()
+    if buffer is not None:
+        buffer.append(("stage", stage_name, seconds))
+        return
+
+    METRICS["pharmaguard_stage_seconds"].observe(seconds, stage_name)
+
+    timings = _timings.get()
+    if timings is not None:
+        timings.add(stage_name, seconds)
+
+
+@contextmanager
+def stage(stage_name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage_name, time.perf_counter() - started)
+
+
+def observe(name, value, label_value=None):
+    buffer = _capture.get()
+    if buffer is not None:
+        buffer.append(("observe", name, value, label_value))
+        return
+
+    metric = METRICS[name]
+    if isinstance(metric, Counter):
+        metric.inc(label_value, value)
+    else:
+        metric.observe(value, label_value)
+
+
+# ---------- WORKER PROCESS HAND-OFF ----------
+@contextmanager
+def capture():
+    """Collect observations instead of recording them (inside a CPU worker process)."""
+    buffer = []
+    token = _capture.set(buffer)
+    try:
+        yield buffer
+    finally:
+        _capture.reset(token)
+
+
+def replay(buffer):
+    for entry in buffer:
+        if entry[0] == "stage":
+            record_stage(entry[1], entry[2])
+        else:
+            observe(*entry[1:])
+
+
+# ---------- EXPORT ----------
+def server_timing(timings):
+    return ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in timings.stages.items())
+
+
+def render_prometheus(cache_stats=()):
+    """Text exposition format; cache_stats: (cache name, stats dict) pairs."""
+    lines = []
+
+    for metric in METRICS.values():
+        lines.extend(metric.render())
+
+    if cache_stats:
+        lines.append("# HELP pharmaguard_cache_events_total Cache lookups / writes by cache and event")
+        lines.append("# TYPE pharmaguard_cache_events_total counter")
+        for cache_name, stats in cache_stats:
+            for event, value in stats.items():
+                if event.endswith(("hits", "misses", "writes", "evictions", "leaders", "coalesced",
+                                   "captured", "rate_limited")):
+                    lines.append(f'pharmaguard_cache_events_total{{cache="{cache_name}",event="{event}"}} {value}')
+
+    return "\n".join(lines) + "\n"
+
+
+class TimingMiddleware:
+    """
+    Pure ASGI: one Timings per HTTP request and a Server-Timing header with its
+    stages + total. Streamed responses send headers first, so they carry only
+    what finished before the first byte (parse / profile).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        timings, token = start_timings()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                total = f"total;dur={(time.perf_counter() - started) * 1000:.2f}"
+                value = ", ".join(filter(None, (server_timing(timings), total)))
+                message = dict(message, headers=list(message.get("headers", [])) + [
+                    (b"server-timing", value.encode("latin-1")),
+                ])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            end_timings(token)
@@ -6,11 +6,13 @@ from reportlab.platypus import (
     TableStyle
 )
 from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.styles import ParagraphStyle
 from reportlab.lib import colors
 
 from datetime import datetime
-import os
+import io
+
+# layout changes: bump REPORT_LAYOUT_VERSION in report_cache (invalidates cached reports)
 
 
 # ✅ Clinical Color Semantics
@@ -23,46 +25,62 @@ RISK_COLORS = {
 }
 
 
-def build_pdf_report(results, output_path):
+# ✅ Styles built once, shared by every render (read-only during doc.build)
+TITLE_STYLE = ParagraphStyle(
+    "Title",
+    fontSize=18,
+    spaceAfter=20,
+    textColor=colors.black
+)
 
-    doc = SimpleDocTemplate(output_path, pagesize=A4)
+SECTION_HEADER = ParagraphStyle(
+    "Header",
+    fontSize=12,
+    spaceAfter=6,
+    textColor=colors.black
+)
 
-    styles = getSampleStyleSheet()
+NORMAL = ParagraphStyle(
+    "Normal",
+    fontSize=10,
+    spaceAfter=4
+)
 
-    title_style = ParagraphStyle(
-        "Title",
-        fontSize=18,
-        spaceAfter=20,
-        textColor=colors.black
-    )
+SMALL = ParagraphStyle(
+    "Small",
+    fontSize=9,
+    textColor=colors.grey
+)
 
-    section_header = ParagraphStyle(
-        "Header",
-        fontSize=12,
-        spaceAfter=6,
-        textColor=colors.black
-    )
+PGX_TABLE_STYLE = TableStyle([
+    ("FONT", (0, 0), (-1, -1), "Helvetica"),
+    ("FONTSIZE", (0, 0), (-1, -1), 9),
+    ("BOTTOMPADDING", (0, 0), (-1, -1), 4),
+    ("BACKGROUND", (0, 0), (0, -1), colors.whitesmoke),
+    ("BOX", (0, 0), (-1, -1), 0.5, colors.grey),
+])
 
-    normal = ParagraphStyle(
-        "Normal",
-        fontSize=10,
-        spaceAfter=4
-    )
 
-    small = ParagraphStyle(
-        "Small",
-        fontSize=9,
-        textColor=colors.grey
-    )
+def build_pdf_report(results, output, generated_at=None):
+    """
+    output: file path or writable binary file object
+    generated_at: pinned "Generated" time (ISO string); same results + same
+    generated_at → byte-identical PDF
+    """
+
+    doc = SimpleDocTemplate(output, pagesize=A4, invariant=1)
+
+    if generated_at is None:
+        generated_at = datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
 
     elements = []
 
     # ✅ Report Title
-    elements.append(Paragraph("Pharmacogenomic Clinical Report", title_style))
+    elements.append(Paragraph("Pharmacogenomic Clinical Report", TITLE_STYLE))
     elements.append(
         Paragraph(
-            f"Generated: {datetime.utcnow().replace(microsecond=0).isoformat()}Z",
-            small
+            f"Generated: {generated_at}",
+            SMALL
         )
     )
 
@@ -71,13 +89,13 @@ def build_pdf_report(results, output_path):
     # ✅ Patient Info (single patient assumed)
     patient_id = results[0]["patient_id"]
 
-    elements.append(Paragraph("<b>Patient Information</b>", section_header))
-    elements.append(Paragraph(f"Patient ID: {patient_id}", normal))
+    elements.append(Paragraph("<b>Patient Information</b>", SECTION_HEADER))
+    elements.append(Paragraph(f"Patient ID: {patient_id}", NORMAL))
 
     elements.append(Spacer(1, 12))
 
     # ✅ Drug Sections
-    elements.append(Paragraph("<b>Drug Risk Summary</b>", section_header))
+    elements.append(Paragraph("<b>Drug Risk Summary</b>", SECTION_HEADER))
 
     for r in results:
 
@@ -103,7 +121,7 @@ def build_pdf_report(results, output_path):
         elements.append(
             Paragraph(
                 f"<b>Drug:</b> {drug}",
-                section_header
+                SECTION_HEADER
             )
         )
 
@@ -114,7 +132,7 @@ def build_pdf_report(results, output_path):
                 f"<font color='{risk_color}'>"
                 f"{risk} ({severity})"
                 f"</font>",
-                normal
+                NORMAL
             )
         )
 
@@ -128,13 +146,7 @@ def build_pdf_report(results, output_path):
 
         table = Table(table_data, hAlign="LEFT")
 
-        table.setStyle(TableStyle([
-            ("FONT", (0, 0), (-1, -1), "Helvetica"),
-            ("FONTSIZE", (0, 0), (-1, -1), 9),
-            ("BOTTOMPADDING", (0, 0), (-1, -1), 4),
-            ("BACKGROUND", (0, 0), (0, -1), colors.whitesmoke),
-            ("BOX", (0, 0), (-1, -1), 0.5, colors.grey),
-        ]))
+        table.setStyle(PGX_TABLE_STYLE)
 
         elements.append(table)
 
@@ -144,7 +156,7 @@ def build_pdf_report(results, output_path):
         elements.append(
             Paragraph(
                 f"<b>Clinical Recommendation:</b> {recommendation}",
-                normal
+                NORMAL
             )
         )
 
@@ -153,7 +165,7 @@ def build_pdf_report(results, output_path):
             elements.append(
                 Paragraph(
                     f"<b>Clinical Interpretation:</b> {interpretation}",
-                    normal
+                    NORMAL
                 )
             )
 
@@ -163,8 +175,15 @@ def build_pdf_report(results, output_path):
         elements.append(
             Paragraph(
                 f"<b>Mechanistic Rationale:</b> {llm_summary}",
-                normal
+                NORMAL
             )
         )
 
     doc.build(elements)
+
+
+def render_pdf_report(results, generated_at=None):
+    """Render to memory → PDF bytes (no temp files)."""
+    buffer = io.BytesIO()
+    build_pdf_report(results, buffer, generated_at)
+    return buffer.getvalue()
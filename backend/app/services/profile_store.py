@@ -0,0 +1,149 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+
+from fastapi.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+# ⭐ PATIENT PROFILE STORE
+# The drug-independent part of an analysis (PGx variants + per-gene profile) is
+# kept under the patient id, so more drugs can be evaluated later without the
+# VCF. Rows are zlib-compressed JSON (~1 KB per patient) in SQLite; a bounded
+# LRU of decoded profiles sits in front, so memory stays flat for any row count.
+
+BASE = Path(__file__).resolve().parents[2]
+
+PROFILE_STORE_PATH = os.getenv("PHARMAGUARD_PROFILE_STORE_PATH", str(BASE / ".cache" / "profiles.sqlite3"))
+PROFILE_STORE_TTL = float(os.getenv("PHARMAGUARD_PROFILE_STORE_TTL", 30 * 24 * 3600))  # seconds, 0 = no expiry
+PROFILE_STORE_MEMORY_ENTRIES = int(os.getenv("PHARMAGUARD_PROFILE_STORE_MEMORY_ENTRIES", 2_000))  # ~17 KB each decoded
+PURGE_EVERY_PUTS = 1000
+
+
+def encode_profile(patient_profile):
+    compact = json.dumps(
+        {"variants": patient_profile["variants"], "pgx_profile": patient_profile["pgx_profile"]},
+        separators=(",", ":"),
+    )
+    return zlib.compress(compact.encode(), 6)
+
+
+def decode_profile(blob):
+    return json.loads(zlib.decompress(blob))
+
+
+class ProfileStore:
+
+    def __init__(self, path=PROFILE_STORE_PATH, ttl=PROFILE_STORE_TTL,
+                 memory_entries=PROFILE_STORE_MEMORY_ENTRIES):
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._puts = 0
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0}
+
+        if path:
+            try:
+                Path(path).parent.mkdir(parents=True, exist_ok=True)
+                self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute("PRAGMA synchronous=NORMAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS profiles ("
+                    " patient_id TEXT PRIMARY KEY,"
+                    " profile BLOB NOT NULL,"
+                    " created_at REAL NOT NULL"
+                    ") WITHOUT ROWID"
+                )
+                self._db.execute("CREATE INDEX IF NOT EXISTS profiles_created ON profiles (created_at)")
+            except sqlite3.Error as e:
+                logger.warning(f"Profile store disk tier disabled: {e}")
+                self._db = None
+
+    def _expired(self, created_at, now):
+        return self.ttl > 0 and now - created_at > self.ttl
+
+    def get(self, patient_id):
+        """Stored {"variants", "pgx_profile"} or None. Callers must not mutate it."""
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(patient_id)
+            if entry is not None:
+                profile, created_at = entry
+                if not self._expired(created_at, now):
+                    self._memory.move_to_end(patient_id)
+                    self.counters["memory_hits"] += 1
+                    return profile
+                del self._memory[patient_id]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT profile, created_at FROM profiles WHERE patient_id = ?", (patient_id,)
+                ).fetchone()
+
+                if row is not None and not self._expired(row[1], now):
+                    profile = decode_profile(row[0])
+                    self._remember(patient_id, profile, row[1])
+                    self.counters["disk_hits"] += 1
+                    return profile
+
+            self.counters["misses"] += 1
+            return None
+
+    def put(self, patient_id, patient_profile):
+        now = time.time()
+        blob = encode_profile(patient_profile)
+
+        with self._lock:
+            self._remember(patient_id, decode_profile(blob), now)
+            self.counters["writes"] += 1
+
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO profiles (patient_id, profile, created_at) VALUES (?, ?, ?)",
+                    (patient_id, blob, now),
+                )
+
+                # expiry sweep is amortized over writes (index range delete, no full scan)
+                self._puts += 1
+                if self.ttl > 0 and self._puts % PURGE_EVERY_PUTS == 0:
+                    self._db.execute("DELETE FROM profiles WHERE created_at < ?", (now - self.ttl,))
+
+    def _remember(self, patient_id, profile, created_at):
+        self._memory[patient_id] = (profile, created_at)
+        self._memory.move_to_end(patient_id)
+
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def delete(self, patient_id):
+        with self._lock:
+            self._memory.pop(patient_id, None)
+            if self._db is not None:
+                self._db.execute("DELETE FROM profiles WHERE patient_id = ?", (patient_id,))
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats["memory_entries"] = len(self._memory)
+        return stats
+
+
+profile_store = ProfileStore()
+
+
+async def save_profile(patient_id, patient_profile):
+    """Keep the profile for drug-only re-queries; a store failure never fails the analysis."""
+    try:
+        await run_in_threadpool(profile_store.put, patient_id, patient_profile)
+    except Exception:
+        logger.exception("Saving patient profile failed")
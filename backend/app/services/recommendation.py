@@ -1,27 +1,28 @@
-import json
-from pathlib import Path
+from app.services.knowledge_base import (
+    KB,
+    NO_EVIDENCE_TEXT,
+    resolve_recommendation,
+    table_key,
+)
 
-BASE = Path(__file__).resolve().parents[1]
-RULES_DIR = BASE / "rules"
+_cpic = KB["cpic_rules"]
+_drug_ids = KB["drug_ids"]
+_gene_ids = KB["gene_ids"]
+_phenotype_ids = KB["phenotype_ids"]
+_rec_table = KB["rec_table"]
 
-_cpic = json.loads((RULES_DIR / "cpic_rules.json").read_text())
 
 def get_clinical_recommendation(drug_name, primary_gene, phenotype):
     drug = drug_name.strip().upper()
     if drug not in _cpic:
-        return {"text": "No pharmacogenomic evidence detected to determine recommendation."}
+        return {"text": NO_EVIDENCE_TEXT}
 
+    gene_id = _gene_ids.get(primary_gene, 0) if primary_gene else 0
+    phenotype_id = _phenotype_ids.get(phenotype)
 
-    gene_block = _cpic[drug]
-    # gene block keys may be combined names, find best match
-    if primary_gene in gene_block:
-        rec = gene_block[primary_gene].get(phenotype)
-        if rec:
-            return {"text": rec}
-    # fallback: if only one gene in block, try that
-    for k,v in gene_block.items():
-        rec = v.get(phenotype)
-        if rec:
-            return {"text": rec}
+    # ✅ Precompiled (drug, gene, phenotype) lookup
+    if phenotype_id is not None and (gene_id or primary_gene is None):
+        return {"text": _rec_table[table_key(_drug_ids[drug], gene_id, phenotype_id)]}
 
-    return {"text": "No specific CPIC recommendation for this genotype/phenotype combination."}
+    # Combination outside the compiled tables (unknown gene / phenotype label)
+    return {"text": resolve_recommendation(_cpic[drug], primary_gene, phenotype)}
@@ -0,0 +1,284 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.services.cpu_executor import run_cpu
+from app.services.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# ⭐ CONTENT-ADDRESSED PDF REPORT CACHE
+# key = sha256 of the canonicalized results (+ layout version). The "Generated"
+# line is pinned to the newest result timestamp, so the same results always
+# render the same PDF and the key doubles as its ETag.
+# in-process LRU (byte budget)  →  files on disk  →  render
+
+BASE = Path(__file__).resolve().parents[2]
+
+REPORT_CACHE_DIR = os.getenv("PHARMAGUARD_REPORT_CACHE_DIR", str(BASE / ".cache" / "reports"))
+REPORT_CACHE_MEMORY_MB = float(os.getenv("PHARMAGUARD_REPORT_CACHE_MEMORY_MB", 32))
+REPORT_CACHE_DISK_ENTRIES = int(os.getenv("PHARMAGUARD_REPORT_CACHE_DISK_ENTRIES", 10_000))
+REPORT_CACHE_TTL = float(os.getenv("PHARMAGUARD_REPORT_CACHE_TTL", 7 * 24 * 3600))  # seconds, 0 = no expiry
+REPORT_PRERENDER = os.getenv("PHARMAGUARD_REPORT_PRERENDER", "0").lower() in ("1", "true", "yes")
+
+# bump when the pdf_report layout changes: invalidates cached reports
+REPORT_LAYOUT_VERSION = 1
+
+
+def render_report(results, generated_at):
+    # reportlab (~0.13 s to import) loads on the first render or at warm-up, not with the app
+    from app.services.pdf_report import render_pdf_report
+    return render_pdf_report(results, generated_at)
+
+
+def report_generated_at(results):
+    """Pinned "Generated" time: the newest analysis timestamp in the results."""
+    stamps = [r.get("timestamp") for r in results if isinstance(r.get("timestamp"), str)]
+    return max(stamps) if stamps else None
+
+
+def _canonical(value):
+    # JSON clients (browsers) turn 1.0 into 1 on the round trip; both must hash the same
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, dict):
+        return {k: _canonical(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_canonical(v) for v in value]
+    return value
+
+
+def report_key(results):
+    canonical = json.dumps(
+        {"layout": REPORT_LAYOUT_VERSION, "results": _canonical(results)},
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class ReportCache:
+    """LRU memory tier (bounded by bytes) in front of an optional directory of <key>.pdf files."""
+
+    def __init__(self, path=REPORT_CACHE_DIR, memory_mb=REPORT_CACHE_MEMORY_MB,
+                 disk_entries=REPORT_CACHE_DISK_ENTRIES, ttl=REPORT_CACHE_TTL):
+        self.memory_bytes = int(memory_mb * 1024 * 1024)
+        self.disk_entries = disk_entries
+        self.ttl = ttl
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._lock = threading.Lock()
+        self.dir = None
+        self._disk_count = 0
+        self.counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "writes": 0,
+            "evictions": 0,
+        }
+
+        if path:
+            try:
+                Path(path).mkdir(parents=True, exist_ok=True)
+                self.dir = Path(path)
+                # ✅ scanned once here; put() only rescans when the count goes over the limit
+                self._disk_count = len(self._pdf_files())
+            except OSError as e:
+                logger.warning(f"Report cache disk tier disabled: {e}")
+
+    def _file(self, key):
+        return self.dir / f"{key}.pdf"
+
+    def _expired(self, created_at, now):
+        return self.ttl > 0 and now - created_at > self.ttl
+
+    def get(self, key):
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                pdf, created_at = entry
+                if not self._expired(created_at, now):
+                    self._memory.move_to_end(key)
+                    self.counters["memory_hits"] += 1
+                    return pdf
+                self._forget(key)
+
+        if self.dir is not None:
+            path = self._file(key)
+            try:
+                created_at = path.stat().st_mtime
+                if self._expired(created_at, now):
+                    path.unlink()
+                    with self._lock:
+                        self._disk_count -= 1
+                else:
+                    pdf = path.read_bytes()
+                    with self._lock:
+                        self._remember(key, pdf, created_at)
+                        self.counters["disk_hits"] += 1
+                    return pdf
+            except OSError:
+                pass
+
+        with self._lock:
+            self.counters["misses"] += 1
+        return None
+
+    def contains(self, key):
+        """Whether get() would find the report; no counters, no read of the file."""
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and not self._expired(entry[1], now):
+                return True
+
+        if self.dir is not None:
+            try:
+                return not self._expired(self._file(key).stat().st_mtime, now)
+            except OSError:
+                pass
+
+        return False
+
+    def put(self, key, pdf):
+        now = time.time()
+
+        with self._lock:
+            self._remember(key, pdf, now)
+            self.counters["writes"] += 1
+
+        if self.dir is not None:
+            try:
+                path = self._file(key)
+                is_new = not path.exists()
+                tmp = self.dir / f"{key}.{threading.get_ident()}.tmp"
+                tmp.write_bytes(pdf)
+                os.replace(tmp, path)
+
+                with self._lock:
+                    self._disk_count += is_new
+                    over = self._disk_count > self.disk_entries
+                if over:
+                    self._evict_disk()
+            except OSError as e:
+                logger.warning(f"Report cache write failed: {e}")
+
+    def _remember(self, key, pdf, created_at):
+        if key in self._memory:
+            self._forget(key)
+
+        self._memory[key] = (pdf, created_at)
+        self._memory_size += len(pdf)
+
+        while self._memory_size > self.memory_bytes and self._memory:
+            self._forget(next(iter(self._memory)))
+            self.counters["evictions"] += 1
+
+    def _forget(self, key):
+        pdf, _ = self._memory.pop(key)
+        self._memory_size -= len(pdf)
+
+    def _pdf_files(self):
+        return [e for e in os.scandir(self.dir) if e.name.endswith(".pdf")]
+
+    def _evict_disk(self):
+        files = self._pdf_files()
+        excess = len(files) - self.disk_entries
+        removed = 0
+
+        if excess > 0:
+            for entry in sorted(files, key=lambda e: e.stat().st_mtime)[:excess]:
+                try:
+                    os.remove(entry.path)
+                    removed += 1
+                except OSError:
+                    pass
+
+        with self._lock:
+            # the scan is the truth (other processes may share the directory)
+            self._disk_count = len(files) - removed
+            self.counters["evictions"] += removed
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_size = 0
+        if self.dir is not None:
+            for entry in self._pdf_files():
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+            with self._lock:
+                self._disk_count = 0
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats["memory_entries"] = len(self._memory)
+            stats["memory_bytes"] = self._memory_size
+            if self.dir is not None:
+                stats["disk_entries"] = self._disk_count
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((lookups - stats["misses"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+report_cache = ReportCache()
+report_flights = SingleFlight()
+
+# keeps fire-and-forget pre-renders alive until they finish
+_prerenders = set()
+
+
+async def cached_report(results, key=None):
+    """(key, pdf bytes); renders at most once per key, concurrent callers share the render."""
+    key = key or report_key(results)
+
+    pdf = await run_in_threadpool(report_cache.get, key)
+    if pdf is not None:
+        return key, pdf
+
+    flight, leader = report_flights.join(key)
+    if not leader:
+        return key, await report_flights.wait_async(flight)
+
+    try:
+        pdf = await run_cpu(render_report, results, report_generated_at(results))
+        await run_in_threadpool(report_cache.put, key, pdf)
+    except BaseException as e:
+        report_flights.resolve(key, flight, error=e)
+        raise
+
+    report_flights.resolve(key, flight, result=pdf)
+    return key, pdf
+
+
+async def _prerender(results):
+    try:
+        await cached_report(results)
+    except Exception:
+        logger.exception("Report pre-render failed")
+
+
+def prerender_report(results):
+    """Render the PDF for freshly analyzed results in the background (PHARMAGUARD_REPORT_PRERENDER)."""
+    if not REPORT_PRERENDER:
+        return
+
+    task = asyncio.create_task(_prerender(results))
+    _prerenders.add(task)
+    task.add_done_callback(_prerenders.discard)
@@ -0,0 +1,302 @@
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter, deque
+from pathlib import Path
+
+from fastapi.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+# ⭐ OPT-IN PER-REQUEST PROFILING (safe to leave on in production)
+# Triggered by the X-PharmaGuard-Profile header ("cpu" or "memory", must match
+# PHARMAGUARD_PROFILING_TOKEN when one is set) or by random sampling.
+# CPU: a wall-clock stack sampler over every thread of the API process — the
+# request's work is spread over the event loop and threadpool, which cProfile
+# (one thread) would miss. Memory: tracemalloc top-N allocation sites.
+# Limits: one capture at a time, PHARMAGUARD_PROFILING_MAX_PER_MINUTE captures,
+# a hard cap on capture length, and only the newest MAX_FILES captures are kept.
+
+BASE = Path(__file__).resolve().parents[2]
+
+PROFILING = os.getenv("PHARMAGUARD_PROFILING", "0").lower() in ("1", "true", "yes")
+PROFILING_DIR = os.getenv("PHARMAGUARD_PROFILING_DIR", str(BASE / ".cache" / "request_profiles"))
+PROFILING_TOKEN = os.getenv("PHARMAGUARD_PROFILING_TOKEN", "")
+PROFILING_SAMPLE_RATE = float(os.getenv("PHARMAGUARD_PROFILING_SAMPLE_RATE", 0))  # share of requests, 0 = header only
+PROFILING_MAX_PER_MINUTE = int(os.getenv("PHARMAGUARD_PROFILING_MAX_PER_MINUTE", 6))
+PROFILING_MAX_SECONDS = float(os.getenv("PHARMAGUARD_PROFILING_MAX_SECONDS", 60))
+PROFILING_MAX_FILES = int(os.getenv("PHARMAGUARD_PROFILING_MAX_FILES", 200))
+PROFILING_INTERVAL_MS = float(os.getenv("PHARMAGUARD_PROFILING_INTERVAL_MS", 5))
+PROFILING_TOP = int(os.getenv("PHARMAGUARD_PROFILING_TOP", 25))
+
+PROFILED_PREFIXES = ("/analyze", "/report")
+
+PROFILE_HEADER = b"x-pharmaguard-profile"
+
+# (file name, function) of frames where an idle thread sits: loop select, pool queue waits
+IDLE_FRAMES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+
+
+# ---------- CPU: STACK SAMPLER ----------
+def _frame_name(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Samples every other thread's Python stack each interval; collapsed-stack counts."""
+
+    def __init__(self, interval=PROFILING_INTERVAL_MS / 1000, max_seconds=PROFILING_MAX_SECONDS):
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.stacks = Counter()
+        self.samples = 0
+        self.idle_samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="pharmaguard-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        me = threading.get_ident()
+        deadline = time.monotonic() + self.max_seconds
+
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me:
+                    continue
+
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+                    self.idle_samples += 1
+                    continue
+
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame.f_code))
+                    frame = frame.f_back
+
+                self.stacks[";".join(reversed(stack))] += 1
+                self.samples += 1
+
+    def top(self, n):
+        own, total = Counter(), Counter()
+
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for name in set(frames):
+                total[name] += count
+
+        def rows(counter):
+            return [
+                {"function": name, "samples": count, "share": round(count / self.samples, 4)}
+                for name, count in counter.most_common(n)
+            ]
+
+        return {"self": rows(own), "cumulative": rows(total)}
+
+
+# ---------- CAPTURE ----------
+class ProfileCapture:
+
+    def __init__(self, request_id, method, path, memory):
+        self.request_id = request_id
+        self.method = method
+        self.path = path
+        self.memory = memory
+        self.sampler = StackSampler()
+        self._own_tracemalloc = False
+
+    def start(self):
+        if self.memory and not tracemalloc.is_tracing():
+            # ✅ someone else's tracemalloc (PYTHONTRACEMALLOC) is left running afterwards
+            tracemalloc.start(10)
+            self._own_tracemalloc = True
+        if self.memory:
+            tracemalloc.reset_peak()
+        self.started = time.perf_counter()
+        self.sampler.start()
+
+    def stop(self, status):
+        self.sampler.stop()
+        duration = time.perf_counter() - self.started
+
+        summary = {
+            "request_id": self.request_id,
+            "method": self.method,
+            "path": self.path,
+            "status": status,
+            "duration_ms": round(duration * 1000, 3),
+            "sampler": {
+                "interval_ms": PROFILING_INTERVAL_MS,
+                "samples": self.sampler.samples,
+                "idle_samples": self.sampler.idle_samples,
+                "note": "all threads of the API process; concurrent requests show up too",
+            },
+            "top": self.sampler.top(PROFILING_TOP),
+        }
+
+        if self.memory and tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, __file__),
+                tracemalloc.Filter(False, tracemalloc.__file__),
+            ))
+            current, peak = tracemalloc.get_traced_memory()
+            if self._own_tracemalloc:
+                tracemalloc.stop()
+            summary["memory"] = {
+                "current_bytes": current,
+                "peak_bytes": peak,
+                "top": [
+                    {"location": str(stat.traceback[0]), "bytes": stat.size, "count": stat.count}
+                    for stat in snapshot.statistics("lineno")[:PROFILING_TOP]
+                ],
+            }
+
+        return summary
+
+    def write(self, summary, directory=PROFILING_DIR):
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, self.request_id)
+
+        with open(base + ".json", "w") as f:
+            json.dump(summary, f, indent=2)
+
+        # flamegraph.pl / speedscope "collapsed stacks" input
+        with open(base + ".stacks.txt", "w") as f:
+            for stack, count in self.sampler.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+        _prune(directory)
+
+
+def _prune(directory, keep=PROFILING_MAX_FILES):
+    summaries = sorted(Path(directory).glob("*.json"), key=lambda p: p.stat().st_mtime)
+
+    for old in summaries[:max(0, len(summaries) - keep)]:
+        for path in (old, old.with_suffix(".stacks.txt")):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+
+# ---------- RATE LIMIT ----------
+class ProfilingGate:
+    """At most one capture at a time and max_per_minute captures per sliding minute."""
+
+    def __init__(self, max_per_minute=PROFILING_MAX_PER_MINUTE):
+        self.max_per_minute = max_per_minute
+        self._recent = deque()
+        self._active = False
+        self._lock = threading.Lock()
+        self.counters = {"captured": 0, "rate_limited": 0}
+
+    def acquire(self):
+        now = time.monotonic()
+
+        with self._lock:
+            while self._recent and now - self._recent[0] > 60:
+                self._recent.popleft()
+
+            if self._active or len(self._recent) >= self.max_per_minute:
+                self.counters["rate_limited"] += 1
+                return False
+
+            self._active = True
+            self._recent.append(now)
+            self.counters["captured"] += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._active = False
+
+
+profiling_gate = ProfilingGate()
+
+
+def requested_mode(headers):
+    """None, "cpu" or "memory" — from the profile header, else random sampling."""
+    value = None
+    for name, raw in headers:
+        if name == PROFILE_HEADER:
+            value = raw.decode("latin-1").strip()
+            break
+
+    if value is not None:
+        mode, _, token = value.partition(";")
+        mode = mode.strip().lower() or "cpu"
+        if PROFILING_TOKEN and token.strip() != PROFILING_TOKEN:
+            return None
+        return mode if mode in ("cpu", "memory") else None
+
+    if PROFILING_SAMPLE_RATE and random.random() < PROFILING_SAMPLE_RATE:
+        return "cpu"
+
+    return None
+
+
+class ProfilingMiddleware:
+    """
+    Pure ASGI, for /analyze and /report. A profiled response carries
+    X-PharmaGuard-Profile-Id; the capture is <dir>/<id>.json (+ .stacks.txt).
+    The capture spans the whole response, streamed bodies included.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (
+            not PROFILING
+            or scope["type"] != "http"
+            or not scope["path"].startswith(PROFILED_PREFIXES)
+        ):
+            return await self.app(scope, receive, send)
+
+        mode = requested_mode(scope["headers"])
+        if mode is None or not profiling_gate.acquire():
+            return await self.app(scope, receive, send)
+
+        request_id = uuid.uuid4().hex
+        capture = ProfileCapture(request_id, scope["method"], scope["path"], memory=mode == "memory")
+        status = [None]
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                message = dict(message, headers=list(message.get("headers", [])) + [
+                    (b"x-pharmaguard-profile-id", request_id.encode()),
+                ])
+            await send(message)
+
+        try:
+            capture.start()
+            try:
+                await self.app(scope, receive, send_with_id)
+            finally:
+                # ✅ sampler join, tracemalloc snapshot and file writes off the event loop
+                summary = await run_in_threadpool(capture.stop, status[0])
+                try:
+                    await run_in_threadpool(capture.write, summary)
+                except OSError:
+                    logger.exception("could not write request profile %s", request_id)
+        finally:
+            profiling_gate.release()
@@ -1,10 +1,10 @@
-import json
-from pathlib import Path
+from app.services.knowledge_base import KB, UNKNOWN_RULE, table_key
 
-BASE = Path(__file__).resolve().parents[1]
-RULES_DIR = BASE / "rules"
-
-_risk_rules = json.loads((RULES_DIR / "risk_rules.json").read_text())
+_drug_ids = KB["drug_ids"]
+_gene_ids = KB["gene_ids"]
+_phenotype_ids = KB["phenotype_ids"]
+_risk_genes = KB["risk_genes"]
+_risk_table = KB["risk_table"]
 
 def assess_drug_risk(drug_name, pgx_profile):
     """
@@ -13,7 +13,7 @@ def assess_drug_risk(drug_name, pgx_profile):
     returns: dict { risk_assessment, primary_gene }
     """
     drug = drug_name.strip().upper()
-    if drug not in _risk_rules:
+    if drug not in _risk_genes:
         # Unknown drug - return Unknown label
         return {
             "risk_assessment": {
@@ -24,12 +24,11 @@ def assess_drug_risk(drug_name, pgx_profile):
             "primary_gene": None
         }
 
-    drug_rules = _risk_rules[drug]
+    drug_id = _drug_ids[drug]
     primary_gene = None
     assessment = None
 
-    for gene_key, mapping in drug_rules.items():
-        gene = gene_key
+    for gene in _risk_genes[drug]:
         if gene in pgx_profile:
             primary_gene = gene
             phenotype = pgx_profile[gene]["phenotype"]
@@ -43,19 +42,13 @@ def assess_drug_risk(drug_name, pgx_profile):
                     "primary_gene": gene
                 }
 
-            # Try direct phenotype mapping
-            rule = mapping.get(phenotype)
-
-            # Fallback normalization (SLCO1B1 etc.)
-            if not rule:
-                if phenotype == "NM" and mapping.get("NormalFunction"):
-                    rule = mapping.get("NormalFunction")
-                elif phenotype in ("PM","IM") and mapping.get("LowFunction"):
-                    rule = mapping.get("LowFunction")
-                else:
-                    rule = {"risk_label":"Unknown","severity":"unknown","confidence":0.0}
+            # Precompiled lookup (phenotype fallbacks already resolved)
+            phenotype_id = _phenotype_ids.get(phenotype)
+            rule = None
+            if phenotype_id is not None:
+                rule = _risk_table.get(table_key(drug_id, _gene_ids[gene], phenotype_id))
 
-            assessment = rule
+            assessment = rule or UNKNOWN_RULE
             break
 
     if not assessment:
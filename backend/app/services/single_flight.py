@@ -0,0 +1,62 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+
+# ⭐ SINGLE-FLIGHT REQUEST COALESCING
+# First caller for a key does the work ("leader"); identical callers that arrive
+# while it is in flight wait on the leader's future instead of repeating it.
+# Works across threadpool workers and the event loop alike.
+
+
+class LeaderAborted(RuntimeError):
+    """The leader died without producing a result (cancelled / crashed)."""
+
+
+class SingleFlight:
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.counters = {"leaders": 0, "coalesced": 0}
+
+    def join(self, key):
+        """Returns (future, is_leader). The leader must call resolve() exactly once."""
+        with self._lock:
+            flight = self._calls.get(key)
+            if flight is not None:
+                self.counters["coalesced"] += 1
+                return flight, False
+
+            flight = self._calls[key] = Future()
+            self.counters["leaders"] += 1
+            return flight, True
+
+    def resolve(self, key, flight, result=None, error=None):
+        with self._lock:
+            if self._calls.get(key) is flight:
+                del self._calls[key]
+
+        if error is not None:
+            # waiters must never see the leader's own cancellation as theirs
+            if not isinstance(error, Exception):
+                error = LeaderAborted(repr(error))
+            flight.set_exception(error)
+        else:
+            flight.set_result(result)
+
+    def wait(self, flight, timeout=None):
+        return flight.result(timeout)
+
+    async def wait_async(self, flight):
+        # shield: a cancelled waiter must not cancel the shared future
+        return await asyncio.shield(asyncio.wrap_future(flight))
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats["in_flight"] = len(self._calls)
+        return stats
@@ -0,0 +1,73 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+from app.services.explanation_cache import ExplanationCache
+from app.services.knowledge_base import KB
+from app.services.llm_explainer import MODEL, is_fallback_payload
+from app.services.single_flight import SingleFlight
+
+# ⭐ UPLOAD DEDUPLICATION
+# Same VCF bytes + same drugs + same rules / model / explanation tier → same
+# results. A repeated upload is answered from this cache without parsing,
+# profiling or explaining; identical uploads in flight share one computation.
+
+BASE = Path(__file__).resolve().parents[2]
+
+UPLOAD_DEDUP = os.getenv("PHARMAGUARD_UPLOAD_DEDUP", "1").lower() in ("1", "true", "yes")
+UPLOAD_CACHE_PATH = os.getenv("PHARMAGUARD_UPLOAD_CACHE_PATH", str(BASE / ".cache" / "uploads.sqlite3"))
+UPLOAD_CACHE_TTL = float(os.getenv("PHARMAGUARD_UPLOAD_CACHE_TTL", 24 * 3600))  # seconds, 0 = no expiry
+UPLOAD_CACHE_MEMORY_ENTRIES = int(os.getenv("PHARMAGUARD_UPLOAD_CACHE_MEMORY_ENTRIES", 256))
+UPLOAD_CACHE_DISK_ENTRIES = int(os.getenv("PHARMAGUARD_UPLOAD_CACHE_DISK_ENTRIES", 10_000))
+
+
+def upload_key(file_sha256, drugs, explanation):
+    canonical = json.dumps(
+        {
+            "file": file_sha256,
+            "drugs": sorted(set(drugs)),
+            "explanation": explanation,
+            "rules": KB["source_digest"],
+            "model": MODEL,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def cacheable(results, explanation):
+    """
+    Only full-quality results are kept: a template fallback after a missed
+    deadline or an LLM failure fallback must not be served on the next upload.
+    """
+    for r in results:
+        metrics = r["quality_metrics"]
+
+        if explanation == "llm" and metrics["explanation_tier"] == "template":
+            return False
+
+        if metrics["explanation_tier"] == "llm" and is_fallback_payload(
+            r["llm_generated_explanation"], r["clinical_recommendation"]["text"]
+        ):
+            return False
+
+    return True
+
+
+def results_for(cached, drugs):
+    """Cached results in the requested drug order (single object for one drug, like /analyze)."""
+    by_drug = {r["drug"]: r for r in cached["results"]}
+    results = [by_drug[d] for d in drugs]
+    return results[0] if len(results) == 1 else results
+
+
+upload_cache = ExplanationCache(
+    UPLOAD_CACHE_PATH,
+    UPLOAD_CACHE_TTL,
+    UPLOAD_CACHE_MEMORY_ENTRIES,
+    UPLOAD_CACHE_DISK_ENTRIES,
+    table="upload_results",
+)
+
+upload_flights = SingleFlight()
@@ -1,168 +1,628 @@
-import vcfpy
-import json
-from pathlib import Path
+import re
+import gzip
+import zlib
+from contextlib import contextmanager
 import logging
-import tempfile
-import os
+
+from app.services.bgzf_index import find_index, is_gzip, read_indexed_regions
+from app.services.knowledge_base import KB
 
 logger = logging.getLogger(__name__)
 
 TARGET_GENES = ["CYP2D6", "CYP2C19", "CYP2C9", "SLCO1B1", "TPMT", "DPYD"]
 
-# Load rsID → gene mapping
-BASE = Path(__file__).resolve().parents[1]
-RULES_DIR = BASE 
+# rsID → gene and PGx gene regions (GRCh37 + GRCh38) from the compiled knowledge base
+_rsid_gene = KB["rsid_gene"]
+_gene_regions = KB["gene_regions"]
+
+PGX_REGIONS = [
+    tuple(region)
+    for gene in TARGET_GENES
+    for region in _gene_regions.get(gene, {}).values()
+]
+
+
+# ---------- INFO FIELD TYPING ----------
+# Same semantics vcfpy applied: header-declared INFO fields first, then the
+# reserved VCF keys, else String with unbounded Number (value becomes a list).
+RESERVED_INFO = {
+    "AA": ("String", 1),
+    "AC": ("Integer", "A"),
+    "AD": ("Integer", "R"),
+    "ADF": ("Integer", "R"),
+    "ADR": ("Integer", "R"),
+    "AF": ("Float", "A"),
+    "AN": ("Integer", 1),
+    "BQ": ("Float", 1),
+    "CIGAR": ("String", "A"),
+    "DB": ("Flag", 0),
+    "DP": ("Integer", 1),
+    "H2": ("Flag", 0),
+    "H3": ("Flag", 0),
+    "MQ": ("Integer", 1),
+    "MQ0": ("Integer", 1),
+    "NS": ("Integer", 1),
+    "SB": ("Integer", 4),
+    "SOMATIC": ("Flag", 0),
+    "VALIDATED": ("Flag", 0),
+    "1000G": ("Flag", 0),
+    "IMPRECISE": ("Flag", 0),
+    "NOVEL": ("Flag", 0),
+    "END": ("Integer", 1),
+    "SVTYPE": ("String", 1),
+    "SVLEN": ("Integer", 1),
+    "CIPOS": ("Integer", 2),
+    "CIEND": ("Integer", 2),
+    "HOMLEN": ("Integer", "."),
+    "HOMSEQ": ("String", "."),
+    "BKPTID": ("String", "."),
+    "MEINFO": ("String", 4),
+    "METRANS": ("String", 4),
+    "DGVID": ("String", 1),
+    "DBVARID": ("String", 1),
+    "DBRIPID": ("String", 1),
+    "MATEID": ("String", "."),
+    "PARID": ("String", 1),
+    "EVENT": ("String", 1),
+    "CILEN": ("Integer", 2),
+    "DPADJ": ("Integer", "."),
+    "CN": ("Integer", 1),
+    "CNADJ": ("Integer", "."),
+    "CICN": ("Integer", 2),
+    "CICNADJ": ("Integer", "."),
+}
+
+DEFAULT_INFO = ("String", ".")
+
+_UNESCAPE = [
+    ("%25", "%"),
+    ("%3A", ":"),
+    ("%3B", ";"),
+    ("%3D", "="),
+    ("%2C", ","),
+    ("%0D", "\r"),
+    ("%0A", "\n"),
+    ("%09", "\t"),
+]
+
+_CONVERTERS = {"Integer": int, "Float": float}
+
+_HEADER_KEY = re.compile(r'(ID|Number|Type)=("[^"]*"|[^,>]*)')
+
+
+def _register_info_header(line, info_fields):
+    """Record Type/Number of a ##INFO=<...> header line."""
+    keys = {}
+    for k, v in _HEADER_KEY.findall(line):
+        keys.setdefault(k, v)
+
+    if "ID" not in keys:
+        return
+
+    number = keys.get("Number", ".")
+    try:
+        number = int(number)
+    except ValueError:
+        if number not in ("A", "R", "G", "."):
+            number = "."
 
-try:
-    _rsid_gene = json.loads((RULES_DIR / "rsid_gene_map.json").read_text())
-except Exception as e:
-    logger.warning(f"rsid_gene_map load failed: {e}")
-    _rsid_gene = {}
+    info_fields[keys["ID"]] = (keys.get("Type", "String"), number)
 
 
-def _clean_vcf(file_path: str) -> str:
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".vcf")
-    clean_path = tmp.name
+def _convert_value(type_, value):
+    if value == ".":
+        return None
 
-    with open(file_path, "r", errors="ignore") as fin, open(clean_path, "w") as fout:
-        for line in fin:
-            if line.startswith("#"):
-                fout.write(line)
-                continue
+    if type_ in ("String", "Character"):
+        if "%" in value:
+            for k, v in _UNESCAPE:
+                value = value.replace(k, v)
+        return value
 
-            parts = line.strip().split()
+    try:
+        return _CONVERTERS[type_](value)
+    except (KeyError, ValueError):
+        return value
 
-            # Skip extremely broken rows
-            if len(parts) < 8:
-                continue
 
-            # ⭐ Fix broken POS column
-            chrom = parts[0]
+def _parse_info(info_str, info_fields):
+    info = {}
 
-            # Find rsID index
-            rs_index = None
-            for i, p in enumerate(parts):
-                if p.startswith("rs"):
-                    rs_index = i
-                    break
+    if info_str == ".":
+        return info
 
-            if rs_index is None:
-                continue
+    for entry in info_str.split(";"):
+        key, eq, value = entry.partition("=")
+        key = key.strip()
+        type_, number = info_fields.get(key) or RESERVED_INFO.get(key, DEFAULT_INFO)
 
-            # POS should be token before rsID (last numeric)
-            pos_tokens = parts[1:rs_index]
-            pos = None
-            for token in reversed(pos_tokens):
-                if token.isdigit():
-                    pos = token
-                    break
+        if not eq or type_ == "Flag":
+            info[key] = True
+        elif number == 1:
+            info[key] = _convert_value(type_, value)
+        elif value == ".":
+            info[key] = []
+        else:
+            info[key] = [_convert_value(type_, x) for x in value.split(",")]
 
-            if pos is None:
-                continue
+    return info
 
-            # Rebuild correct VCF row
-            new_parts = [chrom, pos] + parts[rs_index:]
 
-            # Ensure 10 columns
-            if len(new_parts) >= 10:
-                new_parts = new_parts[:10]
-            else:
-                continue
+# ⭐ ---------- ROW REPAIR (formerly the _clean_vcf pass) ----------
+def _repair_row(line):
+    """
+    Recover a tab-delimited VCF row from a possibly space-broken line.
+    Returns the columns from CHROM onwards or None if the row is unusable.
+    """
+    parts = line.split()
 
-            fout.write("\t".join(new_parts) + "\n")
+    # Skip extremely broken rows
+    if len(parts) < 8:
+        return None
 
-    return clean_path
+    # ⭐ Fix broken POS column
+    chrom = parts[0]
 
+    # Find rsID index
+    rs_index = None
+    for i, p in enumerate(parts):
+        if p.startswith("rs"):
+            rs_index = i
+            break
 
-# ⭐ ---------- MAIN PARSER ----------
-def parse_vcf(file_path: str):
-    # Clean VCF first (prevents vcfpy crash)
-    safe_path = _clean_vcf(file_path)
+    if rs_index is None:
+        return None
 
-    reader = vcfpy.Reader.from_path(safe_path)
-    variants = []
+    # POS should be token before rsID (last numeric)
+    pos = None
+    for token in reversed(parts[1:rs_index]):
+        if token.isdigit():
+            pos = token
+            break
+
+    if pos is None:
+        return None
+
+    # Rebuild correct VCF row (CHROM..FORMAT + at least one sample)
+    row = [chrom, pos] + parts[rs_index:]
+
+    if len(row) < 10:
+        return None
+
+    return row
+
+
+def _alt_values(alt_str):
+    if alt_str == ".":
+        return []
+
+    alts = []
+    for alt in alt_str.split(","):
+        # symbolic alleles (<DEL>, <CN0>...) are reported without brackets
+        if alt[:1] == "<" and alt[-1:] == ">":
+            alt = alt[1:-1]
+        alts.append(alt)
+
+    return alts
+
+
+def _sample_gt(format_str, sample_str):
+    keys = format_str.split(":")
+
+    if "GT" not in keys:
+        return "0/0"
+
+    values = sample_str.split(":")
+    idx = keys.index("GT")
+
+    if idx >= len(values):
+        return "0/0"
+
+    return values[idx]
+
+
+def _site_from_row(row, info_fields):
+    """Sample-independent part of a repaired row, or None if not a PGx row."""
+    rsid = row[2].split(";")[0] if row[2] != "." else None
+    info_str = row[7]
+
+    # ---------- CHEAP RELEVANCE CHECK (no INFO/GT decoding) ----------
+    if "GENE=" not in info_str and rsid not in _rsid_gene:
+        return None
+
+    info = _parse_info(info_str, info_fields)
+
+    # ---------- GENE DETECTION ----------
+    gene = info.get("GENE")
+    if isinstance(gene, list):
+        gene = gene[0] if gene else None
+
+    if not gene and rsid in _rsid_gene:
+        gene = _rsid_gene.get(rsid)
+
+    if gene not in TARGET_GENES:
+        return None
+
+    if not rsid:
+        rsid = "Unknown"
+
+    ref = row[3]
+    allele_map = {"0": ref}
+
+    for idx, alt_val in enumerate(_alt_values(row[4]), start=1):
+        allele_map[str(idx)] = alt_val
 
-    for record in reader:
-        info = record.INFO or {}
+    # ---------- STAR ----------
+    star = info.get("STAR")
+    if isinstance(star, list):
+        star = star[0] if star else None
 
-        # ---------- GENE DETECTION ----------
-        gene = info.get("GENE")
-        if isinstance(gene, list):
-            gene = gene[0]
+    return {
+        "gene": gene,
+        "rsid": rsid,
+        "allele_map": allele_map,
+        "star": star,
+        "info": info
+    }
 
-        rsid = record.ID
-        if isinstance(rsid, list):
-            rsid = rsid[0]
 
-        if not gene and rsid in _rsid_gene:
-            gene = _rsid_gene.get(rsid)
+def _variant_from_site(site, gt):
+    """Decode one sample's GT string against a PGx site → variant dict."""
+    allele_map = site["allele_map"]
 
-        if gene not in TARGET_GENES:
+    # ---------- SAFE GENOTYPE EXTRACTION ----------
+    sep = "|" if "|" in gt else "/"
+    tokens = gt.split(sep)
+
+    if len(tokens) < 2:
+        tokens = [tokens[0], "0"]
+
+    a, b = tokens[0], tokens[1]
+
+    allele_a = allele_map.get(a, "?") if a != "." else "?"
+    allele_b = allele_map.get(b, "?") if b != "." else "?"
+
+    # ---------- NORMALIZED GENOTYPE STRING ----------
+    genotype_str = f"{allele_a}/{allele_b}"
+
+    # ⭐ ---------- allele multiplicity metadata ----------
+    allele_indices = [a, b]  # e.g. ["0","1"] or ["1","1"]
+
+    # Count alt alleles
+    alt_count = sum(1 for idx in allele_indices if idx not in ("0", ".", None))
+
+    # Detect homozygous alt
+    is_homozygous = (
+        allele_indices[0] == allele_indices[1]
+        and allele_indices[0] not in ("0", ".", None)
+    )
+
+    # ---------- VARIANT OBJECT ----------
+    return {
+        "gene": site["gene"],
+        "rsid": site["rsid"],
+        "genotype": genotype_str,
+        "allele_indices": allele_indices,
+        "alt_count": alt_count,
+        "is_homozygous": is_homozygous,
+        "star": site["star"],
+        "info": site["info"]
+    }
+
+
+def _variant_from_row(row, info_fields):
+    """Build the variant dict for a repaired row, or None if not a PGx row."""
+    site = _site_from_row(row, info_fields)
+
+    if site is None:
+        return None
+
+    return _variant_from_site(site, _sample_gt(row[8], row[9]))
+
+
+def parse_vcf_lines(lines):
+    """
+    Single-pass VCF tokenizer: header typing, row repair, PGx filtering
+    and genotype decoding over any iterable of text lines.
+    """
+    info_fields = {}
+    variants = []
+
+    for line in lines:
+        if line.startswith("#"):
+            if line.startswith("##INFO="):
+                _register_info_header(line, info_fields)
             continue
 
-        if not rsid:
-            rsid = "Unknown"
+        row = _repair_row(line)
+        if row is None:
+            continue
 
-        # ---------- SAFE GENOTYPE EXTRACTION ----------
-        gt = "0/0"
-        if record.calls:
-            call = record.calls[0]
-            gt = call.data.get("GT", "0/0")
+        variant = _variant_from_row(row, info_fields)
+        if variant is not None:
+            variants.append(variant)
 
-        ref = record.REF
-        allele_map = {"0": ref}
+    return variants
 
-        alts = [a.value for a in record.ALT] if record.ALT else []
-        for idx, alt_val in enumerate(alts, start=1):
-            allele_map[str(idx)] = alt_val
 
-        sep = "|" if "|" in gt else "/"
-        tokens = gt.split(sep)
+class VcfFormatError(ValueError):
+    """Upload is not a usable VCF (raised as early as it can be detected)."""
+
+
+# ⭐ ---------- PUSH-STYLE INCREMENTAL PARSER ----------
+class IncrementalVcfParser:
+    """
+    Feed raw upload chunks as they arrive; close() returns the variant list.
+    Keeps partial-line state between chunks and inflates gzip/bgzip input on the fly.
+    """
+
+    MAX_LINE_BYTES = 1024 * 1024
+    MAX_LEADING_MALFORMED = 50
+
+    def __init__(self):
+        self.info_fields = {}
+        self.variants = []
+        self.records = 0
+        self._tail = b""
+        self._head = b""
+        self._inflater = None
+        self._started = False
+        self._chrom_header = False
+        self._malformed = 0
+
+    def feed(self, chunk: bytes):
+        if not self._started:
+            # need two bytes to sniff the gzip magic
+            self._head += chunk
+            if len(self._head) < 2:
+                return
+            chunk, self._head = self._head, b""
+            self._started = True
+            if chunk[:2] == b"\x1f\x8b":
+                self._inflater = zlib.decompressobj(31)
+
+        if self._inflater is not None:
+            chunk = self._inflate(chunk)
+
+        lines = (self._tail + chunk).split(b"\n")
+        self._tail = lines.pop()
+
+        if len(self._tail) > self.MAX_LINE_BYTES:
+            raise VcfFormatError("Line exceeds 1 MB; not a text VCF.")
+
+        for raw in lines:
+            self._line(raw.decode("utf-8", "ignore"))
+
+    def close(self):
+        if not self._started and self._head:
+            self._started = True
+            self._tail = self._head
+
+        if self._tail:
+            self._line(self._tail.decode("utf-8", "ignore"))
+            self._tail = b""
+
+        if not self._chrom_header:
+            raise VcfFormatError("Missing #CHROM header line.")
+
+        return self.variants
+
+    def _inflate(self, data):
+        out = []
+        try:
+            while data:
+                out.append(self._inflater.decompress(data))
+                if not self._inflater.eof:
+                    break
+                # bgzip = many concatenated gzip members
+                data = self._inflater.unused_data
+                self._inflater = zlib.decompressobj(31)
+        except zlib.error as e:
+            raise VcfFormatError(f"Corrupt gzip stream: {e}")
+        return b"".join(out)
+
+    def _line(self, line):
+        line = line.rstrip("\r")
+        if not line:
+            return
+
+        if line.startswith("#"):
+            if "\x00" in line:
+                raise VcfFormatError("Binary data in VCF header.")
+            if line.startswith("##INFO="):
+                _register_info_header(line, self.info_fields)
+            elif line.startswith("#CHROM"):
+                self._chrom_header = True
+            return
+
+        if not self._chrom_header:
+            raise VcfFormatError("Record found before #CHROM header line.")
+
+        self.records += 1
+
+        # reject early if the file opens with nothing but broken rows
+        if line.count("\t") < 7 and len(line.split()) < 8:
+            self._malformed += 1
+            if self._malformed == self.records == self.MAX_LEADING_MALFORMED:
+                raise VcfFormatError(
+                    f"First {self.MAX_LEADING_MALFORMED} records are malformed."
+                )
+            return
+
+        row = _repair_row(line)
+        if row is None:
+            return
+
+        variant = _variant_from_row(row, self.info_fields)
+        if variant is not None:
+            self.variants.append(variant)
+
+
+def parse_vcf_upload(file_path, chunk_bytes=1024 * 1024):
+    """
+    Uploaded VCF / VCF.gz spooled to disk, with the same validation as the
+    streaming path (raises VcfFormatError).
+    """
+    parser = IncrementalVcfParser()
+
+    with open(file_path, "rb") as fin:
+        for chunk in iter(lambda: fin.read(chunk_bytes), b""):
+            parser.feed(chunk)
+
+    return parser.close()
+
+
+@contextmanager
+def open_vcf_lines(file_path):
+    """
+    Text lines of a VCF on disk.
+    Plain or gzip VCF → full single pass.
+    bgzip VCF with a .tbi/.csi next to it → header + PGx gene regions only.
+    """
+    index_path = find_index(file_path)
+
+    if index_path and PGX_REGIONS:
+        lines = read_indexed_regions(file_path, index_path, PGX_REGIONS)
+        try:
+            yield lines
+        finally:
+            lines.close()
+
+    elif is_gzip(file_path):
+        with gzip.open(file_path, "rt", errors="ignore") as fin:
+            yield fin
+
+    else:
+        with open(file_path, "r", errors="ignore") as fin:
+            yield fin
 
-        if len(tokens) < 2:
-            tokens = [tokens[0], "0"]
 
-        a, b = tokens[0], tokens[1]
+# ⭐ ---------- MAIN PARSER ----------
+def parse_vcf(file_path: str):
+    with open_vcf_lines(file_path) as lines:
+        return parse_vcf_lines(lines)
+
+
+# ⭐ ---------- COHORT (MULTI-SAMPLE) MODE ----------
+# Allele index codes in the genotype matrix
+GT_MISSING = -1   # "."
+GT_UNKNOWN = -2   # non-numeric / out of int8 range
+
+
+def _allele_code(token):
+    if token == ".":
+        return GT_MISSING
+    if token.isdigit() and int(token) <= 127:
+        return int(token)
+    return GT_UNKNOWN
+
+
+def _allele_token(code):
+    if code == GT_MISSING:
+        return "."
+    if code == GT_UNKNOWN:
+        return "?"
+    return str(code)
+
+
+def _gt_codes(gt):
+    sep = "|" if "|" in gt else "/"
+    tokens = gt.split(sep)
+
+    if len(tokens) < 2:
+        tokens = [tokens[0], "0"]
+
+    return _allele_code(tokens[0]), _allele_code(tokens[1])
+
+
+def _cohort_gts(format_str, sample_cols, n_samples):
+    keys = format_str.split(":")
+
+    if "GT" not in keys:
+        gts = ["0/0"] * n_samples
+    elif keys[0] == "GT":
+        gts = [c.partition(":")[0] for c in sample_cols[:n_samples]]
+    else:
+        idx = keys.index("GT")
+        gts = []
+        for c in sample_cols[:n_samples]:
+            values = c.split(":")
+            gts.append(values[idx] if idx < len(values) else "0/0")
+
+    # short rows: missing sample columns read as hom-ref like the single-sample path
+    gts.extend(["0/0"] * (n_samples - len(gts)))
+    return gts
+
+
+def parse_vcf_cohort_lines(lines):
+    """
+    One pass over a multi-sample VCF → compact genotype matrix:
+    samples (names), sites (PGx site dicts) and alleles,
+    an int8 array of shape (n_samples, n_sites, 2) holding allele indices.
+    """
+    # ✅ numpy only for cohorts: single-sample analysis never pays its import
+    import numpy as np
+
+    info_fields = {}
+    samples = None
+    sites = []
+    columns = []
+    gt_cache = {}
+
+    for line in lines:
+        if line.startswith("#"):
+            if line.startswith("##INFO="):
+                _register_info_header(line, info_fields)
+            elif line.startswith("#CHROM"):
+                samples = line.split()[9:]
+            continue
 
-        allele_a = allele_map.get(a, "?") if a != "." else "?"
-        allele_b = allele_map.get(b, "?") if b != "." else "?"
+        row = _repair_row(line)
+        if row is None:
+            continue
 
-        # ---------- NORMALIZED GENOTYPE STRING ----------
-        genotype_str = f"{allele_a}/{allele_b}"
+        site = _site_from_row(row, info_fields)
+        if site is None:
+            continue
 
-        # ---------- STAR ----------
-        star = info.get("STAR")
-        if isinstance(star, list):
-            star = star[0]
+        if samples is None:
+            samples = [f"SAMPLE_{i + 1}" for i in range(len(row) - 9)]
 
-        # ⭐ ---------- NEW: allele multiplicity metadata ----------
-        allele_indices = [a, b]  # e.g. ["0","1"] or ["1","1"]
+        codes = []
+        for gt in _cohort_gts(row[8], row[9:], len(samples)):
+            code = gt_cache.get(gt)
+            if code is None:
+                code = gt_cache[gt] = _gt_codes(gt)
+            codes.append(code)
 
-        # Count alt alleles
-        alt_count = sum(1 for idx in allele_indices if idx not in ("0", ".", None))
+        columns.append(np.array(codes, dtype=np.int8).reshape(len(samples), 2))
+        sites.append(site)
 
-        # Detect homozygous alt
-        is_homozygous = (
-            allele_indices[0] == allele_indices[1]
-            and allele_indices[0] not in ("0", ".", None)
-        )
+    samples = samples or []
 
-        # ---------- VARIANT OBJECT ----------
-        variants.append({
-            "gene": gene,
-            "rsid": rsid,
-            "genotype": genotype_str,
-            "allele_indices": allele_indices,   # ⭐ NEW
-            "alt_count": alt_count,             # ⭐ NEW
-            "is_homozygous": is_homozygous,     # ⭐ NEW
-            "star": star,
-            "info": dict(info)
-        })
+    if columns:
+        alleles = np.stack(columns, axis=1)
+    else:
+        alleles = np.zeros((len(samples), 0, 2), dtype=np.int8)
 
-    # Cleanup temp file
-    try:
-        os.remove(safe_path)
-    except:
-        pass
+    return {
+        "samples": samples,
+        "sites": sites,
+        "alleles": alleles
+    }
+
+
+def parse_vcf_cohort(file_path: str):
+    with open_vcf_lines(file_path) as lines:
+        return parse_vcf_cohort_lines(lines)
+
+
+def sample_variants(cohort, sample_idx):
+    """Variant dicts for one cohort sample (same shape as parse_vcf output)."""
+    variants = []
+
+    for site, (a, b) in zip(cohort["sites"], cohort["alleles"][sample_idx].tolist()):
+        gt = f"{_allele_token(a)}/{_allele_token(b)}"
+        variants.append(_variant_from_site(site, gt))
 
     return variants
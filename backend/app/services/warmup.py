@@ -0,0 +1,71 @@
+import logging
+import os
+import time
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.services.analyzer import assess_drug, build_profile_from_variants
+from app.services.knowledge_base import KB
+from app.services.llm_explainer import get_async_client, get_client
+from app.services.metrics import capture
+
+logger = logging.getLogger(__name__)
+
+# ⭐ WARM-UP (runs in the background right after startup; GET /readyz reports it)
+# Importing the app stays light (groq / reportlab / numpy load lazily); this
+# pays those costs before readiness instead of inside the first requests.
+
+WARMUP = os.getenv("PHARMAGUARD_WARMUP", "1").lower() in ("1", "true", "yes")
+WARMUP_LLM = os.getenv("PHARMAGUARD_WARMUP_LLM", "1").lower() in ("1", "true", "yes")
+WARMUP_TIMEOUT = float(os.getenv("PHARMAGUARD_WARMUP_TIMEOUT", 5))  # seconds, LLM connection only
+
+warmup_state = {"ready": not WARMUP, "steps": {}}
+
+
+def _warm_rules():
+    # every drug through the rule engine once; observations discarded, not real traffic
+    with capture():
+        profile = build_profile_from_variants([])
+        for drug in KB["drugs"]:
+            assess_drug(profile, drug)
+
+
+def _warm_pdf():
+    import app.services.pdf_report  # noqa: F401
+
+
+async def _warm_llm():
+    await run_in_threadpool(get_client)
+    client = await run_in_threadpool(get_async_client)
+
+    if WARMUP_LLM:
+        from groq import APIStatusError
+
+        # ✅ DNS + TLS handshake now; the pooled connection serves the first explanation
+        try:
+            await client.with_options(timeout=WARMUP_TIMEOUT, max_retries=0).models.list()
+        except APIStatusError:
+            pass  # any HTTP answer (401, 404 …) means the connection is up
+
+
+async def _step(name, fn):
+    started = time.perf_counter()
+    try:
+        await fn()
+        warmup_state["steps"][name] = {"ms": round((time.perf_counter() - started) * 1000, 1)}
+    except Exception as e:
+        # a failed step (e.g. LLM unreachable) still lets the service go ready: it degrades, not fails
+        logger.warning("Warm-up step %s failed: %s", name, e)
+        warmup_state["steps"][name] = {"error": str(e) or type(e).__name__}
+
+
+async def warm_up():
+    if warmup_state["ready"]:
+        return
+
+    await _step("rules", lambda: run_in_threadpool(_warm_rules))
+    await _step("pdf", lambda: run_in_threadpool(_warm_pdf))
+    await _step("llm", _warm_llm)
+
+    warmup_state["ready"] = True
+    logger.info("Warm-up done: %s", warmup_state["steps"])
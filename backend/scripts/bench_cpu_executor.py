@@ -0,0 +1,68 @@
+"""
+Profile-building throughput (spooled uploads → PGx profile) under concurrent
+load: threadpool vs. process pool at 1..N workers. Same synthetic VCF every run.
+
+Run from backend/:  python scripts/bench_cpu_executor.py [rows] [concurrent_uploads]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from bench_vcf_parser import write_synthetic_vcf
+
+from app.services.analyzer import build_profile_from_upload
+from app.services.cpu_executor import CpuExecutor
+
+
+async def run_load(executor, path, uploads):
+    t0 = time.perf_counter()
+    profiles = await asyncio.gather(
+        *(executor.run(build_profile_from_upload, path) for _ in range(uploads))
+    )
+    elapsed = time.perf_counter() - t0
+    assert all(p == profiles[0] for p in profiles)
+    return elapsed, profiles[0]
+
+
+def main(rows, uploads):
+    cores = os.cpu_count() or 1
+    path = os.path.join(tempfile.mkdtemp(), "bench.vcf")
+    write_synthetic_vcf(path, rows)
+
+    configs = [("thread", cores)]
+    workers = 1
+    while workers <= cores:
+        configs.append(("process", workers))
+        workers *= 2
+    if configs[-1][1] != cores:
+        configs.append(("process", cores))
+
+    print(f"{rows:,} rows x {uploads} concurrent uploads, {cores} cores")
+    print(f"{'executor':>10} {'workers':>8} {'uploads/s':>10} {'speedup':>8}")
+
+    baseline = reference = None
+    for kind, n in configs:
+        executor = CpuExecutor(kind, n)
+        executor.start()
+        try:
+            elapsed, profile = asyncio.run(run_load(executor, path, uploads))
+        finally:
+            executor.shutdown()
+
+        reference = reference or profile
+        assert profile == reference, f"{kind}/{n}: profile mismatch"
+
+        baseline = baseline or elapsed
+        print(f"{kind:>10} {n:>8} {uploads / elapsed:>10.2f} {baseline / elapsed:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 200_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 16,
+    )
@@ -0,0 +1,51 @@
+"""
+End-to-end latency of a six-drug /analyze request: one-drug-at-a-time
+explanations vs. the concurrent fan-out. Needs the LLM stub server running:
+
+    python scripts/llm_stub_server.py --latency-ms 800 &
+    GROQ_BASE_URL=http://127.0.0.1:8765 GROQ_API_KEY=stub python scripts/bench_llm_fanout.py
+
+The explanation cache is pointed at an empty temp location so every call hits the stub.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+os.environ["PHARMAGUARD_LLM_CACHE_PATH"] = os.path.join(tempfile.mkdtemp(), "bench.sqlite3")
+
+from app.routes.analyze import SUPPORTED_DRUGS, evaluate_drugs
+from app.services.analyzer import build_patient_profile, evaluate_drug
+from app.services.explanation_cache import explanation_cache
+from app.services.llm_explainer import LLM_FANOUT
+
+VCF = Path(__file__).resolve().parents[1] / "sample_data" / "test_pharmaguard.vcf"
+
+
+def main():
+    drugs = sorted(SUPPORTED_DRUGS)
+    profile = build_patient_profile(str(VCF))
+
+    explanation_cache.clear()
+    t0 = time.perf_counter()
+    serial = [evaluate_drug(profile, d, "BENCH") for d in drugs]
+    serial_s = time.perf_counter() - t0
+
+    explanation_cache.clear()
+    t0 = time.perf_counter()
+    concurrent = asyncio.run(evaluate_drugs(profile, drugs, "BENCH"))
+    concurrent_s = time.perf_counter() - t0
+
+    assert [r["drug"] for r in serial] == [r["drug"] for r in concurrent]
+
+    print(f"drugs={len(drugs)} fanout_limit={LLM_FANOUT}")
+    print(f"serial      {serial_s * 1000:8.0f} ms")
+    print(f"concurrent  {concurrent_s * 1000:8.0f} ms  ({serial_s / concurrent_s:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
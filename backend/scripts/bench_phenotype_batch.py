@@ -0,0 +1,68 @@
+"""
+Samples/s for activity-score + phenotype calling: scalar diplotype.py path
+vs. the NumPy batch engine (app.services.diplotype_batch). Asserts identical results.
+
+Run from backend/:  python scripts/bench_phenotype_batch.py [samples]
+"""
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import numpy as np
+
+from app.services.diplotype import (
+    TARGET_GENES,
+    _diplotype_map,
+    _canonical_pair,
+    calculate_activity_score_with_trace,
+    phenotype_from_activity_score,
+)
+from app.services.diplotype_batch import batch_call_phenotypes, codec_for, decode_phenotypes
+
+
+def scalar_call(gene, a, b):
+    left, right = _canonical_pair(a, b)
+    activity_score, _ = calculate_activity_score_with_trace(gene, [left, right])
+    phenotype = _diplotype_map.get(gene, {}).get(f"{left}/{right}")
+    if not phenotype:
+        phenotype, _ = phenotype_from_activity_score(gene, activity_score)
+    return activity_score, phenotype
+
+
+def main(n):
+    rng = random.Random(11)
+    total_scalar = total_batch = 0.0
+
+    print(f"{'gene':>8} {'scalar samples/s':>18} {'batch samples/s':>18} {'speedup':>8}")
+
+    for gene in TARGET_GENES:
+        vocab = codec_for(gene).names + ["*99"]  # unseen allele → 'normal' fallback
+        pairs = [(rng.choice(vocab), rng.choice(vocab)) for _ in range(n)]
+
+        t0 = time.perf_counter()
+        expected = [scalar_call(gene, a, b) for a, b in pairs]
+        scalar_s = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        codec = codec_for(gene)
+        left = codec.encode([a for a, _ in pairs])
+        right = codec.encode([b for _, b in pairs])
+        scores, phenotypes, _ = batch_call_phenotypes(gene, left, right)
+        batch_s = time.perf_counter() - t0
+
+        assert np.array_equal(scores, [e[0] for e in expected]), f"{gene}: activity score mismatch"
+        assert list(decode_phenotypes(phenotypes)) == [e[1] for e in expected], f"{gene}: phenotype mismatch"
+
+        total_scalar += scalar_s
+        total_batch += batch_s
+        print(f"{gene:>8} {n / scalar_s:>18,.0f} {n / batch_s:>18,.0f} {scalar_s / batch_s:>7.1f}x")
+
+    print(f"{'all':>8} {n * len(TARGET_GENES) / total_scalar:>18,.0f} "
+          f"{n * len(TARGET_GENES) / total_batch:>18,.0f} {total_scalar / total_batch:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,71 @@
+"""
+Drug-only re-query cost against the patient profile store: fills a temporary
+store with N patients (default 200000), then times profile lookups (LRU hit and
+SQLite read) and the rule evaluation for one more drug.
+
+    python scripts/bench_profile_store.py [patients] [memory_entries]
+"""
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.services.analyzer import assess_drug, build_patient_profile
+from app.services.profile_store import ProfileStore, encode_profile
+
+VCF = Path(__file__).resolve().parents[1] / "sample_data" / "test_pharmaguard.vcf"
+
+
+def per_call_us(fn, args_list):
+    t0 = time.perf_counter()
+    for args in args_list:
+        fn(*args)
+    return (time.perf_counter() - t0) / len(args_list) * 1e6
+
+
+def main():
+    patients = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    memory_entries = int(sys.argv[2]) if len(sys.argv) > 2 else 2_000
+
+    profile = build_patient_profile(str(VCF))
+    path = os.path.join(tempfile.mkdtemp(), "profiles.sqlite3")
+    store = ProfileStore(path, ttl=0, memory_entries=memory_entries)
+
+    t0 = time.perf_counter()
+    ids = [f"P{i:09d}" for i in range(patients)]
+    with store._lock:
+        store._db.execute("BEGIN")
+        blob = encode_profile(profile)
+        store._db.executemany(
+            "INSERT OR REPLACE INTO profiles (patient_id, profile, created_at) VALUES (?, ?, ?)",
+            ((pid, blob, time.time()) for pid in ids),
+        )
+        store._db.execute("COMMIT")
+    fill_s = time.perf_counter() - t0
+
+    sample = [(pid,) for pid in random.sample(ids, min(20_000, patients))]
+
+    cold_us = per_call_us(store.get, sample)          # not in the LRU yet → SQLite + decode
+    hot = sample[:min(len(sample), memory_entries)]
+    per_call_us(store.get, hot)
+    warm_us = per_call_us(store.get, hot)              # LRU hits
+
+    stored = store.get(ids[0])
+    assess_us = per_call_us(assess_drug, [(stored, "WARFARIN")] * 20_000)
+
+    print(f"patients={patients} memory_entries={memory_entries}")
+    print(f"fill            {fill_s:8.1f} s")
+    print(f"db size         {os.path.getsize(path) / patients:8.0f} B/patient  ({len(blob)} B compressed profile)")
+    print(f"lookup (disk)   {cold_us:8.1f} us")
+    print(f"lookup (LRU)    {warm_us:8.1f} us")
+    print(f"assess_drug     {assess_us:8.1f} us")
+    print(f"max RSS         {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:8.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
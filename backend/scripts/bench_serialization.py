@@ -0,0 +1,105 @@
+"""
+Per-result cost of validating and serializing an analysis result, before and
+after the single-pass path:
+
+  before: FinalOutput.parse_obj → jsonable_encoder (analyzer) → jsonable_encoder
+          (FastAPI, no response_model) → json.dumps in JSONResponse
+  after:  FinalOutput.model_validate → FastJSONResponse (pydantic-core to_json)
+
+Results come from real rule evaluation over synthetic VCFs, from the small
+sample file up to PGx-heavy files with thousands of detected variants (each
+with its INFO dict). Both paths must produce the same JSON.
+
+Run from backend/:
+    python scripts/bench_serialization.py
+"""
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.schemas import FinalOutput
+from app.services.analyzer import assess_drug, build_patient_profile, finalize_drug_result, template_explanation
+from app.services.fast_json import FastJSONResponse
+
+from synthetic_vcf import generate_vcf
+
+SAMPLE_VCF = Path(__file__).resolve().parents[1] / "sample_data" / "test_pharmaguard.vcf"
+
+DRUGS = ("CODEINE", "WARFARIN", "CLOPIDOGREL", "SIMVASTATIN", "AZATHIOPRINE", "FLUOROURACIL")
+
+# name → generate_vcf keyword arguments (None: the bundled sample file)
+CASES = {
+    "sample_data": None,
+    "rows=10k,pgx=2%": dict(rows=10_000, pgx_ratio=0.02),
+    "rows=10k,pgx=50%": dict(rows=10_000, pgx_ratio=0.5),
+    "rows=100k,pgx=20%": dict(rows=100_000, pgx_ratio=0.2),
+}
+
+
+def before(results):
+    for r in results:
+        FinalOutput.parse_obj(r)
+    encoded = [jsonable_encoder(r) for r in results]
+    return JSONResponse(jsonable_encoder(encoded)).body
+
+
+def after(results):
+    for r in results:
+        FinalOutput.model_validate(r)
+    return FastJSONResponse(results).body
+
+
+def per_result_us(fn, results, min_time=0.5, min_runs=5):
+    times = []
+    started = time.perf_counter()
+
+    while len(times) < min_runs or time.perf_counter() - started < min_time:
+        t0 = time.perf_counter()
+        fn(results)
+        times.append(time.perf_counter() - t0)
+
+    return statistics.median(times) / len(results) * 1e6
+
+
+def results_for(path):
+    profile = build_patient_profile(str(path))
+    results = []
+    for drug in DRUGS:
+        draft = assess_drug(profile, drug)
+        results.append(finalize_drug_result(draft, template_explanation(draft), "BENCH", "template", False))
+    return results
+
+
+def main():
+    warnings.simplefilter("ignore")  # parse_obj deprecation, missing optional rule files
+
+    print(f"{'case':<20} {'variants/result':>15} {'KB/result':>10} {'before us':>11} {'after us':>10} {'speedup':>8}")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, kwargs in CASES.items():
+            path = SAMPLE_VCF if kwargs is None else generate_vcf(os.path.join(workdir, "bench.vcf"), **kwargs)
+            results = results_for(path)
+
+            old, new = before(results), after(results)
+            assert json.loads(old) == json.loads(new), f"{name}: serialized output differs"
+
+            variants = sum(len(r["pharmacogenomic_profile"]["detected_variants"]) for r in results) / len(results)
+            before_us = per_result_us(before, results)
+            after_us = per_result_us(after, results)
+
+            print(f"{name:<20} {variants:>15,.0f} {len(new) / len(results) / 1024:>10,.1f} "
+                  f"{before_us:>11,.1f} {after_us:>10,.1f} {before_us / after_us:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""
+Micro-benchmark suite: parse_vcf, build_pharmacogenomic_profile, assess_drug_risk,
+get_clinical_recommendation and the full run_analysis_from_path, over synthetic
+VCFs (scripts/synthetic_vcf.py) of several sizes and shapes. The LLM is stubbed.
+
+Every case records its median time and a fingerprint of its output. Against the
+baseline, a changed fingerprint (parser / rule-engine output changed) or a median
+slower than baseline × tolerance fails the run (exit 1).
+
+Run from backend/:
+    python scripts/bench_suite.py                      # compare to scripts/bench_baseline.json
+    python scripts/bench_suite.py --out results.json   # also keep this run
+    python scripts/bench_suite.py --update-baseline    # accept current numbers / outputs
+    python scripts/bench_suite.py --filter parse_vcf --tolerance 2.0
+
+Timings are machine-specific: regenerate the baseline on the machine that runs the
+comparison. Fingerprints are machine-independent.
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+os.environ.setdefault("GROQ_API_KEY", "bench")
+
+import app.services.analyzer as analyzer
+from app.services.diplotype import build_pharmacogenomic_profile
+from app.services.knowledge_base import KB, STANDARD_PHENOTYPES
+from app.services.recommendation import get_clinical_recommendation
+from app.services.risk_engine import assess_drug_risk
+from app.services.vcf_parser import parse_vcf, parse_vcf_cohort
+
+from synthetic_vcf import generate_vcf
+
+BASELINE = Path(__file__).resolve().parent / "bench_baseline.json"
+
+# name → generate_vcf keyword arguments
+VCF_SHAPES = {
+    "rows=1k": dict(rows=1_000),
+    "rows=10k": dict(rows=10_000),
+    "rows=100k": dict(rows=100_000),
+    "rows=10k,pgx=50%": dict(rows=10_000, pgx_ratio=0.5),
+    "rows=10k,malformed=5%": dict(rows=10_000, malformed_ratio=0.05),
+    "rows=10k,multiallelic=10%": dict(rows=10_000, multiallelic_ratio=0.1),
+    "rows=10k,gzip": dict(rows=10_000, compress=True),
+    "rows=10k,samples=8": dict(rows=10_000, samples=8),
+    "rows=10k,samples=64": dict(rows=10_000, samples=64),
+}
+
+
+# ---------- LLM STUB ----------
+def stub_explanation(patient_id, drug, gene, phenotype, variants, recommendation_text):
+    return {
+        "summary": f"{drug} / {gene} {phenotype}: {recommendation_text}",
+        "mechanism": "stub",
+        "evidence": "CPIC",
+        "citations": ["stub"],
+        "generated_at": "1970-01-01T00:00:00Z",
+    }
+
+
+analyzer.generate_explanation = stub_explanation
+
+
+# ---------- MEASUREMENT ----------
+def measure(fn, *args, min_time=0.25, min_runs=3, max_runs=10_000):
+    """Per-call durations (s) of repeated fn(*args), plus the last output."""
+    times = []
+    out = None
+    started = time.perf_counter()
+
+    while len(times) < min_runs or (time.perf_counter() - started < min_time and len(times) < max_runs):
+        t0 = time.perf_counter()
+        out = fn(*args)
+        times.append(time.perf_counter() - t0)
+
+    return times, out
+
+
+def _stable(value):
+    # per-run noise out of fingerprints: timestamps, stage timings
+    if isinstance(value, dict):
+        return {k: _stable(v) for k, v in value.items()
+                if k not in ("timestamp", "generated_at", "stage_timings_ms")}
+    if isinstance(value, (list, tuple)):
+        return [_stable(v) for v in value]
+    return value
+
+
+def fingerprint(out):
+    canonical = json.dumps(_stable(out), sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()[:16]
+
+
+def case_result(times, out, unit_calls=1):
+    return {
+        "median_us": round(statistics.median(times) / unit_calls * 1e6, 3),
+        "min_us": round(min(times) / unit_calls * 1e6, 3),
+        "runs": len(times),
+        "fingerprint": fingerprint(out),
+    }
+
+
+# ---------- CASES ----------
+def run_cases(workdir, selected):
+    cases = {}
+
+    def want(name):
+        return not selected or any(s in name for s in selected)
+
+    def record(name, fn, *args, unit_calls=1):
+        if not want(name):
+            return None
+        times, out = measure(fn, *args)
+        cases[name] = case_result(times, out, unit_calls)
+        print(f"  {name:<70} {cases[name]['median_us']:>14,.1f} us", flush=True)
+        return out
+
+    paths = {}
+    for shape, kwargs in VCF_SHAPES.items():
+        suffix = ".vcf.gz" if kwargs.get("compress") else ".vcf"
+        paths[shape] = generate_vcf(os.path.join(workdir, shape.replace(",", "_") + suffix), **kwargs)
+
+    # ---------- parse_vcf ----------
+    for shape, path in paths.items():
+        record(f"parse_vcf[{shape}]", parse_vcf, path)
+
+    for shape in ("rows=10k,samples=8", "rows=10k,samples=64"):
+        record(f"parse_vcf_cohort[{shape}]", parse_vcf_cohort, paths[shape])
+
+    # ---------- build_pharmacogenomic_profile ----------
+    profiles = {}
+    for shape in ("rows=10k", "rows=10k,pgx=50%", "rows=10k,multiallelic=10%"):
+        variants = parse_vcf(paths[shape])
+        profiles[shape] = build_pharmacogenomic_profile(variants)
+        record(f"build_pharmacogenomic_profile[{shape},variants={len(variants)}]",
+               build_pharmacogenomic_profile, variants)
+
+    # ---------- assess_drug_risk ----------
+    profile = profiles["rows=10k,pgx=50%"]
+    for drug in KB["drugs"]:
+        record(f"assess_drug_risk[{drug}]", assess_drug_risk, drug, profile)
+
+    # ---------- get_clinical_recommendation (every rule-table combination) ----------
+    combos = [
+        (drug, gene, phenotype)
+        for drug in KB["drugs"]
+        for gene in KB["risk_genes"].get(drug, ())
+        for phenotype in STANDARD_PHENOTYPES
+    ]
+    record(
+        f"get_clinical_recommendation[combos={len(combos)}]",
+        lambda: [get_clinical_recommendation(*c) for c in combos],
+        unit_calls=len(combos),
+    )
+
+    # ---------- run_analysis_from_path (parse → profile → risk → rec → stub LLM → schema) ----------
+    for shape in ("rows=1k", "rows=10k,pgx=50%"):
+        for drug in ("CODEINE", "WARFARIN", "CLOPIDOGREL"):
+            record(f"run_analysis_from_path[{shape},{drug}]",
+                   analyzer.run_analysis_from_path, paths[shape], drug, "BENCH")
+
+    return cases
+
+
+# ---------- BASELINE COMPARISON ----------
+def compare(cases, baseline, tolerance):
+    failures = []
+
+    for name, case in cases.items():
+        base = baseline.get(name)
+
+        if base is None:
+            print(f"  NEW      {name}")
+            continue
+
+        if case["fingerprint"] != base["fingerprint"]:
+            failures.append(name)
+            print(f"  CHANGED  {name}: output fingerprint {base['fingerprint']} → {case['fingerprint']}")
+            continue
+
+        ratio = case["median_us"] / base["median_us"] if base["median_us"] else 1.0
+
+        if ratio > tolerance:
+            failures.append(name)
+            print(f"  SLOWER   {name}: {base['median_us']:,.1f} → {case['median_us']:,.1f} us ({ratio:.2f}x)")
+        elif ratio < 1 / tolerance:
+            print(f"  FASTER   {name}: {base['median_us']:,.1f} → {case['median_us']:,.1f} us ({ratio:.2f}x)")
+
+    for name in baseline:
+        if name not in cases:
+            print(f"  SKIPPED  {name}")
+
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PharmaGuard micro-benchmark suite")
+    parser.add_argument("--baseline", default=str(BASELINE))
+    parser.add_argument("--out", help="write this run's results as JSON")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=1.5,
+                        help="fail when median > baseline × tolerance (default 1.5)")
+    parser.add_argument("--filter", action="append", default=[],
+                        help="only cases whose name contains this (repeatable)")
+    args = parser.parse_args()
+
+    warnings.simplefilter("ignore")
+
+    print("benchmarks (median per call):")
+    with tempfile.TemporaryDirectory() as workdir:
+        cases = run_cases(workdir, args.filter)
+
+    results = {
+        "meta": {
+            "created_at": datetime.utcnow().replace(microsecond=0).isoformat() + "Z",
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "kb_digest": KB["source_digest"],
+        },
+        "cases": cases,
+    }
+
+    if args.out:
+        Path(args.out).write_text(json.dumps(results, indent=2))
+
+    if args.update_baseline:
+        if args.filter and Path(args.baseline).exists():
+            # partial run: only the selected cases are replaced
+            merged = json.loads(Path(args.baseline).read_text())
+            merged["cases"].update(cases)
+            merged["meta"] = results["meta"]
+            results = merged
+        Path(args.baseline).write_text(json.dumps(results, indent=2) + "\n")
+        print(f"baseline written: {args.baseline}")
+        return 0
+
+    if not Path(args.baseline).exists():
+        print(f"no baseline at {args.baseline}; run with --update-baseline first")
+        return 0
+
+    baseline = json.loads(Path(args.baseline).read_text())
+
+    print(f"vs baseline ({baseline['meta']['created_at']}, tolerance {args.tolerance}x):")
+    failures = compare(cases, baseline["cases"], args.tolerance)
+
+    if failures:
+        print(f"FAILED: {len(failures)} case(s) regressed")
+        return 1
+
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
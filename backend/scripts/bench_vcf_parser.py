@@ -0,0 +1,148 @@
+"""
+Throughput comparison: single-pass tokenizer (app.services.vcf_parser)
+vs. the previous _clean_vcf rewrite + vcfpy.Reader double pass.
+
+Run from backend/:  python scripts/bench_vcf_parser.py [rows ...]
+
+The legacy side needs vcfpy, which the app no longer depends on
+(pip install vcfpy); without it only the single-pass parser is timed.
+"""
+import importlib.util
+import os
+import sys
+import random
+import tempfile
+import time
+import warnings
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.services.vcf_parser import parse_vcf, _repair_row, _rsid_gene, TARGET_GENES
+
+PGX_ROWS = [
+    ("22", 42126499, "rs3892097", "C", "T", "CYP2D6"),
+    ("10", 96540457, "rs1057910", "A", "C", "CYP2C9"),
+    ("10", 94761900, "rs4244285", "G", "A", "CYP2C19"),
+    ("12", 21331549, "rs4149056", "T", "C", "SLCO1B1"),
+    ("6", 18139294, "rs1142345", "A", "G", "TPMT"),
+    ("1", 97915614, "rs3918290", "G", "A", "DPYD"),
+]
+
+HEADER = (
+    "##fileformat=VCFv4.2\n"
+    '##INFO=<ID=GENE,Number=1,Type=String,Description="Gene Symbol">\n'
+    '##INFO=<ID=DP,Number=1,Type=Integer,Description="Depth">\n'
+    '##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">\n'
+    "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tSAMPLE\n"
+)
+
+
+def write_synthetic_vcf(path, rows, pgx_every=50, seed=7):
+    rng = random.Random(seed)
+    with open(path, "w") as f:
+        f.write(HEADER)
+        for i in range(rows):
+            gt = rng.choice(("0/0", "0/1", "1/1", "0|1"))
+            if i % pgx_every == 0:
+                chrom, pos, rsid, ref, alt, gene = PGX_ROWS[(i // pgx_every) % len(PGX_ROWS)]
+                f.write(f"{chrom}\t{pos}\t{rsid}\t{ref}\t{alt}\t.\tPASS\tGENE={gene};DP=30\tGT\t{gt}\n")
+            else:
+                f.write(f"2\t{1000 + i}\trs{900000000 + i}\tA\tG\t50\tPASS\tDP={rng.randint(5, 60)}\tGT\t{gt}\n")
+
+
+# ---------- previous implementation, kept here as the reference ----------
+def legacy_parse_vcf(file_path):
+    import vcfpy
+
+    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".vcf", mode="w")
+    with open(file_path, "r", errors="ignore") as fin, tmp as fout:
+        for line in fin:
+            if line.startswith("#"):
+                fout.write(line)
+                continue
+            row = _repair_row(line)
+            if row is not None:
+                fout.write("\t".join(row[:10]) + "\n")
+
+    variants = []
+    for record in vcfpy.Reader.from_path(tmp.name):
+        info = record.INFO or {}
+        gene = info.get("GENE")
+        if isinstance(gene, list):
+            gene = gene[0]
+        rsid = record.ID[0]
+        if not gene and rsid in _rsid_gene:
+            gene = _rsid_gene.get(rsid)
+        if gene not in TARGET_GENES:
+            continue
+
+        gt = record.calls[0].data.get("GT", "0/0") if record.calls else "0/0"
+        allele_map = {"0": record.REF}
+        for idx, alt in enumerate(record.ALT or [], start=1):
+            allele_map[str(idx)] = alt.value
+        sep = "|" if "|" in gt else "/"
+        tokens = gt.split(sep)
+        if len(tokens) < 2:
+            tokens = [tokens[0], "0"]
+        a, b = tokens[0], tokens[1]
+        star = info.get("STAR")
+        if isinstance(star, list):
+            star = star[0]
+        variants.append({
+            "gene": gene,
+            "rsid": rsid,
+            "genotype": f"{allele_map.get(a, '?') if a != '.' else '?'}/{allele_map.get(b, '?') if b != '.' else '?'}",
+            "allele_indices": [a, b],
+            "alt_count": sum(1 for x in (a, b) if x not in ("0", ".", None)),
+            "is_homozygous": a == b and a not in ("0", ".", None),
+            "star": star,
+            "info": dict(info),
+        })
+
+    os.remove(tmp.name)
+    return variants
+
+
+def _time(fn, path, repeat=3):
+    best = float("inf")
+    out = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn(path)
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def main(sizes):
+    warnings.simplefilter("ignore")
+
+    legacy = importlib.util.find_spec("vcfpy") is not None
+    if not legacy:
+        print("vcfpy not installed: skipping the legacy comparison (pip install vcfpy)")
+
+    samples = [str(p) for p in sorted((Path(__file__).resolve().parents[1] / "sample_data").glob("*.vcf"))]
+    for path in samples if legacy else ():
+        assert parse_vcf(path) == legacy_parse_vcf(path), f"output mismatch on {path}"
+
+    print(f"{'rows':>10} {'legacy rows/s':>15} {'stream rows/s':>15} {'speedup':>8}")
+
+    for rows in sizes:
+        fd, path = tempfile.mkstemp(suffix=".vcf")
+        os.close(fd)
+        try:
+            write_synthetic_vcf(path, rows)
+            stream_s, stream_out = _time(parse_vcf, path)
+            if not legacy:
+                print(f"{rows:>10} {'-':>15} {rows / stream_s:>15,.0f} {'-':>8}")
+                continue
+
+            legacy_s, legacy_out = _time(legacy_parse_vcf, path)
+            assert stream_out == legacy_out, "output mismatch on synthetic VCF"
+            print(f"{rows:>10} {rows / legacy_s:>15,.0f} {rows / stream_s:>15,.0f} {legacy_s / stream_s:>7.1f}x")
+        finally:
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [1_000, 10_000, 100_000])
@@ -0,0 +1,102 @@
+"""
+Import-time budget for the API: imports app.main in fresh interpreters and
+fails (exit 1) when the median import time exceeds the budget or when a module
+that must load lazily (groq, reportlab, numpy …) is pulled in at import time.
+On failure the slowest imports (python -X importtime) are listed.
+
+Run from backend/:
+    python scripts/check_import_time.py                  # budget 800 ms, 5 runs
+    python scripts/check_import_time.py --budget-ms 600 --runs 9
+
+The module check is machine-independent; the time budget is not — set
+--budget-ms (or PHARMAGUARD_IMPORT_BUDGET_MS) for the machine that runs it.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parents[1]
+
+# loaded on first use / by app.services.warmup, never by importing the app
+LAZY_MODULES = ("groq", "reportlab", "numpy", "pandas", "vcfpy")
+
+PROBE = f"""
+import json, sys, time
+started = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - started
+print(json.dumps({{"ms": elapsed * 1000, "loaded": [m for m in {LAZY_MODULES!r} if m in sys.modules]}}))
+"""
+
+
+def _env():
+    env = dict(os.environ)
+    # the app must import without credentials
+    env.pop("GROQ_API_KEY", None)
+    return env
+
+
+def probe():
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=BACKEND, env=_env(), capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(n=15):
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=BACKEND, env=_env(), capture_output=True, text=True,
+    )
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line.split(":", 1)[1].split("|"))
+        rows.append((int(cumulative_us), int(self_us), name))
+    return sorted(rows, reverse=True)[:n]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="app.main import-time budget")
+    parser.add_argument("--budget-ms", type=float,
+                        default=float(os.getenv("PHARMAGUARD_IMPORT_BUDGET_MS", 800)))
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    try:
+        results = [probe() for _ in range(args.runs)]
+    except subprocess.CalledProcessError as e:
+        print("FAILED: import app.main raised (it must import without GROQ_API_KEY):")
+        print(e.stderr.strip().splitlines()[-1])
+        return 1
+    median_ms = statistics.median(r["ms"] for r in results)
+    loaded = sorted({m for r in results for m in r["loaded"]})
+
+    print(f"import app.main: median {median_ms:.0f} ms over {args.runs} runs (budget {args.budget_ms:.0f} ms)")
+
+    failed = False
+    if loaded:
+        print(f"FAILED: loaded at import time, must be lazy: {', '.join(loaded)}")
+        failed = True
+    if median_ms > args.budget_ms:
+        print("FAILED: over budget")
+        failed = True
+
+    if failed:
+        print("slowest imports (cumulative / self, ms):")
+        for cumulative_us, self_us, name in slowest_imports():
+            print(f"  {cumulative_us / 1000:8.1f} {self_us / 1000:8.1f}  {name}")
+        return 1
+
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,22 @@
+"""
+Compile app/rules/*.json into the serialized knowledge-base snapshot.
+The app recompiles on startup when the snapshot is missing or stale; run this
+at build/deploy time so containers start from a ready artifact.
+
+Run from backend/:  python scripts/compile_knowledge_base.py [output_path]
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.services.knowledge_base import KB_PATH, compile_knowledge_base, write_knowledge_base
+
+if __name__ == "__main__":
+    snapshot = compile_knowledge_base()
+    path = write_knowledge_base(snapshot, sys.argv[1] if len(sys.argv) > 1 else KB_PATH)
+    print(
+        f"Knowledge base written: {path} "
+        f"({len(snapshot['drugs'])} drugs, {len(snapshot['risk_table'])} risk entries, "
+        f"{len(snapshot['rec_table'])} recommendation entries, digest {snapshot['source_digest'][:12]})"
+    )
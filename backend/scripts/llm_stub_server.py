@@ -0,0 +1,64 @@
+"""
+Local Groq/OpenAI-compatible chat-completions stub with configurable latency,
+for exercising the LLM fan-out without a real provider.
+
+Run from backend/:  python scripts/llm_stub_server.py [--port 8765] [--latency-ms 800]
+Point the backend at it:  GROQ_BASE_URL=http://127.0.0.1:8765 GROQ_API_KEY=stub
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+
+app = FastAPI(title="LLM stub")
+app.state.latency_ms = 800.0
+app.state.jitter_ms = 0.0
+
+
+@app.post("/openai/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    delay = app.state.latency_ms + random.uniform(0, app.state.jitter_ms)
+    await asyncio.sleep(delay / 1000)
+
+    prompt = body["messages"][-1]["content"]
+    content = json.dumps({
+        "summary": f"Stub explanation ({len(prompt)} prompt chars).",
+        "mechanism": "Variant impacts gene function.",
+        "evidence": "CPIC",
+        "citations": ["CPIC guideline"],
+    })
+
+    return {
+        "id": f"chatcmpl-stub-{time.time_ns()}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "stub"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=800.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    app.state.latency_ms = args.latency_ms
+    app.state.jitter_ms = args.jitter_ms
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
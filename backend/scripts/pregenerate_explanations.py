@@ -0,0 +1,108 @@
+"""
+Explain every reachable (drug, gene, phenotype, recommendation) combination
+offline and write the versioned explanation store the app serves from.
+
+Run from backend/:
+    python scripts/pregenerate_explanations.py [--concurrency 4] [--rps 2] [--out PATH] [--missing-only]
+
+Uses GROQ_API_KEY / GROQ_MODEL / GROQ_BASE_URL like the app. Payloads are
+validated against the LLMExplanation schema; combinations that fail are
+reported and left out (the app falls back to the live LLM for them).
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.schemas import LLMExplanation
+from app.services.explanation_store import (
+    STORE_PATH,
+    combination_key,
+    load_store,
+    reachable_combinations,
+    write_store,
+)
+from app.services.llm_explainer import MODEL, build_prompt, complete_explanation_async
+
+
+class RateLimiter:
+    """Spaces request starts at least 1/rps apart."""
+
+    def __init__(self, rps):
+        self.interval = 1.0 / rps if rps > 0 else 0.0
+        self.next_slot = 0.0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self.lock:
+            now = time.monotonic()
+            delay = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+async def explain(combo, limiter, gate, retries):
+    drug, gene, phenotype, rec = combo
+    prompt = build_prompt(drug, gene, phenotype, [], rec)
+
+    for attempt in range(retries + 1):
+        async with gate:
+            await limiter.wait()
+            try:
+                payload = await complete_explanation_async(prompt, rec)
+                LLMExplanation.model_validate(payload)
+                return dict(payload, recommendation=rec)
+            except Exception as e:
+                error = e
+        await asyncio.sleep(2 ** attempt)
+
+    print(f"  FAILED {combination_key(drug, gene, phenotype)}: {error}")
+    return None
+
+
+async def run(args):
+    combos = reachable_combinations()
+    entries = {}
+
+    if args.missing_only:
+        existing = load_store(args.out)
+        for drug, gene, phenotype, rec in combos:
+            entry = existing.get(combination_key(drug, gene, phenotype))
+            if entry is not None and entry.get("recommendation") == rec:
+                entries[combination_key(drug, gene, phenotype)] = dict(entry)
+
+    todo = [c for c in combos if combination_key(*c[:3]) not in entries]
+    print(f"{len(combos)} reachable combinations, {len(todo)} to generate (model {MODEL})")
+
+    limiter = RateLimiter(args.rps)
+    gate = asyncio.Semaphore(args.concurrency)
+
+    t0 = time.perf_counter()
+    results = await asyncio.gather(*(explain(c, limiter, gate, args.retries) for c in todo))
+
+    for combo, payload in zip(todo, results):
+        if payload is not None:
+            entries[combination_key(*combo[:3])] = payload
+
+    path = write_store(entries, MODEL, args.out)
+    failed = sum(r is None for r in results)
+    print(f"wrote {len(entries)} entries to {path} in {time.perf_counter() - t0:.1f}s ({failed} failed)")
+    return 1 if failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--out", default=STORE_PATH)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rps", type=float, default=2.0, help="max request starts per second (0 = unlimited)")
+    parser.add_argument("--retries", type=int, default=2)
+    parser.add_argument("--missing-only", action="store_true", help="keep valid entries of an existing store")
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Deterministic synthetic VCF generator for benchmarks.
+
+Knobs: row count, share of PGx rows, share of malformed space-delimited rows
+(the kind _repair_row recovers), share of multi-allelic sites, sample count, gzip.
+
+Run from backend/:
+    python scripts/synthetic_vcf.py out.vcf --rows 100000 --pgx-ratio 0.02 \\
+        --malformed-ratio 0.01 --multiallelic-ratio 0.05 --samples 1 [--gzip]
+"""
+import argparse
+import gzip
+import random
+
+# (chrom, pos, rsid, ref, alt, gene): star-defining sites from the rule tables
+PGX_SITES = [
+    ("22", 42130692, "rs3892097", "C", "T", "CYP2D6"),
+    ("22", 42128945, "rs5030655", "A", "T", "CYP2D6"),
+    ("22", 42127803, "rs28371725", "C", "T", "CYP2D6"),
+    ("22", 42126611, "rs1065852", "G", "A", "CYP2D6"),
+    ("10", 94781859, "rs4244285", "G", "A", "CYP2C19"),
+    ("10", 94780653, "rs4986893", "G", "A", "CYP2C19"),
+    ("10", 94761900, "rs12248560", "C", "T", "CYP2C19"),
+    ("10", 94942290, "rs1799853", "C", "T", "CYP2C9"),
+    ("10", 94981296, "rs1057910", "A", "C", "CYP2C9"),
+    ("12", 21178615, "rs4149056", "T", "C", "SLCO1B1"),
+    ("6", 18130918, "rs1800460", "G", "A", "TPMT"),
+    ("6", 18138997, "rs1142345", "A", "G", "TPMT"),
+    ("1", 97450058, "rs3918290", "C", "T", "DPYD"),
+    ("1", 97082391, "rs67376798", "T", "A", "DPYD"),
+]
+
+BASES = "ACGT"
+
+GENOTYPES = ("0/0", "0/1", "1/1", "0|1", "1|0", "./.")
+MULTIALLELIC_GENOTYPES = ("0/2", "1/2", "2/2", "0|2")
+
+
+def header(samples):
+    names = "\t".join(f"SAMPLE{i + 1}" for i in range(samples)) if samples > 1 else "SAMPLE"
+    return (
+        "##fileformat=VCFv4.2\n"
+        '##INFO=<ID=GENE,Number=1,Type=String,Description="Gene Symbol">\n'
+        '##INFO=<ID=DP,Number=1,Type=Integer,Description="Depth">\n'
+        '##INFO=<ID=AF,Number=A,Type=Float,Description="Allele Frequency">\n'
+        '##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">\n'
+        '##FORMAT=<ID=DP,Number=1,Type=Integer,Description="Read Depth">\n'
+        f"#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\t{names}\n"
+    )
+
+
+def _row(rng, i, pgx_ratio, multiallelic_ratio, samples):
+    multiallelic = rng.random() < multiallelic_ratio
+
+    if rng.random() < pgx_ratio:
+        chrom, pos, rsid, ref, alt, gene = PGX_SITES[rng.randrange(len(PGX_SITES))]
+        info = f"GENE={gene};DP={rng.randint(10, 80)}"
+    else:
+        chrom, pos, rsid = str(rng.randint(1, 22)), 1_000_000 + i * 37, f"rs{800_000_000 + i}"
+        ref = rng.choice(BASES)
+        alt = rng.choice([b for b in BASES if b != ref])
+        info = f"DP={rng.randint(5, 60)};AF={rng.random():.3f}"
+
+    if multiallelic:
+        alt = alt + "," + rng.choice([b for b in BASES if b not in (ref, alt)])
+        genotypes = GENOTYPES + MULTIALLELIC_GENOTYPES
+    else:
+        genotypes = GENOTYPES
+
+    calls = [f"{rng.choice(genotypes)}:{rng.randint(5, 60)}" for _ in range(samples)]
+    return [chrom, str(pos), rsid, ref, alt, str(rng.randint(20, 99)), "PASS", info, "GT:DP"] + calls
+
+
+def _malformed(rng, cols):
+    # what _clean_vcf used to repair: spaces instead of tabs, POS split by stray spaces
+    if rng.random() < 0.5:
+        return " ".join(cols)
+    pos = cols[1]
+    cut = rng.randint(1, len(pos) - 1)
+    return "\t".join([cols[0], f"{pos[:cut]}  {pos[cut:]}"] + cols[2:])
+
+
+def generate_vcf(path, rows, pgx_ratio=0.02, malformed_ratio=0.0,
+                 multiallelic_ratio=0.0, samples=1, seed=7, compress=False):
+    """Write a VCF; same arguments → byte-identical file."""
+    rng = random.Random(seed)
+    opener = gzip.open if compress else open
+
+    with opener(path, "wt") as f:
+        f.write(header(samples))
+
+        for i in range(rows):
+            cols = _row(rng, i, pgx_ratio, multiallelic_ratio, samples)
+
+            if rng.random() < malformed_ratio:
+                f.write(_malformed(rng, cols) + "\n")
+            else:
+                f.write("\t".join(cols) + "\n")
+
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("path")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--pgx-ratio", type=float, default=0.02)
+    parser.add_argument("--malformed-ratio", type=float, default=0.0)
+    parser.add_argument("--multiallelic-ratio", type=float, default=0.0)
+    parser.add_argument("--samples", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--gzip", action="store_true")
+    args = parser.parse_args()
+
+    generate_vcf(
+        args.path, args.rows, args.pgx_ratio, args.malformed_ratio,
+        args.multiallelic_ratio, args.samples, args.seed, args.gzip,
+    )
+
+
+if __name__ == "__main__":
+    main()